@@ -17,14 +17,75 @@ class Settings(BaseSettings):
   google_client_id: str | None = Field(alias="GOOGLE_CLIENT_ID", default=None)
   google_client_secret: str | None = Field(alias="GOOGLE_CLIENT_SECRET", default=None)
   google_redirect_uri: str | None = Field(alias="GOOGLE_REDIRECT_URI", default=None)
+  google_token_url: str = Field(alias="GOOGLE_TOKEN_URL", default="https://oauth2.googleapis.com/token")
+  google_gmail_api_url: str = Field(alias="GOOGLE_GMAIL_API_URL", default="https://gmail.googleapis.com/gmail/v1")
+  google_drive_api_url: str = Field(alias="GOOGLE_DRIVE_API_URL", default="https://www.googleapis.com/drive/v3")
+  sync_concurrency: int = Field(alias="SYNC_CONCURRENCY", default=8)
+  sync_initial_limit: int = Field(alias="SYNC_INITIAL_LIMIT", default=500)
+  request_deadline_seconds: float = Field(alias="REQUEST_DEADLINE_SECONDS", default=30.0)  # chat / RAG budget; 0 disables
+  deadline_worker_threads: int = Field(alias="DEADLINE_WORKER_THREADS", default=16)  # embedding / Qdrant calls under a deadline
+  rag_top_k_per_collection: int = Field(alias="RAG_TOP_K_PER_COLLECTION", default=2)
+  rag_hnsw_ef: int | None = Field(alias="RAG_HNSW_EF", default=None)
+  rag_exact: bool = Field(alias="RAG_EXACT", default=False)
+  rag_score_threshold: float | None = Field(alias="RAG_SCORE_THRESHOLD", default=None)
+  rag_payload_fields: str | None = Field(alias="RAG_PAYLOAD_FIELDS", default=None)  # comma-separated
+  rag_quantization_rescore: bool = Field(alias="RAG_QUANTIZATION_RESCORE", default=True)
+  rag_quantization_oversampling: float | None = Field(alias="RAG_QUANTIZATION_OVERSAMPLING", default=None)
+  chat_vector_ttl_days: int = Field(alias="CHAT_VECTOR_TTL_DAYS", default=90)
+  chat_vector_max_per_user: int = Field(alias="CHAT_VECTOR_MAX_PER_USER", default=2000)
+  chat_vector_min_chars: int = Field(alias="CHAT_VECTOR_MIN_CHARS", default=20)
+  chat_retention_interval_seconds: int = Field(alias="CHAT_RETENTION_INTERVAL_SECONDS", default=3600)  # 0 disables the job
+  rag_batch_concurrency: int = Field(alias="RAG_BATCH_CONCURRENCY", default=8)  # LLM calls in flight per batch
+  rag_batch_max_concurrent: int = Field(alias="RAG_BATCH_MAX_CONCURRENT", default=2)  # batches running at once
+  breaker_failure_rate: float = Field(alias="BREAKER_FAILURE_RATE", default=0.5)
+  breaker_min_calls: int = Field(alias="BREAKER_MIN_CALLS", default=5)
+  breaker_window_seconds: float = Field(alias="BREAKER_WINDOW_SECONDS", default=30.0)
+  breaker_open_seconds: float = Field(alias="BREAKER_OPEN_SECONDS", default=15.0)
+  breaker_half_open_calls: int = Field(alias="BREAKER_HALF_OPEN_CALLS", default=1)
+  breaker_llm_min_wait_seconds: float = Field(alias="BREAKER_LLM_MIN_WAIT_SECONDS", default=5.0)  # shorter deadline timeouts don't count
+  export_batch_size: int = Field(alias="EXPORT_BATCH_SIZE", default=2000)  # records per Mongo batch / response chunk
+  admin_token: str | None = Field(alias="ADMIN_TOKEN", default=None)  # unlocks /debug, exports and per-request profiling
+  trust_user_header: bool = Field(alias="TRUST_USER_HEADER", default=False)  # X-User-ID is set by a gateway; enables private search
+  profile_dir: str | None = Field(alias="PROFILE_DIR", default=None)  # defaults to <tmp>/sba-profiles
+  profile_keep: int = Field(alias="PROFILE_KEEP", default=50)
+  profile_interval_ms: float = Field(alias="PROFILE_INTERVAL_MS", default=2.0)  # per-request sampling interval
+  profile_continuous_hz: float = Field(alias="PROFILE_CONTINUOUS_HZ", default=0.0)  # 0 disables the always-on sampler
+  profile_max_overhead: float = Field(alias="PROFILE_MAX_OVERHEAD", default=0.01)
+  admission_max_concurrency: int = Field(alias="ADMISSION_MAX_CONCURRENCY", default=8)
+  admission_max_queue: int = Field(alias="ADMISSION_MAX_QUEUE", default=64)
+  admission_max_queue_per_user: int = Field(alias="ADMISSION_MAX_QUEUE_PER_USER", default=4)
+  admission_max_wait_seconds: float = Field(alias="ADMISSION_MAX_WAIT_SECONDS", default=15.0)
   default_user_id: str = Field(alias="DEFAULT_USER_ID", default="demo-user")
   ocr_api_key: str | None = Field(alias="OCR_API_KEY", default=None)
+  ocr_api_url: str | None = Field(alias="OCR_API_URL", default=None)
+  ocr_backend: str = Field(alias="OCR_BACKEND", default="tesseract")  # "tesseract" or "http"
+  ocr_language: str = Field(alias="OCR_LANGUAGE", default="eng")
+  ocr_workers: int | None = Field(alias="OCR_WORKERS", default=None)  # defaults to the CPU count
+  ocr_dpi: int = Field(alias="OCR_DPI", default=200)
+  storage_backend: str = Field(alias="STORAGE_BACKEND", default="local")  # "local" or "gridfs"
+  storage_dir: str = Field(alias="STORAGE_DIR", default="./storage")
+  upload_dir: str | None = Field(alias="UPLOAD_DIR", default=None)  # spool directory, defaults to the system temp dir
   qwen_api_url: str | None = Field(alias="QWEN_API_URL", default=None)
   qwen_api_key: str | None = Field(alias="QWEN_API_KEY", default=None)
   qwen_generate_path: str | None = Field(alias="QWEN_GENERATE_PATH", default=None)
   llm_model: str | None = Field(alias="LLM_MODEL", default=None)
+  llm_backend: str = Field(alias="LLM_BACKEND", default="auto")  # "hf", "openai", "offline" or "auto" (never picks offline)
+  llm_max_tokens: int = Field(alias="LLM_MAX_TOKENS", default=512)
+  llm_temperature: float = Field(alias="LLM_TEMPERATURE", default=0.2)
+  llm_timeout_seconds: float = Field(alias="LLM_TIMEOUT_SECONDS", default=60.0)
   qwen_embed_path: str | None = Field(alias="QWEN_EMBED_PATH", default=None)
   qwen_embed_model: str | None = Field(alias="EMBEDDING_MODEL", default=None)
+  embedding_mode: str = Field(alias="EMBEDDING_MODE", default="local")  # "local" or "remote"
+  embedding_socket: str = Field(alias="EMBEDDING_SOCKET", default="/tmp/sba-embedding.sock")
+  embedding_authkey: str = Field(alias="EMBEDDING_AUTHKEY", default="sba-embedding")
+  embedding_backend: str = Field(alias="EMBEDDING_BACKEND", default="torch")
+  embedding_precision: str = Field(alias="EMBEDDING_PRECISION", default="float32")
+  embedding_max_batch: int = Field(alias="EMBEDDING_MAX_BATCH", default=32)
+  embedding_batch_wait_ms: float = Field(alias="EMBEDDING_BATCH_WAIT_MS", default=5.0)
+  # Matryoshka output size (e.g. 256, 512, 1024); unset keeps the model's full dimension
+  embedding_dimension: int | None = Field(alias="EMBEDDING_DIMENSION", default=None)
+  # Per-collection overrides, e.g. "chat_messages:256,synced_items:512"
+  embedding_collection_dimensions: str | None = Field(alias="EMBEDDING_COLLECTION_DIMENSIONS", default=None)
 
 
   class Config:
@@ -1,9 +1,10 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 
 from ..models.user import UserCreate, UserLogin, UserPublic
 from ..services import user_service
+from ..utils.circuit_breaker import require
 
-router = APIRouter(prefix="/auth", tags=["auth"])
+router = APIRouter(prefix="/auth", tags=["auth"], dependencies=[Depends(require("mongo"))])
 
 
 @router.post("/signup", response_model=UserPublic)
@@ -1,18 +1,40 @@
-from typing import List
-from fastapi import APIRouter
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query, Request
 
 from ..models.chat import ChatMessageCreate, ChatMessagePublic
-from ..services import chat_service
+from ..services import chat_service, export_service
+from ..utils.admission import get_controller
+from ..utils.circuit_breaker import require
+from ..utils.deadline import Deadline
+from ..utils.security import require_admin, trusted_user_id
+from ..utils.serialization import trusted
 
-router = APIRouter(prefix="/chat", tags=["chat"])
+router = APIRouter(prefix="/chat", tags=["chat"], dependencies=[Depends(require("mongo"))])
 
 
 @router.post("/messages", response_model=ChatMessagePublic)
-async def send_message(payload: ChatMessageCreate):
-  return await chat_service.create_message(payload)
+async def send_message(payload: ChatMessageCreate, request: Request):
+  user = payload.user_id or (request.client.host if request.client else "anonymous")
+  # Started before admission so time spent queueing counts against the budget
+  deadline = Deadline.from_settings()
+  async with get_controller("llm").slot(user):
+    return await chat_service.create_message(payload, deadline=deadline, search_user_id=trusted_user_id(request))
 
 
 @router.get("/messages", response_model=List[ChatMessagePublic])
 async def get_messages():
-  return await chat_service.list_messages()
+  return trusted(await chat_service.list_messages())
 
+
+@router.get("/messages/export", dependencies=[Depends(require_admin)])
+async def export_messages(
+  user_id: Optional[str] = None,
+  conversation_id: Optional[str] = None,
+  created_after: Optional[datetime] = None,
+  created_before: Optional[datetime] = None,
+  compress: bool = Query(default=False, description="gzip the NDJSON stream"),
+):
+  """Stream every matching message as NDJSON (one JSON object per line), oldest first."""
+  stream = export_service.export_messages(user_id, conversation_id, created_after, created_before, compress)
+  return export_service.export_response(stream, "chat-messages", compress)
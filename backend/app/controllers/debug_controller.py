@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse, PlainTextResponse
+
+from ..utils import profiling
+from ..utils.security import require_admin
+
+router = APIRouter(prefix="/debug", tags=["debug"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+  """Download a per-request profile: folded stacks (.folded) or cProfile stats (.pstats)."""
+  path = profiling.profile_path(profile_id)
+  if path is None:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+  media_type = "text/plain" if profile_id.endswith(".folded") else "application/octet-stream"
+  return FileResponse(path, media_type=media_type, filename=profile_id)
+
+
+@router.get("/profile/continuous")
+async def continuous_profile(reset: bool = False):
+  """Hot stacks aggregated by the always-on sampler as folded stacks; `reset` starts a new window."""
+  profile = profiling.continuous_profile(reset=reset)
+  if profile is None:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Continuous profiling is off (PROFILE_CONTINUOUS_HZ=0)")
+  return PlainTextResponse(
+    profile["folded"],
+    headers={"X-Profile-Samples": str(profile["samples"]), "X-Profile-Overhead": str(profile["overhead"])},
+  )
@@ -1,10 +1,14 @@
-from typing import List
-from fastapi import APIRouter
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, File, Form, Query, Request, UploadFile
 
-from ..models.document import DocumentCreate, DocumentPublic
-from ..services import document_service
+from ..models.document import DocumentCreate, DocumentIngestResult, DocumentPublic, DocumentUploadResult
+from ..services import document_service, export_service, ocr_service
+from ..utils.circuit_breaker import require
+from ..utils.security import require_admin
+from ..utils.serialization import trusted
 
-router = APIRouter(prefix="/documents", tags=["documents"])
+router = APIRouter(prefix="/documents", tags=["documents"], dependencies=[Depends(require("mongo"))])
 
 
 @router.post("", response_model=DocumentPublic)
@@ -13,6 +17,86 @@ async def create_document(payload: DocumentCreate):
 
 
 @router.get("", response_model=List[DocumentPublic])
-async def list_documents():
-  return await document_service.list_recent_documents()
+async def list_documents(
+  limit: int = Query(default=5, ge=1, le=200),
+  cursor: Optional[str] = Query(default=None, description="X-Next-Cursor from the previous page"),
+  category: Optional[str] = None,
+  created_after: Optional[datetime] = None,
+  created_before: Optional[datetime] = None,
+  include_total: bool = Query(default=False, description="Return the (cached) total in X-Total-Count"),
+):
+  documents, next_cursor = await document_service.list_documents(
+    limit=limit,
+    cursor=cursor,
+    category=category,
+    created_after=created_after,
+    created_before=created_before,
+  )
+  headers = {}
+  if next_cursor:
+    headers["X-Next-Cursor"] = next_cursor
+  if include_total:
+    total = await document_service.count_documents(category, created_after, created_before)
+    if total is not None:
+      headers["X-Total-Count"] = str(total)
+  return trusted(documents, headers=headers)
 
+
+@router.get("/export", dependencies=[Depends(require_admin)])
+async def export_documents(
+  category: Optional[str] = None,
+  created_after: Optional[datetime] = None,
+  created_before: Optional[datetime] = None,
+  compress: bool = Query(default=False, description="gzip the NDJSON stream"),
+):
+  """Stream every matching document record as NDJSON (one JSON object per line), oldest first."""
+  stream = export_service.export_documents(category, created_after, created_before, compress)
+  return export_service.export_response(stream, "documents", compress)
+
+
+@router.post("/ocr", response_model=DocumentIngestResult)
+async def ocr_document(
+  file: UploadFile = File(...),
+  title: str = Form(min_length=2, max_length=120),
+  category: str = Form(min_length=2, max_length=60),
+):
+  """Create a document from a PDF, image or text file and index its extracted text."""
+  # Unsupported types are rejected before a document is created
+  kind = ocr_service.detect_kind(file.filename or "", file.content_type)
+  document = await document_service.add_document(
+    DocumentCreate(title=title, category=category, filename=file.filename or "upload")
+  )
+  try:
+    stats = await ocr_service.ingest_file(file, kind, document.id, title)
+  except BaseException:
+    # Don't leave a searchable document without content behind
+    await document_service.remove_document(document.id)
+    raise
+  return DocumentIngestResult(document=document, **stats)
+
+
+@router.post(
+  "/upload",
+  response_model=DocumentUploadResult,
+  openapi_extra={
+    "requestBody": {
+      "required": True,
+      "content": {
+        "multipart/form-data": {
+          "schema": {
+            "type": "object",
+            "required": ["file", "title", "category"],
+            "properties": {
+              "file": {"type": "string", "format": "binary"},
+              "title": {"type": "string"},
+              "category": {"type": "string"},
+            },
+          }
+        }
+      },
+    }
+  },
+)
+async def upload_document(request: Request):
+  """Stream a file into storage; content that was already ingested is not processed again."""
+  return await document_service.upload_document(request)
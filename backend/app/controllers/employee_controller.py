@@ -1,12 +1,18 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Request
 
-from ..models.employee import EmployeeCreate, EmployeePublic
+from ..models.employee import EmployeeCreate, EmployeeImportResult, EmployeePublic
 from ..services import employee_service
+from ..utils.circuit_breaker import require
 
-router = APIRouter(prefix="/employees", tags=["employees"])
+router = APIRouter(prefix="/employees", tags=["employees"], dependencies=[Depends(require("mongo"))])
 
 
 @router.post("", response_model=EmployeePublic)
 async def create_employee(payload: EmployeeCreate):
   return await employee_service.add_employee(payload)
 
+
+@router.post("/import", response_model=EmployeeImportResult)
+async def import_employees(request: Request):
+  """Bulk import from a streamed CSV or NDJSON upload (raw body or multipart `file`)."""
+  return await employee_service.import_employees(request)
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request
 from fastapi.responses import RedirectResponse
 
 from ..config import get_settings
-from ..services import integration_service
+from ..services import integration_service, sync_service
+from ..utils.circuit_breaker import require
 
-router = APIRouter(prefix="/integrations", tags=["integrations"])
+router = APIRouter(prefix="/integrations", tags=["integrations"], dependencies=[Depends(require("mongo"))])
 settings = get_settings()
 
 
@@ -25,6 +26,11 @@ async def callback(provider: str, code: str):
   return RedirectResponse(redirect_to)
 
 
+@router.post("/{provider}/sync")
+async def sync(provider: str):
+  return await sync_service.sync(provider, settings.default_user_id)
+
+
 @router.delete("/{provider}")
 async def disconnect(provider: str):
   await integration_service.disconnect(provider, settings.default_user_id)
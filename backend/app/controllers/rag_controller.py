@@ -1,76 +1,233 @@
-from typing import Optional
-from fastapi import APIRouter
+import asyncio
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field
 
-from ..services import rag
-from ..services.Qdrant import fix_all_collections
+from ..config import get_settings
+from ..models.retrieval import RetrievalParams
+from ..services import rag, reindex_service
+from ..utils.admission import AdmissionRejected, get_controller
+from ..utils.circuit_breaker import CircuitOpenError, require
+from ..utils.deadline import Deadline, DeadlineExceeded
+from ..utils.metrics import RAG_COALESCED
+from ..utils.security import require_admin, trusted_user_id
+from ..utils.serialization import dumps, trusted
+from ..utils.singleflight import SingleFlight
 
 router = APIRouter(prefix="/rag", tags=["rag"])
+settings = get_settings()
+
+# Identical questions asked concurrently share one retrieval + LLM call
+_inflight_queries = SingleFlight()
 
 
 class RAGQuery(BaseModel):
     collection_name: str = Field(default="sba", description="The collection name to search in")
     query: str = Field(min_length=1, description="The question or query to search for")
     top_k: Optional[int] = Field(default=4, ge=1, le=20, description="Number of documents to retrieve")
+    retrieval: Optional[RetrievalParams] = Field(default=None, description="HNSW ef, exact mode, score threshold, payload fields, fan-out and quantization overrides")
+
+
+class RetrievedDocument(BaseModel):
+    id: Optional[int | str] = None
+    score: Optional[float] = None
+    text: str = ""
+    collection: Optional[str] = None
+    payload: dict = Field(default_factory=dict)
 
 
 class RAGResponse(BaseModel):
     answer: str
     sources: str
-    documents: list
+    documents: List[RetrievedDocument]
+    degradations: List[str] = Field(default_factory=list, description="Deadline degradations (stage:action) applied while answering")
 
 
 @router.post("/query", response_model=RAGResponse)
-async def query_rag(payload: RAGQuery):
-    """Query the RAG system with a question and get an answer with sources."""
+async def query_rag(payload: RAGQuery, request: Request):
+    """
+    Query the RAG system with a question and get an answer with sources.
+
+    The caller's own synced items are only searched when TRUST_USER_HEADER is on: the
+    X-User-ID header is then a trust boundary the deployment's gateway must enforce.
+    """
+    user_id = trusted_user_id(request)
+    user = request.headers.get("X-User-ID") or (request.client.host if request.client else "anonymous")
+    # Started before admission so time spent queueing counts against the budget
+    deadline = Deadline.from_settings()
+
+    async def compute() -> RAGResponse:
+        # Only the leader takes an admission slot; followers just wait for its result
+        async with get_controller("llm").slot(user):
+            return await _answer(payload, deadline, user_id)
+
+    # A leader rejected by admission or cancelled (client gone) does not fail its followers:
+    # they retry, and one of them queues for a slot of its own
+    response, shared = await _inflight_queries.do(
+        _coalescing_key(payload, user_id), compute, private=(AdmissionRejected,)
+    )
+    RAG_COALESCED.labels(role="follower" if shared else "leader").inc()
+    # Built from our own search results, so skip response_model re-validation
+    return trusted(response)
+
+
+def _coalescing_key(payload: RAGQuery, user_id: Optional[str]) -> tuple:
+    # Answers can draw on the caller's own synced items, so only the same user's queries are merged
+    retrieval = payload.retrieval.model_dump_json() if payload.retrieval else None
+    return (rag.normalize_query(payload.query), payload.collection_name, payload.top_k, retrieval, user_id)
+
+
+async def _answer(payload: RAGQuery, deadline: Optional[Deadline] = None, user_id: Optional[str] = None) -> RAGResponse:
+    # Search across multiple collections
+    docs = await rag.search_multiple_collections(
+        query=payload.query,
+        params=payload.retrieval or RetrievalParams(),
+        top_k=payload.top_k,
+        deadline=deadline,
+        user_id=user_id,
+    )
+    return await _complete(payload.query, docs, deadline)
+
+
+async def _complete(query: str, docs: list, deadline: Optional[Deadline] = None) -> RAGResponse:
     try:
-        # Search across multiple collections
-        docs = await rag.search_multiple_collections(
-            query=payload.query,
-            top_k_per_collection=payload.top_k // 4  # Distribute top_k across collections
-        )
-        
         # Build the prompt with context (no conversation history for standalone query)
-        prompt = rag.build_prompt(payload.query, docs, conversation_history=None)
+        prompt = rag.build_prompt(query, docs, conversation_history=None)
         
         # Call the LLM to get an answer
-        answer = await rag.call_llm(prompt)
+        answer = await rag.call_llm(prompt, deadline=deadline)
         
         # Format sources
         sources = rag.format_sources(docs)
         
-        return RAGResponse(
+        return RAGResponse.model_construct(
             answer=answer,
             sources=sources,
-            documents=docs
+            documents=[RetrievedDocument.model_construct(**doc) for doc in docs],
+            degradations=deadline.degradations if deadline else [],
+        )
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, round(e.retry_after)))},
         )
     except ValueError as e:
         # Handle configuration errors gracefully
-        from fastapi import HTTPException, status
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=str(e)
         )
 
 
-@router.post("/fix-collections")
+class RAGBatchQuery(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=1000, description="Questions to answer")
+    collection_name: str = Field(default="sba", description="The collection name to search in")
+    top_k: Optional[int] = Field(default=4, ge=1, le=20, description="Number of documents to retrieve per question")
+    retrieval: Optional[RetrievalParams] = Field(default=None, description="Retrieval overrides applied to every question")
+    concurrency: Optional[int] = Field(default=None, ge=1, le=64, description="Concurrent LLM calls (default and upper bound RAG_BATCH_CONCURRENCY)")
+
+
+@router.post("/query/batch")
+async def query_rag_batch(payload: RAGBatchQuery, request: Request):
+    """
+    Answer many questions in one request. Retrieval runs as one encoder batch and one
+    Qdrant batch search per collection; LLM calls run with bounded concurrency. Results
+    stream back as NDJSON lines ({"index", "query", "answer", "sources", "documents"} or
+    {"index", "query", "error"}) in completion order. Private synced items are searched
+    under the same TRUST_USER_HEADER rule as /rag/query.
+    """
+    user_id = trusted_user_id(request)
+    user = request.headers.get("X-User-ID") or (request.client.host if request.client else "anonymous")
+    # Batches queue in their own admission pool so they cannot crowd out interactive queries;
+    # the slot is taken before streaming starts so a rejection is still a proper 429/503.
+    pool = get_controller("batch")
+    await pool.acquire(user)
+    released = False
+
+    def release() -> None:
+        # Called from the stream's cleanup and as the response's background task: a client
+        # that disconnects before the first chunk never runs the stream at all
+        nonlocal released
+        if not released:
+            released = True
+            pool.release()
+
+    async def stream():
+        try:
+            all_docs = await rag.search_multiple_collections_batch(
+                payload.queries,
+                top_k=payload.top_k,
+                params=payload.retrieval or RetrievalParams(),
+                user_id=user_id,
+                timeout=settings.request_deadline_seconds or None,
+            )
+            cap = settings.rag_batch_concurrency
+            limit = asyncio.Semaphore(min(payload.concurrency or cap, cap))
+            llm_pool = get_controller("llm")
+
+            async def answer(index: int, query: str, docs: list) -> dict:
+                async with limit:
+                    try:
+                        # Each LLM call also competes for the shared LLM slots like any other query
+                        async with llm_pool.slot(user):
+                            # Same budget as an interactive query, so a stuck call gives its slots back
+                            response = await _complete(query, docs, Deadline.from_settings())
+                        return {"index": index, "query": query, **response.model_dump()}
+                    except HTTPException as e:
+                        return {"index": index, "query": query, "error": e.detail}
+                    except Exception as e:
+                        return {"index": index, "query": query, "error": str(e)}
+
+            tasks = [
+                asyncio.create_task(answer(i, query, docs))
+                for i, (query, docs) in enumerate(zip(payload.queries, all_docs))
+            ]
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    yield dumps(await finished) + b"\n"
+            finally:
+                # Client went away: don't keep paying for LLM calls nobody will read
+                for task in tasks:
+                    task.cancel()
+        finally:
+            release()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson", background=BackgroundTask(release))
+
+
+@router.post("/fix-collections", dependencies=[Depends(require_admin), Depends(require("mongo"))])
 async def fix_qdrant_collections():
     """
-    Fix all Qdrant collections by recreating them with the correct embedding dimension.
-    WARNING: This will delete all existing vectors in all collections!
+    Rebuild all Qdrant collections with the current embedding model and dimension.
     
-    Use this endpoint if you're getting dimension mismatch errors.
+    Each collection is re-embedded into a new versioned collection in the background
+    and the live alias is switched once it is complete, so search keeps working
+    throughout. Use this endpoint if you're getting dimension mismatch errors.
     """
-    try:
-        results = await fix_all_collections()
-        return {
-            "message": "Collections fixed successfully",
-            "results": results
-        }
-    except Exception as e:
-        from fastapi import HTTPException, status
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error fixing collections: {str(e)}"
-        )
+    jobs = {}
+    for collection_name in reindex_service.SOURCES:
+        try:
+            jobs[collection_name] = await reindex_service.start_reindex(collection_name)
+        except HTTPException as e:
+            jobs[collection_name] = {"error": e.detail}
+    return {
+        "message": "Reindex started",
+        "results": jobs
+    }
+
+
+@router.post("/reindex/{collection_name}", dependencies=[Depends(require_admin), Depends(require("mongo"))])
+async def reindex_collection(collection_name: str):
+    """Start (or resume) a zero-downtime reindex of one collection."""
+    return await reindex_service.start_reindex(collection_name)
+
 
+@router.get("/reindex/jobs/{job_id}", dependencies=[Depends(require_admin), Depends(require("mongo"))])
+async def reindex_status(job_id: str):
+    """Progress and throughput of a reindex job."""
+    return await reindex_service.get_job(job_id)
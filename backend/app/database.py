@@ -1,10 +1,15 @@
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from .config import get_settings
 from qdrant_client import QdrantClient
+from .utils.circuit_breaker import GuardedClient, MongoCommandBreaker, MongoHeartbeatBreaker, get_breaker
+from .utils.metrics import MongoCommandMetrics
 
 settings = get_settings()
 
-client = AsyncIOMotorClient(settings.mongodb_uri)
+client = AsyncIOMotorClient(
+  settings.mongodb_uri,
+  event_listeners=[MongoCommandMetrics(), MongoCommandBreaker(), MongoHeartbeatBreaker()],
+)
 database: AsyncIOMotorDatabase = client[settings.mongodb_db]
 
 
@@ -12,10 +17,33 @@ def get_collection(name: str):
   return database[name]
 
 
+_qdrant_client: GuardedClient | None = None
+
+
+def _qdrant_failure(error: BaseException) -> bool:
+  """Transport errors, timeouts and 5xx mean Qdrant is unhealthy; 4xx answers (e.g. missing collection) do not."""
+  status_code = getattr(error, "status_code", None)
+  if status_code is not None:
+    return status_code >= 500
+  return not isinstance(error, (ValueError, KeyError))
+
+
 def connect_qdrant():
+  """Return the process-wide Qdrant client (one connection pool shared by every caller).
+
+  QDRANT_URL=":memory:" runs an embedded in-process instance, used by the benchmarks.
+  Every call goes through the "qdrant" circuit breaker and fails fast while it is open.
+  """
+  global _qdrant_client
   if not settings.qdrant_url:
     raise ValueError("QDRANT_URL is not configured. Please set QDRANT_URL in your .env file to use RAG functionality.")
   # print("QDRANT URL:", settings.qdrant_url)
   # print("QDRANT KEY:", settings.qdrant_api_key[:5] + "...")
 
-  return QdrantClient(url=settings.qdrant_url, api_key=settings.qdrant_api_key)
\ No newline at end of file
+  if _qdrant_client is None:
+    if settings.qdrant_url == ":memory:":
+      qdrant = QdrantClient(location=":memory:")
+    else:
+      qdrant = QdrantClient(url=settings.qdrant_url, api_key=settings.qdrant_api_key)
+    _qdrant_client = GuardedClient(qdrant, get_breaker("qdrant"), _qdrant_failure)
+  return _qdrant_client
@@ -2,6 +2,8 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .config import get_settings
+from .utils import circuit_breaker, deadline, metrics, profiling
+from .utils.serialization import FastJSONResponse
 from .controllers import (
   auth_controller,
   employee_controller,
@@ -9,13 +11,16 @@ from .controllers import (
   subscription_controller,
   data_source_controller,
   chat_controller,
+  debug_controller,
   integration_controller,
   rag_controller,
 )
+from .services import chat_service, document_service, employee_service, llm, ocr_service, reindex_service, retention_service, sync_service
+from .services.token_manager import token_manager
 
 settings = get_settings()
 
-app = FastAPI(title="SBA Backend", version="1.0.0")
+app = FastAPI(title="SBA Backend", version="1.0.0", default_response_class=FastJSONResponse)
 
 # Configure CORS
 # Note: Cannot use allow_origins=["*"] with allow_credentials=True
@@ -48,6 +53,11 @@ app.add_middleware(
   max_age=3600,  # Cache preflight requests for 1 hour
 )
 
+# Inside the metrics middleware, so the profile_captured log line carries the request's trace id
+app.middleware("http")(profiling.profiling_middleware)
+# Registered after CORS so it wraps the whole request, including preflights
+app.middleware("http")(metrics.metrics_middleware)
+
 
 app.include_router(auth_controller.router)
 app.include_router(employee_controller.router)
@@ -57,9 +67,39 @@ app.include_router(data_source_controller.router)
 app.include_router(chat_controller.router)
 app.include_router(integration_controller.router)
 app.include_router(rag_controller.router)
+app.include_router(debug_controller.router)
+
+
+@app.on_event("startup")
+async def on_startup():
+  await chat_service.ensure_indexes()
+  await document_service.ensure_indexes()
+  await employee_service.ensure_indexes()
+  reindex_service.start()
+  retention_service.start()
+  profiling.start_continuous()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+  await retention_service.stop()
+  await reindex_service.stop()
+  profiling.stop_continuous()
+  await token_manager.flush()
+  await sync_service.close_http_client()
+  await llm.close_backend()
+  ocr_service.shutdown_pool()
+  deadline.shutdown_executor()
 
 
 @app.get("/health")
 async def health():
-  return {"status": "ok"}
+  # Always 200 while the process is up; "degraded" when a dependency's circuit is not closed
+  dependencies = circuit_breaker.snapshot()
+  degraded = any(info["state"] != circuit_breaker.CLOSED for info in dependencies.values())
+  return {"status": "degraded" if degraded else "ok", "dependencies": dependencies}
+
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+  return metrics.metrics_response()
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -16,4 +16,7 @@ class ChatMessagePublic(BaseModel):
   user_id: Optional[str] = None
   conversation_id: Optional[str] = None
   created_at: datetime
-
+  degradations: Optional[List[str]] = Field(
+    default=None,
+    description="Deadline degradations (stage:action) applied while answering; only set on a new assistant reply",
+  )
@@ -18,3 +18,17 @@ class DocumentPublic(BaseModel):
   cloud_link: Optional[str] = None
   created_at: datetime
 
+
+class DocumentIngestResult(BaseModel):
+  document: DocumentPublic
+  pages: int = 0
+  ocr_pages: int = 0
+  chunks: int = 0
+  seconds: float = 0.0
+  pages_per_second_per_core: float = 0.0
+
+
+class DocumentUploadResult(DocumentIngestResult):
+  sha256: str
+  size_bytes: int
+  duplicate: bool = False
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import List, Optional
 from pydantic import BaseModel, EmailStr, Field
 
 
@@ -18,3 +19,19 @@ class EmployeePublic(BaseModel):
   role: str
   created_at: datetime
 
+
+class EmployeeImportError(BaseModel):
+  row: int
+  email: Optional[str] = None
+  error: str
+
+
+class EmployeeImportResult(BaseModel):
+  rows: int = 0
+  inserted: int = 0
+  duplicates: int = 0
+  invalid: int = 0
+  indexed: int = 0
+  errors: List[EmployeeImportError] = Field(default_factory=list)
+  errors_truncated: bool = False
+  seconds: float = 0.0
@@ -0,0 +1,28 @@
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+class RetrievalParams(BaseModel):
+  """Per-request knobs trading recall against latency; unset fields fall back to config."""
+
+  hnsw_ef: Optional[int] = Field(default=None, ge=1, le=4096, description="HNSW ef at search time (higher = better recall, slower)")
+  exact: Optional[bool] = Field(default=None, description="Brute-force search instead of HNSW")
+  score_threshold: Optional[float] = Field(default=None, description="Drop hits scoring below this")
+  payload_fields: Optional[List[str]] = Field(default=None, description="Payload fields to return (None = all)")
+  fanout: Optional[Dict[str, int]] = Field(default=None, description="Hits to fetch per collection, e.g. {\"documents\": 4}")
+  quantization_rescore: Optional[bool] = Field(default=None, description="Rescore quantized candidates with original vectors")
+  quantization_oversampling: Optional[float] = Field(default=None, ge=1.0, le=10.0, description="Candidate oversampling when quantized")
+
+  def with_defaults(self) -> "RetrievalParams":
+    from ..config import get_settings
+    settings = get_settings()
+    defaults = {
+      "hnsw_ef": settings.rag_hnsw_ef,
+      "exact": settings.rag_exact,
+      "score_threshold": settings.rag_score_threshold,
+      "payload_fields": settings.rag_payload_fields.split(",") if settings.rag_payload_fields else None,
+      "quantization_rescore": settings.rag_quantization_rescore,
+      "quantization_oversampling": settings.rag_quantization_oversampling,
+    }
+    values = self.model_dump()
+    return RetrievalParams(**{k: (values[k] if values[k] is not None else defaults.get(k)) for k in values})
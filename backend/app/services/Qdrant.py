@@ -1,17 +1,30 @@
+import asyncio
 import hashlib
+import logging
+import math
+import time
 from typing import Optional
-from ..database import connect_qdrant
+from ..database import connect_qdrant, get_collection
 from ..config import get_settings
+from ..models.retrieval import RetrievalParams
 from qdrant_client.models import (
+    FieldCondition,
+    Filter,
+    MatchValue,
+    PayloadSchemaType,
+    PointIdsList,
     PointStruct,
+    QuantizationSearchParams,
+    SearchParams,
+    SearchRequest,
     VectorParams,
     Distance,
 )
-from ..utils.embedding import get_embedding, get_embedding_dimension
-
-# Get embedding dimension dynamically - will be set on first use
-# Default to 1024 as that seems to be the actual dimension of the model
-EMBEDDING_DIMENSION = 1024  # Updated based on actual model output
+from ..utils.circuit_breaker import get_breaker
+from ..utils.deadline import offload
+from ..utils.embedding import get_embedding, get_embeddings, get_embedding_dimension, truncate_embeddings
+from ..utils.metrics import QDRANT_LATENCY, timed
+from ..utils.tracing import log_event
 
 settings = get_settings()
 
@@ -19,9 +32,20 @@ settings = get_settings()
 QDRANT_COLLECTIONS = {
     "documents": "documents",
     "chat_messages": "chat_messages",
+    "synced_items": "synced_items",
+    "document_chunks": "document_chunks",
+    "employees": "employees",
     # Add more collections as needed
 }
 
+# Collections holding one user's private data: searched only with a user id, and only that user's points
+USER_SCOPED_COLLECTIONS = {"synced_items"}
+
+
+def qdrant_available() -> bool:
+    """Qdrant is configured and its circuit breaker is not open (callers skip embedding work otherwise)."""
+    return bool(settings.qdrant_url) and get_breaker("qdrant").available()
+
 
 def _generate_qdrant_id(doc_id: str) -> int:
     """
@@ -35,14 +59,16 @@ def _generate_qdrant_id(doc_id: str) -> int:
     return qdrant_id % (2**63 - 1)
 
 
+def ensure_user_index(client, qdrant_collection: str) -> None:
+    """Index the owner field that every search of a user-scoped collection filters on."""
+    client.create_payload_index(qdrant_collection, "user_id", field_schema=PayloadSchemaType.KEYWORD)
+
+
 def _init_qdrant_collection_if_needed(client, collection_name: str, vector_size: Optional[int] = None):
     """Initialize Qdrant collection if it doesn't exist"""
     if vector_size is None:
-        # Get actual embedding dimension dynamically
-        try:
-            vector_size = get_embedding_dimension()
-        except Exception:
-            vector_size = EMBEDDING_DIMENSION
+        # Get the configured (possibly Matryoshka-truncated) dimension for this collection
+        vector_size = get_embedding_dimension(collection_name)
     
     try:
         if not client.collection_exists(collection_name):
@@ -55,6 +81,8 @@ def _init_qdrant_collection_if_needed(client, collection_name: str, vector_size:
                 )
             )
             print(f"Created Qdrant collection '{collection_name}' with dimension {vector_size}")
+            if collection_name in USER_SCOPED_COLLECTIONS:
+                ensure_user_index(client, collection_name)
     except Exception as e:
         # If collection already exists, we need to check if it has the right dimension
         if "already exists" in str(e).lower() or "exists" in str(e).lower():
@@ -71,7 +99,39 @@ def _init_qdrant_collection_if_needed(client, collection_name: str, vector_size:
             print(f"Note: Qdrant collection '{collection_name}' initialization: {e}")
 
 
-async def insert_vector(collection_name: str, doc_id: str, text: str) -> bool:
+# Versioned collections currently being rebuilt by a reindex job, keyed by the
+# live Qdrant collection (alias) name. Writes are mirrored there so documents
+# created, changed or deleted while the job runs are right after the alias switch.
+# Jobs run on one worker but every worker writes, so the running jobs are read
+# from Mongo (refreshed every REINDEX_TARGETS_REFRESH_SECONDS); this worker's
+# own jobs are registered here directly.
+REINDEX_TARGETS_REFRESH_SECONDS = 5.0
+_reindex_targets: dict[str, str] = {}
+_shared_targets: tuple[dict[str, str], float] = ({}, 0.0)
+
+
+async def _mirror_target(qdrant_collection: str) -> Optional[str]:
+    global _shared_targets
+    targets, expires = _shared_targets
+    if time.monotonic() >= expires:
+        try:
+            jobs = get_collection("reindex_jobs").find({"status": "running"}, {"alias": 1, "target": 1})
+            targets = {job["alias"]: job["target"] async for job in jobs}
+        except Exception as e:
+            log_event("reindex_targets_refresh_failed", level=logging.WARNING, error=str(e))
+        _shared_targets = (targets, time.monotonic() + REINDEX_TARGETS_REFRESH_SECONDS)
+    return _reindex_targets.get(qdrant_collection) or targets.get(qdrant_collection)
+
+
+def register_reindex_target(qdrant_collection: str, target_collection: str) -> None:
+    _reindex_targets[qdrant_collection] = target_collection
+
+
+def unregister_reindex_target(qdrant_collection: str) -> None:
+    _reindex_targets.pop(qdrant_collection, None)
+
+
+async def insert_vector(collection_name: str, doc_id: str, text: str, payload: Optional[dict] = None) -> bool:
     """
     Insert a vector embedding into Qdrant for semantic search.
     
@@ -79,94 +139,200 @@ async def insert_vector(collection_name: str, doc_id: str, text: str) -> bool:
         collection_name: Name of the MongoDB collection (will map to Qdrant collection)
         doc_id: MongoDB document ID (ObjectId as string)
         text: Text content to embed and store
+        payload: Extra payload fields stored alongside the vector
         
     Returns:
         True if successful, False otherwise (fails silently if Qdrant not configured)
     """
-    # Skip if Qdrant is not configured
-    if not settings.qdrant_url:
-        return False
+    return await insert_vectors(collection_name, [{"id": doc_id, "text": text, "payload": payload}]) > 0
+
+
+async def insert_vectors(
+    collection_name: str,
+    items: list[dict],
+    target_collection: Optional[str] = None,
+) -> int:
+    """
+    Embed several texts in one encoder batch and upsert them in one Qdrant call.
+    
+    Args:
+        collection_name: Name of the MongoDB collection (will map to Qdrant collection)
+        items: Dicts with "id" (MongoDB document ID), "text" and optional "payload"
+        target_collection: Write to this Qdrant collection instead of the mapped one (used by reindexing)
+        
+    Returns:
+        Number of vectors written (0 on failure or if Qdrant is not configured)
+    """
+    # Skip if Qdrant is not configured or currently down
+    if not qdrant_available() or not items:
+        return 0
     
     try:
         # Get Qdrant client
         client = connect_qdrant()
         
         # Map MongoDB collection name to Qdrant collection name
-        qdrant_collection = QDRANT_COLLECTIONS.get(collection_name, collection_name)
+        qdrant_collection = target_collection or QDRANT_COLLECTIONS.get(collection_name, collection_name)
         
         # Get actual embedding dimension
-        try:
-            actual_dimension = get_embedding_dimension()
-        except Exception:
-            actual_dimension = EMBEDDING_DIMENSION
+        actual_dimension = get_embedding_dimension(collection_name)
+        
+        # The collection being rebuilt, if any, gets every write even while the live one can't take it
+        mirror = await _mirror_target(qdrant_collection) if target_collection is None else None
         
         # Check if collection exists and verify dimension
-        collection_exists = False
-        correct_dimension = True
+        write_live = True
         try:
             if client.collection_exists(qdrant_collection):
-                collection_exists = True
                 collection_info = client.get_collection(qdrant_collection)
                 existing_size = collection_info.config.params.vectors.size
                 if existing_size != actual_dimension:
-                    correct_dimension = False
-                    print(f"ERROR: Qdrant collection '{qdrant_collection}' has dimension {existing_size}, but model outputs {actual_dimension}.")
-                    print(f"Please delete and recreate the collection '{qdrant_collection}' with dimension {actual_dimension}.")
-                    return False
+                    if mirror:
+                        # Reindex for the dimension change in progress: only the new collection is written
+                        write_live = False
+                    else:
+                        print(f"ERROR: Qdrant collection '{qdrant_collection}' has dimension {existing_size}, but model outputs {actual_dimension}.")
+                        print(f"Please reindex the collection '{qdrant_collection}' (POST /rag/reindex/{collection_name}) with dimension {actual_dimension}.")
+                        return 0
         except Exception as e:
             # If we can't check, try to create/initialize anyway
             print(f"Could not check collection info: {e}")
         
         # Initialize collection if needed (will only create if doesn't exist)
-        _init_qdrant_collection_if_needed(client, qdrant_collection, vector_size=actual_dimension)
+        if write_live:
+            _init_qdrant_collection_if_needed(client, qdrant_collection, vector_size=actual_dimension)
         
-        # Generate embedding
-        vector = get_embedding(text)
+        # Generate embeddings in a single batch, off the event loop
+        vectors = await asyncio.to_thread(get_embeddings, [item["text"] for item in items], actual_dimension)
         
         # Verify vector dimension matches
-        if len(vector) != actual_dimension:
-            print(f"ERROR: Generated vector has dimension {len(vector)}, but expected {actual_dimension}.")
-            return False
+        if any(len(vector) != actual_dimension for vector in vectors):
+            print(f"ERROR: Generated vectors do not match the expected dimension {actual_dimension}.")
+            return 0
         
-        # Generate consistent Qdrant ID from MongoDB ID
-        qdrant_id = _generate_qdrant_id(doc_id)
+        points = [
+            PointStruct(
+                # Generate consistent Qdrant ID from MongoDB ID
+                id=_generate_qdrant_id(item["id"]),
+                vector=vector,
+                payload={
+                    **(item.get("payload") or {}),
+                    "mongo_id": item["id"],
+                    "collection": collection_name,
+                }
+            )
+            for item, vector in zip(items, vectors)
+        ]
         
-        # Insert/update vector in Qdrant
-        client.upsert(
-            collection_name=qdrant_collection,
-            points=[
-                PointStruct(
-                    id=qdrant_id,
-                    vector=vector,
-                    payload={
-                        "mongo_id": doc_id,
-                        "collection": collection_name,
-                    }
-                )
-            ]
-        )
-        return True
+        # Insert/update vectors in Qdrant
+        if write_live:
+            with timed(QDRANT_LATENCY, "qdrant_upsert", operation="upsert", collection=qdrant_collection):
+                client.upsert(collection_name=qdrant_collection, points=points)
+        
+        # Mirror into the collection being rebuilt, if any
+        if mirror:
+            try:
+                with timed(QDRANT_LATENCY, "qdrant_upsert", operation="upsert", collection=mirror):
+                    client.upsert(collection_name=mirror, points=points)
+            except Exception as e:
+                log_event("qdrant_mirror_failed", level=logging.WARNING, collection=mirror, error=str(e))
+                if not write_live:
+                    return 0
+        return len(points)
     except Exception as e:
         # Log error but don't fail the request
-        print(f"Error inserting vector into Qdrant: {e}")
+        log_event("qdrant_upsert_failed", level=logging.WARNING, collection=collection_name, error=str(e))
+        return 0
+
+
+async def delete_vectors(collection_name: str, doc_ids: list[str]) -> bool:
+    """Delete the vectors of the given MongoDB documents (no-op if Qdrant is not configured)"""
+    if not qdrant_available() or not doc_ids:
         return False
+    try:
+        client = connect_qdrant()
+        qdrant_collection = QDRANT_COLLECTIONS.get(collection_name, collection_name)
+        if not client.collection_exists(qdrant_collection):
+            return False
+        points = PointIdsList(points=[_generate_qdrant_id(doc_id) for doc_id in doc_ids])
+        with timed(QDRANT_LATENCY, "qdrant_delete", operation="delete", collection=qdrant_collection):
+            client.delete(collection_name=qdrant_collection, points_selector=points)
+        
+        # The collection being rebuilt may already hold these points
+        mirror = await _mirror_target(qdrant_collection)
+        if mirror:
+            try:
+                with timed(QDRANT_LATENCY, "qdrant_delete", operation="delete", collection=mirror):
+                    client.delete(collection_name=mirror, points_selector=points)
+            except Exception as e:
+                log_event("qdrant_mirror_failed", level=logging.WARNING, collection=mirror, error=str(e))
+        return True
+    except Exception as e:
+        log_event("qdrant_delete_failed", level=logging.WARNING, collection=collection_name, error=str(e))
+        return False
+
+
+def _user_filter(collection_name: str, user_id: Optional[str]) -> Optional[Filter]:
+    if collection_name not in USER_SCOPED_COLLECTIONS:
+        return None
+    return Filter(must=[FieldCondition(key="user_id", match=MatchValue(value=user_id))])
 
 
-async def semantic_search(collection_name: str, query: str, limit: int = 2):
+def _search_params(params: Optional[RetrievalParams]) -> Optional[SearchParams]:
+    if params is None:
+        return None
+    quantization = None
+    if params.quantization_rescore is not None or params.quantization_oversampling is not None:
+        quantization = QuantizationSearchParams(
+            rescore=params.quantization_rescore,
+            oversampling=params.quantization_oversampling,
+        )
+    return SearchParams(hnsw_ef=params.hnsw_ef, exact=bool(params.exact), quantization=quantization)
+
+
+async def semantic_search(
+    collection_name: str,
+    query: str,
+    limit: int = 2,
+    params: Optional[RetrievalParams] = None,
+    vector: Optional[list[float]] = None,
+    user_id: Optional[str] = None,
+    timeout: Optional[float] = None,
+):
     """
     Perform semantic search in Qdrant.
+
+    The Qdrant client is synchronous, so the search runs in the deadline worker pool: the event
+    loop stays free, several collections can be searched at once and callers can time out on it.
     
     Args:
         collection_name: Name of the MongoDB collection
         query: Search query text
         limit: Maximum number of results
+        params: HNSW ef / exact mode / score threshold / payload fields / quantization settings
+        vector: Precomputed query embedding (skips embedding `query` again)
+        user_id: Caller whose points are searched in user-scoped collections (nothing is returned from them without it)
+        timeout: Seconds the caller will wait; Qdrant is asked to give up the search after that too
         
     Returns:
         List of search results or empty list if Qdrant not configured
     """
-    if not settings.qdrant_url:
+    if not qdrant_available():
         return []
-    
+    if collection_name in USER_SCOPED_COLLECTIONS and not user_id:
+        return []
+    return await offload(_semantic_search, collection_name, query, limit, params, vector, user_id, timeout)
+
+
+def _semantic_search(
+    collection_name: str,
+    query: str,
+    limit: int,
+    params: Optional[RetrievalParams],
+    vector: Optional[list[float]],
+    user_id: Optional[str] = None,
+    timeout: Optional[float] = None,
+):
     try:
         client = connect_qdrant()
         qdrant_collection = QDRANT_COLLECTIONS.get(collection_name, collection_name)
@@ -175,10 +341,7 @@ async def semantic_search(collection_name: str, query: str, limit: int = 2):
             return []
         
         # Get actual embedding dimension and verify collection dimension
-        try:
-            actual_dimension = get_embedding_dimension()
-        except Exception:
-            actual_dimension = EMBEDDING_DIMENSION
+        actual_dimension = get_embedding_dimension(collection_name)
         
         # Check collection dimension
         try:
@@ -186,113 +349,114 @@ async def semantic_search(collection_name: str, query: str, limit: int = 2):
             existing_size = collection_info.config.params.vectors.size
             if existing_size != actual_dimension:
                 print(f"ERROR: Qdrant collection '{qdrant_collection}' has dimension {existing_size}, but model outputs {actual_dimension}.")
-                print(f"Please delete and recreate the collection '{qdrant_collection}' with dimension {actual_dimension}.")
+                print(f"Please reindex the collection '{qdrant_collection}' (POST /rag/reindex/{collection_name}) with dimension {actual_dimension}.")
                 return []
         except Exception as e:
             print(f"Could not verify collection dimension: {e}")
         
-        vector = get_embedding(query)
+        if vector is None:
+            vector = get_embedding(query, actual_dimension)
+        else:
+            # A full-size vector shared across collections is truncated to this collection's size
+            vector = truncate_embeddings([vector], actual_dimension)[0]
         
         # Verify vector dimension
         if len(vector) != actual_dimension:
             print(f"ERROR: Generated vector has dimension {len(vector)}, but expected {actual_dimension}.")
             return []
         
-        results = client.search(
-            collection_name=qdrant_collection,
-            query_vector=vector,
-            limit=limit
-        )
+        with timed(QDRANT_LATENCY, "qdrant_search", operation="search", collection=qdrant_collection):
+            results = client.search(
+                collection_name=qdrant_collection,
+                query_vector=vector,
+                query_filter=_user_filter(collection_name, user_id),
+                limit=limit,
+                # Server-side limit in whole seconds, so an abandoned search does not keep running
+                timeout=max(1, math.ceil(timeout)) if timeout else None,
+                search_params=_search_params(params),
+                score_threshold=params.score_threshold if params else None,
+                # mongo_id is always kept so hits can be traced back to their source document
+                with_payload=[*params.payload_fields, "mongo_id"] if params and params.payload_fields is not None else True,
+            )
         return results
     except Exception as e:
-        print(f"Error performing semantic search: {e}")
+        log_event("qdrant_search_failed", level=logging.WARNING, collection=collection_name, error=str(e))
         return []
 
-async def recreate_collection_with_correct_dimension(collection_name: str) -> bool:
+async def semantic_search_batch(
+    collection_name: str,
+    vectors: list[list[float]],
+    limit: int = 2,
+    params: Optional[RetrievalParams] = None,
+    user_id: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> list[list]:
     """
-    Delete and recreate a Qdrant collection with the correct embedding dimension.
-    WARNING: This will delete all existing vectors in the collection!
+    Search one collection for many precomputed query vectors in a single Qdrant call.
+    
+    Runs in the deadline worker pool, like semantic_search.
     
     Args:
-        collection_name: Name of the Qdrant collection to recreate
+        collection_name: Name of the MongoDB collection
+        vectors: Full-size query embeddings (truncated to the collection's dimension here)
+        limit: Maximum number of results per query
+        params: HNSW ef / exact mode / score threshold / payload fields / quantization settings
+        user_id: Caller whose points are searched in user-scoped collections
+        timeout: Seconds the caller will wait; Qdrant is asked to give up the search after that too
         
     Returns:
-        True if successful, False otherwise
+        One list of search results per vector (all empty if Qdrant is not configured or the search fails)
     """
-    if not settings.qdrant_url:
-        print("Qdrant is not configured. Cannot recreate collection.")
-        return False
-    
+    if not qdrant_available() or not vectors:
+        return [[] for _ in vectors]
+    if collection_name in USER_SCOPED_COLLECTIONS and not user_id:
+        return [[] for _ in vectors]
+    return await offload(_semantic_search_batch, collection_name, vectors, limit, params, user_id, timeout)
+
+
+def _semantic_search_batch(
+    collection_name: str,
+    vectors: list[list[float]],
+    limit: int,
+    params: Optional[RetrievalParams],
+    user_id: Optional[str],
+    timeout: Optional[float] = None,
+) -> list[list]:
     try:
         client = connect_qdrant()
         qdrant_collection = QDRANT_COLLECTIONS.get(collection_name, collection_name)
+        if not client.collection_exists(qdrant_collection):
+            return [[] for _ in vectors]
         
-        # Get actual embedding dimension
-        try:
-            actual_dimension = get_embedding_dimension()
-        except Exception:
-            actual_dimension = EMBEDDING_DIMENSION
-        
-        # Check if collection exists
-        if client.collection_exists(qdrant_collection):
-            try:
-                collection_info = client.get_collection(qdrant_collection)
-                existing_size = collection_info.config.params.vectors.size
-                
-                if existing_size == actual_dimension:
-                    print(f"Collection '{qdrant_collection}' already has correct dimension {actual_dimension}. No action needed.")
-                    return True
-                
-                print(f"Deleting collection '{qdrant_collection}' with incorrect dimension {existing_size}...")
-                client.delete_collection(qdrant_collection)
-                print(f"Collection '{qdrant_collection}' deleted successfully.")
-            except Exception as e:
-                print(f"Error deleting collection '{qdrant_collection}': {e}")
-                return False
+        actual_dimension = get_embedding_dimension(collection_name)
+        existing_size = client.get_collection(qdrant_collection).config.params.vectors.size
+        if existing_size != actual_dimension:
+            print(f"ERROR: Qdrant collection '{qdrant_collection}' has dimension {existing_size}, but model outputs {actual_dimension}.")
+            return [[] for _ in vectors]
         
-        # Create collection with correct dimension
-        print(f"Creating collection '{qdrant_collection}' with dimension {actual_dimension}...")
-        client.create_collection(
-            collection_name=qdrant_collection,
-            vectors_config=VectorParams(
-                size=actual_dimension,
-                distance=Distance.COSINE
+        search_params = _search_params(params)
+        with_payload = [*params.payload_fields, "mongo_id"] if params and params.payload_fields is not None else True
+        query_filter = _user_filter(collection_name, user_id)
+        requests = [
+            SearchRequest(
+                vector=vector,
+                filter=query_filter,
+                limit=limit,
+                params=search_params,
+                score_threshold=params.score_threshold if params else None,
+                with_payload=with_payload,
+            )
+            for vector in truncate_embeddings(vectors, actual_dimension)
+        ]
+        with timed(QDRANT_LATENCY, "qdrant_search", operation="search_batch", collection=qdrant_collection):
+            return client.search_batch(
+                collection_name=qdrant_collection,
+                requests=requests,
+                timeout=max(1, math.ceil(timeout)) if timeout else None,
             )
-        )
-        print(f"Collection '{qdrant_collection}' created successfully with dimension {actual_dimension}.")
-        return True
-        
     except Exception as e:
-        print(f"Error recreating collection '{qdrant_collection}': {e}")
-        return False
-
-
-async def fix_all_collections() -> dict[str, bool]:
-    """
-    Fix all Qdrant collections by recreating them with the correct dimension.
-    WARNING: This will delete all existing vectors in all collections!
-    
-    Returns:
-        Dictionary mapping collection names to success status
-    """
-    results = {}
-    collections_to_fix = list(QDRANT_COLLECTIONS.keys())
-    
-    print("=" * 60)
-    print("Fixing Qdrant collections with correct embedding dimension...")
-    print("=" * 60)
-    
-    for collection_name in collections_to_fix:
-        print(f"\nFixing collection: {collection_name}")
-        results[collection_name] = await recreate_collection_with_correct_dimension(collection_name)
-        print()
-    
-    print("=" * 60)
-    print("Collection fix completed!")
-    print("=" * 60)
-    
-    return results
-
+        log_event("qdrant_search_failed", level=logging.WARNING, collection=collection_name, error=str(e))
+        return [[] for _ in vectors]
 
 async def create_text_index(db, collection: str):
     if "text_index" not in await db[collection].index_information():
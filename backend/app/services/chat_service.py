@@ -5,18 +5,36 @@ from fastapi import HTTPException, status
 
 from ..database import get_collection
 from ..models.chat import ChatMessageCreate, ChatMessagePublic
+from ..utils.deadline import Deadline, DeadlineExceeded
 from .Qdrant import insert_vector
-from . import rag
+from . import rag, retention_service
 
 chat_collection: AsyncIOMotorCollection = get_collection("chat_messages")
 
 
-async def create_message(payload: ChatMessageCreate, user_id: Optional[str] = None) -> ChatMessagePublic:
+async def ensure_indexes() -> None:
+  # Conversation history (newest first per user / conversation) and exports in (created_at, _id) order
+  await chat_collection.create_index([("created_at", 1), ("_id", 1)], name="recent")
+  await chat_collection.create_index([("user_id", 1), ("created_at", 1), ("_id", 1)], name="user_recent")
+  await chat_collection.create_index([("conversation_id", 1), ("created_at", 1), ("_id", 1)], name="conversation_recent")
+
+
+async def create_message(
+  payload: ChatMessageCreate,
+  user_id: Optional[str] = None,
+  deadline: Optional[Deadline] = None,
+  search_user_id: Optional[str] = None,
+) -> ChatMessagePublic:
   """
   Create a user message and generate an assistant response using RAG.
   
+  History, retrieval and generation share the request `deadline` (REQUEST_DEADLINE_SECONDS
+  by default); stages that run out degrade and are listed in `degradations`.
+  Private synced items are searched only for `search_user_id`, the caller identity the
+  deployment vouches for (see security.trusted_user_id), never for the payload's user_id.
   Returns the assistant's response message.
   """
+  deadline = deadline or Deadline.from_settings()
   # Determine user_id (from payload or parameter)
   effective_user_id = payload.user_id or user_id or "default"
   
@@ -32,21 +50,25 @@ async def create_message(payload: ChatMessageCreate, user_id: Optional[str] = No
   user_doc_id = str(user_result.inserted_id)
   
   # Insert user message vector into Qdrant for semantic search (non-blocking)
-  await insert_vector("chat_messages", user_doc_id, payload.content)
+  if retention_service.should_embed(payload.content):
+    await insert_vector(
+      "chat_messages",
+      user_doc_id,
+      payload.content,
+      retention_service.vector_payload(effective_user_id, "user", user_doc["created_at"]),
+    )
   
   # 2. Get conversation history for context (last 10 messages)
-  history = await get_conversation_history(
-    user_id=effective_user_id,
-    conversation_id=payload.conversation_id,
-    limit=10
+  history = await deadline.run(
+    "history",
+    get_conversation_history(user_id=effective_user_id, conversation_id=payload.conversation_id, limit=10),
+    "skipped_history",
+    [],
   )
   
   # 3. Search for relevant context across multiple collections
   try:
-    relevant_docs = await rag.search_multiple_collections(
-      query=payload.content,
-      top_k_per_collection=2
-    )
+    relevant_docs = await rag.search_multiple_collections(query=payload.content, deadline=deadline, user_id=search_user_id)
   except Exception as e:
     print(f"Error searching collections: {e}")
     relevant_docs = []
@@ -63,16 +85,22 @@ async def create_message(payload: ChatMessageCreate, user_id: Optional[str] = No
   )
   
   # 5. Generate assistant response using RAG
+  fallback = False
   try:
-    assistant_content = await rag.call_llm(prompt)
+    assistant_content = await rag.call_llm(prompt, deadline=deadline)
+  except DeadlineExceeded:
+    fallback = True
+    assistant_content = "I'm sorry, I couldn't finish an answer in time. Please try again."
   except ValueError as e:
     # If LLM is not configured or fails, provide a fallback response
+    fallback = True
     assistant_content = (
       "I apologize, but I'm unable to generate a response right now. "
       "Please ensure the Qwen API is configured correctly. "
       f"Error: {str(e)}"
     )
   except Exception as e:
+    fallback = True
     assistant_content = (
       "I apologize, but I encountered an error while generating a response. "
       f"Error: {str(e)}"
@@ -85,12 +113,19 @@ async def create_message(payload: ChatMessageCreate, user_id: Optional[str] = No
     "user_id": effective_user_id,
     "conversation_id": payload.conversation_id,
     "created_at": datetime.utcnow(),
+    "fallback": fallback,
   }
   assistant_result = await chat_collection.insert_one(assistant_doc)
   assistant_doc_id = str(assistant_result.inserted_id)
   
-  # Insert assistant response vector into Qdrant (non-blocking)
-  await insert_vector("chat_messages", assistant_doc_id, assistant_content)
+  # Insert assistant response vector into Qdrant (non-blocking); error fallbacks are not worth retrieving
+  if retention_service.should_embed(assistant_content, fallback=fallback):
+    await insert_vector(
+      "chat_messages",
+      assistant_doc_id,
+      assistant_content,
+      retention_service.vector_payload(effective_user_id, "assistant", assistant_doc["created_at"]),
+    )
   
   # 7. Return assistant response
   return ChatMessagePublic(
@@ -100,6 +135,7 @@ async def create_message(payload: ChatMessageCreate, user_id: Optional[str] = No
     user_id=effective_user_id,
     conversation_id=payload.conversation_id,
     created_at=assistant_doc["created_at"],
+    degradations=deadline.degradations,
   )
 
 
@@ -119,7 +155,8 @@ async def get_conversation_history(
   messages: List[ChatMessagePublic] = []
   async for doc in cursor:
     messages.append(
-      ChatMessagePublic(
+      # Trusted Mongo data: skip validation
+      ChatMessagePublic.model_construct(
         id=str(doc["_id"]),
         content=doc["content"],
         role=doc.get("role", "user"),
@@ -147,7 +184,8 @@ async def list_messages(
   messages: List[ChatMessagePublic] = []
   async for doc in cursor:
     messages.append(
-      ChatMessagePublic(
+      # Trusted Mongo data: skip validation
+      ChatMessagePublic.model_construct(
         id=str(doc["_id"]),
         content=doc["content"],
         role=doc.get("role", "user"),
@@ -1,12 +1,39 @@
-from datetime import datetime
-from typing import List
+import base64
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from bson import ObjectId
+from fastapi import HTTPException, Request, status
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pydantic import ValidationError
+from pymongo.errors import DuplicateKeyError, ExecutionTimeout
 
 from ..database import get_collection
-from ..models.document import DocumentCreate, DocumentPublic
-from .Qdrant import insert_vector
+from ..models.document import DocumentCreate, DocumentPublic, DocumentUploadResult
+from ..utils.metrics import record_cache
+from ..utils.multipart_stream import read_multipart
+from . import storage_service
+from .Qdrant import delete_vectors, insert_vector, insert_vectors
 
 documents_collection: AsyncIOMotorCollection = get_collection("documents")
+chunks_collection: AsyncIOMotorCollection = get_collection("document_chunks")
+
+CHUNK_SIZE = 1200  # characters
+CHUNK_OVERLAP = 200
+CHUNK_BATCH_SIZE = 32
+
+# Only the fields DocumentPublic needs (skips sha256, storage keys, ingest status...)
+LISTING_PROJECTION = {"title": 1, "category": 1, "filename": 1, "cloud_link": 1, "created_at": 1}
+COUNT_CACHE_TTL = 60.0  # seconds
+# A "processing" upload older than this is considered abandoned (its worker died) and may be retried
+INGEST_STALE_AFTER = timedelta(minutes=30)
+COUNT_MAX_TIME_MS = 2000
+COUNT_CACHE_SIZE = 256  # distinct listing filters kept (least recently used are evicted)
+
+# listing filter -> (total or None if counting timed out, expires at), in LRU order
+_count_cache: "OrderedDict[str, Tuple[Optional[int], float]]" = OrderedDict()
 
 
 async def add_document(payload: DocumentCreate) -> DocumentPublic:
@@ -32,21 +59,302 @@ async def add_document(payload: DocumentCreate) -> DocumentPublic:
   return DocumentPublic(id=doc_id, **doc)
 
 
-async def list_recent_documents(limit: int = 5) -> List[DocumentPublic]:
-  cursor = (
-    documents_collection.find().sort("created_at", -1).limit(limit)
+async def ensure_indexes() -> None:
+  # Unique only among documents that have a content hash (metadata-only documents have none)
+  await documents_collection.create_index(
+    "sha256", unique=True, partialFilterExpression={"sha256": {"$type": "string"}}, name="sha256_unique"
   )
-  documents = []
-  async for doc in cursor:
-    documents.append(
-      DocumentPublic(
-        id=str(doc["_id"]),
-        title=doc["title"],
-        category=doc["category"],
-        filename=doc["filename"],
-        cloud_link=doc.get("cloud_link"),
-        created_at=doc["created_at"],
+  await chunks_collection.create_index([("document_id", 1), ("page", 1), ("chunk_index", 1)], name="document_pages")
+  # Keyset pagination for GET /documents, with and without a category filter
+  await documents_collection.create_index([("created_at", -1), ("_id", -1)], name="recent")
+  await documents_collection.create_index([("category", 1), ("created_at", -1), ("_id", -1)], name="category_recent")
+
+
+def _to_public(doc: dict) -> DocumentPublic:
+  # Trusted Mongo data: skip validation
+  return DocumentPublic.model_construct(
+    id=str(doc["_id"]),
+    title=doc["title"],
+    category=doc["category"],
+    filename=doc["filename"],
+    cloud_link=str(doc["cloud_link"]) if doc.get("cloud_link") else None,
+    created_at=doc["created_at"],
+  )
+
+
+async def _clear_chunks(document_id: str) -> None:
+  """Remove chunks left by an earlier, failed ingestion of the same document."""
+  chunk_ids = [str(c["_id"]) async for c in chunks_collection.find({"document_id": document_id}, {"_id": 1})]
+  if chunk_ids:
+    await delete_vectors("document_chunks", chunk_ids)
+    await chunks_collection.delete_many({"document_id": document_id})
+
+
+async def remove_document(document_id: str) -> None:
+  """Delete a document with its chunks and vectors (used to roll back a failed ingestion)."""
+  await _clear_chunks(document_id)
+  await delete_vectors("documents", [document_id])
+  await documents_collection.delete_one({"_id": ObjectId(document_id)})
+
+
+async def upload_document(request: Request) -> DocumentUploadResult:
+  """Stream a multipart upload (`file`, `title`, `category`) into storage and index it.
+
+  Content already ingested or being ingested (same sha256) is not extracted or
+  embedded again; the existing document is returned with `duplicate=True`. An
+  upload whose earlier ingestion failed or was abandoned is taken over.
+  """
+  from . import ocr_service
+
+  writer: Optional[storage_service.StorageWriter] = None
+
+  async def open_file(field: str, filename: str, content_type: Optional[str]):
+    nonlocal writer
+    if field != "file" or writer is not None:
+      raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Send exactly one file in the 'file' field.")
+    writer = storage_service.open_writer(filename, content_type)
+    return writer
+
+  try:
+    fields = await read_multipart(request, open_file)
+    if writer is None:
+      raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing 'file' field.")
+    try:
+      payload = DocumentCreate(title=fields.get("title", ""), category=fields.get("category", ""), filename=writer.filename)
+    except ValidationError as e:
+      raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=e.errors(include_url=False))
+    # Reject unsupported types before anything is stored or recorded
+    kind = ocr_service.detect_kind(writer.filename, writer.content_type)
+  except BaseException:
+    if writer is not None:
+      await writer.discard()
+    raise
+
+  digest = writer.sha256
+  now = datetime.utcnow()
+  existing = await documents_collection.find_one({"sha256": digest})
+  if existing:
+    doc = None
+    if existing.get("ingest_status") == "failed" or (
+      existing.get("ingest_status") == "processing"
+      and existing.get("ingest_started_at", existing["created_at"]) < now - INGEST_STALE_AFTER
+    ):
+      # Claim it only if nobody else did since we looked
+      doc = await documents_collection.find_one_and_update(
+        {
+          "_id": existing["_id"],
+          "ingest_status": existing["ingest_status"],
+          "ingest_started_at": existing.get("ingest_started_at"),
+        },
+        {"$set": {"ingest_status": "processing", "ingest_started_at": now}},
       )
+    if doc is None:
+      # Indexed, or still being ingested by another request
+      await writer.discard()
+      return DocumentUploadResult(document=_to_public(existing), sha256=digest, size_bytes=writer.size, duplicate=True)
+
+  key = await writer.commit()
+  if existing:
+    if doc.get("storage_key") and doc["storage_key"] != key:
+      await storage_service.delete(doc["storage_key"])
+    await documents_collection.update_one({"_id": doc["_id"]}, {"$set": {"storage_key": key}})
+    doc["storage_key"] = key
+    await _clear_chunks(str(doc["_id"]))
+  else:
+    doc = {
+      "title": payload.title,
+      "category": payload.category,
+      "filename": payload.filename,
+      "cloud_link": None,
+      "created_at": datetime.utcnow(),
+      "sha256": digest,
+      "size_bytes": writer.size,
+      "content_type": writer.content_type,
+      "storage_key": key,
+      "ingest_status": "processing",
+      "ingest_started_at": now,
+    }
+    try:
+      doc["_id"] = (await documents_collection.insert_one(doc)).inserted_id
+    except DuplicateKeyError:
+      # The same content was uploaded concurrently; the other request ingests it
+      existing = await documents_collection.find_one({"sha256": digest})
+      if existing is None or existing.get("storage_key") != key:
+        await storage_service.delete(key)
+      if existing is None:
+        # ...and it was removed again in the meantime
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="The same file was uploaded concurrently; retry the upload.")
+      return DocumentUploadResult(document=_to_public(existing), sha256=digest, size_bytes=writer.size, duplicate=True)
+    await insert_vector("documents", str(doc["_id"]), f"{payload.title} {payload.category}")
+
+  doc_id = str(doc["_id"])
+  try:
+    async with storage_service.local_path(key, suffix=os.path.splitext(doc["filename"])[1]) as path:
+      stats = await ocr_service.ingest_path(path, kind, doc_id, doc["title"])
+  except BaseException:
+    await documents_collection.update_one({"_id": doc["_id"]}, {"$set": {"ingest_status": "failed"}})
+    raise
+  await documents_collection.update_one({"_id": doc["_id"]}, {"$set": {"ingest_status": "indexed"}})
+  return DocumentUploadResult(document=_to_public(doc), sha256=digest, size_bytes=writer.size, **stats)
+
+
+def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+  """Split text into overlapping windows, preferring to break on whitespace."""
+  text = " ".join(text.split())
+  chunks = []
+  start = 0
+  while start < len(text):
+    end = min(start + size, len(text))
+    if end < len(text):
+      space = text.rfind(" ", start + size // 2, end)
+      if space != -1:
+        end = space
+    chunks.append(text[start:end].strip())
+    if end == len(text):
+      break
+    start = max(end - overlap, start + 1)
+  return [c for c in chunks if c]
+
+
+async def index_document_text(document_id: str, title: str, pages: AsyncIterator[Tuple[int, str]]) -> int:
+  """Chunk streamed page text, store the chunks and embed them in batches as pages arrive."""
+  pending: List[dict] = []
+  indexed = 0
+
+  async def flush() -> int:
+    result = await chunks_collection.insert_many(pending)
+    await insert_vectors(
+      "document_chunks",
+      [
+        {
+          "id": str(chunk_id),
+          "text": chunk["text"],
+          "payload": {"text": chunk["text"], "title": title, "page": chunk["page"], "document_id": document_id},
+        }
+        for chunk_id, chunk in zip(result.inserted_ids, pending)
+      ],
     )
+    return len(pending)
+
+  page, chunk_index = None, 0
+  async for page_number, page_text in pages:
+    if page_number != page:
+      # A page may arrive in several pieces (large text files); keep numbering its chunks
+      page, chunk_index = page_number, 0
+    for chunk in chunk_text(page_text):
+      pending.append({
+        "document_id": document_id,
+        "page": page_number,
+        "chunk_index": chunk_index,
+        "text": chunk,
+        "created_at": datetime.utcnow(),
+      })
+      chunk_index += 1
+      if len(pending) >= CHUNK_BATCH_SIZE:
+        indexed += await flush()
+        pending = []
+  if pending:
+    indexed += await flush()
+  return indexed
+
+
+def _encode_cursor(doc: dict) -> str:
+  raw = f"{doc['created_at'].isoformat()}|{doc['_id']}"
+  return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+  try:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    created_at, doc_id = raw.split("|", 1)
+    return datetime.fromisoformat(created_at), ObjectId(doc_id)
+  except Exception:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+
+def listing_filter(
+  category: Optional[str],
+  created_after: Optional[datetime],
+  created_before: Optional[datetime],
+) -> dict:
+  """Mongo filter for a category and a [created_after, created_before) window (shared by listings and exports)."""
+  query: dict = {}
+  if category:
+    query["category"] = category
+  if created_after or created_before:
+    query["created_at"] = {}
+    if created_after:
+      query["created_at"]["$gte"] = created_after
+    if created_before:
+      query["created_at"]["$lt"] = created_before
+  return query
+
+
+async def count_documents(
+  category: Optional[str] = None,
+  created_after: Optional[datetime] = None,
+  created_before: Optional[datetime] = None,
+) -> Optional[int]:
+  """
+  Document total for a listing filter, cached for COUNT_CACHE_TTL. Unfiltered totals come
+  from collection metadata (estimated_document_count) instead of scanning the collection.
+  Returns None when counting takes longer than COUNT_MAX_TIME_MS.
+  """
+  query = listing_filter(category, created_after, created_before)
+  key = repr(sorted(query.items()))
+  cached = _count_cache.get(key)
+  record_cache("document_count", cached is not None and cached[1] > time.monotonic())
+  if cached and cached[1] > time.monotonic():
+    _count_cache.move_to_end(key)
+    return cached[0]
+  if query:
+    try:
+      total = await documents_collection.count_documents(query, maxTimeMS=COUNT_MAX_TIME_MS)
+    except ExecutionTimeout:
+      # Too broad to count cheaply; remembered so the next pages don't pay the timeout again
+      total = None
+  else:
+    total = await documents_collection.estimated_document_count()
+  _count_cache[key] = (total, time.monotonic() + COUNT_CACHE_TTL)
+  _count_cache.move_to_end(key)
+  while len(_count_cache) > COUNT_CACHE_SIZE:
+    _count_cache.popitem(last=False)
+  return total
+
+
+async def list_documents(
+  limit: int = 5,
+  cursor: Optional[str] = None,
+  category: Optional[str] = None,
+  created_after: Optional[datetime] = None,
+  created_before: Optional[datetime] = None,
+) -> Tuple[List[DocumentPublic], Optional[str]]:
+  """
+  Newest documents first, one page at a time. Returns the page and the cursor for the
+  next one (None on the last page). Pages are keyset-based on (created_at, _id), so
+  every page is an index range scan no matter how deep it is.
+  """
+  query = listing_filter(category, created_after, created_before)
+  if cursor:
+    created_at, doc_id = _decode_cursor(cursor)
+    after_cursor = {"$or": [
+      {"created_at": {"$lt": created_at}},
+      {"created_at": created_at, "_id": {"$lt": doc_id}},
+    ]}
+    query = {"$and": [query, after_cursor]} if query else after_cursor
+
+  # One extra row tells whether there is a next page without a count
+  docs = await (
+    documents_collection.find(query, LISTING_PROJECTION)
+    .sort([("created_at", -1), ("_id", -1)])
+    .limit(limit + 1)
+    .to_list(length=limit + 1)
+  )
+  next_cursor = _encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+  return [_to_public(doc) for doc in docs[:limit]], next_cursor
+
+
+async def list_recent_documents(limit: int = 5) -> List[DocumentPublic]:
+  documents, _ = await list_documents(limit=limit)
   return documents
 
@@ -1,11 +1,42 @@
+import asyncio
+import logging
+import time
 from datetime import datetime
+from typing import Any, Dict, List, Optional
+from fastapi import HTTPException, Request, status
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 
 from ..database import get_collection
-from ..models.employee import EmployeeCreate, EmployeePublic
+from ..models.employee import EmployeeCreate, EmployeeImportError, EmployeeImportResult, EmployeePublic
+from ..utils.multipart_stream import read_multipart
+from ..utils.row_stream import RowDecoder, detect_format
+from ..utils.tracing import log_event
+from .Qdrant import insert_vector, insert_vectors
 
 employees_collection: AsyncIOMotorCollection = get_collection("employees")
 
+IMPORT_CHUNK_SIZE = 500
+IMPORT_MAX_ROWS = 50_000
+IMPORT_MAX_ERRORS = 1000
+
+
+async def ensure_indexes() -> None:
+  try:
+    await employees_collection.create_index("email", unique=True, name="email_unique")
+  except OperationFailure as e:
+    # Existing duplicates block the index; imports still work, just without the guarantee
+    log_event("employee_email_index_failed", level=logging.WARNING, error=str(e))
+
+
+def employee_text(doc: Dict[str, Any]) -> str:
+  return f"{doc.get('full_name', '')} {doc.get('email', '')} {doc.get('role', '')}"
+
+
+def employee_payload(doc: Dict[str, Any]) -> Dict[str, Any]:
+  return {"full_name": doc.get("full_name"), "email": doc.get("email"), "role": doc.get("role")}
+
 
 async def add_employee(payload: EmployeeCreate) -> EmployeePublic:
   doc = {
@@ -16,7 +47,11 @@ async def add_employee(payload: EmployeeCreate) -> EmployeePublic:
     "role": payload.role,
     "created_at": datetime.utcnow(),
   }
-  result = await employees_collection.insert_one(doc)
+  try:
+    result = await employees_collection.insert_one(doc)
+  except DuplicateKeyError:
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="An employee with this email already exists.")
+  await insert_vector("employees", str(result.inserted_id), employee_text(doc), employee_payload(doc))
   return EmployeePublic(
     id=str(result.inserted_id),
     full_name=doc["full_name"],
@@ -26,3 +61,152 @@ async def add_employee(payload: EmployeeCreate) -> EmployeePublic:
     created_at=doc["created_at"],
   )
 
+
+class _Importer:
+  """Validates decoded rows in chunks and writes each chunk with one unordered insert_many."""
+
+  def __init__(self, fmt: str):
+    self.decoder = RowDecoder(fmt)
+    self.result = EmployeeImportResult()
+    self._pending: List[tuple] = []
+    self._index_tasks: List[asyncio.Task] = []
+
+  def _error(self, row: int, error: str, email: Optional[str] = None) -> None:
+    if len(self.result.errors) < IMPORT_MAX_ERRORS:
+      self.result.errors.append(EmployeeImportError(row=row, email=email, error=error))
+    else:
+      self.result.errors_truncated = True
+
+  async def write(self, data: bytes) -> None:
+    try:
+      rows = self.decoder.feed(data)
+    except ValueError as e:
+      raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    await self._add(rows)
+
+  async def _add(self, rows: List[tuple]) -> None:
+    for row in rows:
+      self.result.rows += 1
+      if self.result.rows > IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Imports are limited to {IMPORT_MAX_ROWS} rows.")
+      self._pending.append(row)
+      if len(self._pending) >= IMPORT_CHUNK_SIZE:
+        await self._flush()
+
+  async def finish(self) -> EmployeeImportResult:
+    await self._add(self.decoder.close())
+    await self._flush()
+    if self._index_tasks:
+      self.result.indexed = sum(await asyncio.gather(*self._index_tasks))
+    return self.result
+
+  async def close(self) -> None:
+    """Cancel indexing still in flight (import failed or client went away) and wait for it to stop."""
+    pending = [task for task in self._index_tasks if not task.done()]
+    for task in pending:
+      task.cancel()
+    await asyncio.gather(*self._index_tasks, return_exceptions=True)
+
+  async def _flush(self) -> None:
+    chunk, self._pending = self._pending, []
+    docs: List[Dict[str, Any]] = []
+    rows: List[int] = []
+    seen = set()
+    now = datetime.utcnow()
+    for row, values, error in chunk:
+      if error:
+        self.result.invalid += 1
+        self._error(row, error)
+        continue
+      try:
+        employee = EmployeeCreate.model_validate(values)
+      except ValidationError as e:
+        self.result.invalid += 1
+        message = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+        self._error(row, message, (values or {}).get("email"))
+        continue
+      if employee.email in seen:
+        self.result.duplicates += 1
+        self._error(row, "Duplicate email in upload", employee.email)
+        continue
+      seen.add(employee.email)
+      docs.append({**employee.model_dump(), "created_at": now})
+      rows.append(row)
+    if not docs:
+      return
+
+    failed = set()
+    try:
+      await employees_collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+      for err in e.details.get("writeErrors", []):
+        index = err["index"]
+        failed.add(index)
+        if err.get("code") == 11000:
+          self.result.duplicates += 1
+          self._error(rows[index], "An employee with this email already exists", docs[index]["email"])
+        else:
+          self.result.invalid += 1
+          self._error(rows[index], err.get("errmsg", "Write failed"), docs[index]["email"])
+
+    # insert_many assigned each document its _id client-side
+    inserted = [doc for i, doc in enumerate(docs) if i not in failed]
+    self.result.inserted += len(inserted)
+    if inserted:
+      items = [{"id": str(doc["_id"]), "text": employee_text(doc), "payload": employee_payload(doc)} for doc in inserted]
+      self._index_tasks.append(asyncio.create_task(insert_vectors("employees", items)))
+
+
+async def import_employees(request: Request) -> EmployeeImportResult:
+  """
+  Import employees from a CSV (header row: full_name,email,phone,temporary_password,role)
+  or NDJSON upload, sent either as the raw body or as the `file` field of a multipart form.
+  Rows are parsed and written while the upload streams in; invalid and duplicate rows are
+  reported individually without failing the import.
+  """
+  started = time.perf_counter()
+  content_type = request.headers.get("content-type", "")
+  importer: Optional[_Importer] = None
+
+  try:
+    if content_type.startswith("multipart/form-data"):
+      async def open_file(field: str, filename: str, part_type: Optional[str]) -> _Importer:
+        nonlocal importer
+        fmt = detect_format(part_type, filename)
+        if field != "file" or importer is not None:
+          raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Send exactly one file in the 'file' field.")
+        if fmt is None:
+          raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Upload a .csv or .ndjson file.")
+        importer = _Importer(fmt)
+        return importer
+
+      await read_multipart(request, open_file)
+      if importer is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing 'file' field.")
+    else:
+      fmt = detect_format(content_type)
+      if fmt is None:
+        raise HTTPException(
+          status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+          detail="Send text/csv, application/x-ndjson or a multipart form with a 'file' field.",
+        )
+      importer = _Importer(fmt)
+      async for chunk in request.stream():
+        await importer.write(chunk)
+
+    result = await importer.finish()
+  finally:
+    if importer is not None:
+      await importer.close()
+
+  result.seconds = round(time.perf_counter() - started, 3)
+  log_event(
+    "employees_imported",
+    rows=result.rows,
+    inserted=result.inserted,
+    duplicates=result.duplicates,
+    invalid=result.invalid,
+    indexed=result.indexed,
+    seconds=result.seconds,
+  )
+  return result
@@ -0,0 +1,109 @@
+"""Streaming NDJSON exports of chat messages and documents.
+
+Records are read from a Mongo cursor `EXPORT_BATCH_SIZE` at a time, encoded
+with orjson and written to the response batch by batch (gzip-compressed on
+request), so memory stays at about one batch whatever the export size. The
+next batch is fetched while the current one is being sent.
+"""
+
+import asyncio
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from ..config import get_settings
+from ..utils.serialization import dumps
+from ..utils.tracing import log_event
+from .chat_service import chat_collection
+from .document_service import listing_filter, documents_collection
+
+settings = get_settings()
+
+GZIP_LEVEL = 6
+# Export in index order: (created_at, _id) is covered by the "recent" indexes of both collections
+EXPORT_SORT = [("created_at", 1), ("_id", 1)]
+
+
+def _to_record(doc: Dict[str, Any]) -> Dict[str, Any]:
+  doc["id"] = str(doc.pop("_id"))
+  return doc
+
+
+def _chat_filter(
+  user_id: Optional[str],
+  conversation_id: Optional[str],
+  created_after: Optional[datetime],
+  created_before: Optional[datetime],
+) -> dict:
+  query = listing_filter(None, created_after, created_before)
+  if user_id:
+    query["user_id"] = user_id
+  if conversation_id:
+    query["conversation_id"] = conversation_id
+  return query
+
+
+async def _stream(
+  collection: AsyncIOMotorCollection,
+  query: dict,
+  compress: bool,
+) -> AsyncIterator[bytes]:
+  batch_size = settings.export_batch_size
+  cursor = collection.find(query).sort(EXPORT_SORT).batch_size(batch_size)
+  compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None  # wbits=31: gzip container
+  exported = 0
+  pending = asyncio.ensure_future(cursor.to_list(length=batch_size))
+  try:
+    while True:
+      docs = await pending
+      if not docs:
+        break
+      # Fetch the next batch while this one is encoded and sent
+      pending = asyncio.ensure_future(cursor.to_list(length=batch_size))
+      chunk = b"\n".join(dumps(_to_record(doc)) for doc in docs) + b"\n"
+      exported += len(docs)
+      if compressor:
+        # zlib releases the GIL, so compressing off the loop overlaps with other requests
+        chunk = await asyncio.to_thread(compressor.compress, chunk)
+        if not chunk:
+          continue
+      yield chunk
+    if compressor:
+      yield compressor.flush()
+  finally:
+    pending.cancel()
+    await cursor.close()
+    log_event("export_finished", collection=collection.name, records=exported, compressed=compress)
+
+
+def export_messages(
+  user_id: Optional[str] = None,
+  conversation_id: Optional[str] = None,
+  created_after: Optional[datetime] = None,
+  created_before: Optional[datetime] = None,
+  compress: bool = False,
+) -> AsyncIterator[bytes]:
+  """Every matching chat message as one NDJSON line, oldest first."""
+  return _stream(chat_collection, _chat_filter(user_id, conversation_id, created_after, created_before), compress)
+
+
+def export_documents(
+  category: Optional[str] = None,
+  created_after: Optional[datetime] = None,
+  created_before: Optional[datetime] = None,
+  compress: bool = False,
+) -> AsyncIterator[bytes]:
+  """Every matching document record (metadata, not file contents) as one NDJSON line, oldest first."""
+  return _stream(documents_collection, listing_filter(category, created_after, created_before), compress)
+
+
+def export_response(stream: AsyncIterator[bytes], name: str, compress: bool) -> StreamingResponse:
+  filename = f"{name}.ndjson.gz" if compress else f"{name}.ndjson"
+  return StreamingResponse(
+    stream,
+    media_type="application/gzip" if compress else "application/x-ndjson",
+    headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+  )
@@ -27,7 +27,7 @@ if (
     "description": "Sync emails, Drive files, and contacts.",
     "icon": "gmail",
     "auth_url": "https://accounts.google.com/o/oauth2/v2/auth",
-    "token_url": "https://oauth2.googleapis.com/token",
+    "token_url": settings.google_token_url,
     "scope": "https://www.googleapis.com/auth/gmail.readonly https://www.googleapis.com/auth/drive.metadata.readonly",
     "client_id": settings.google_client_id,
     "client_secret": settings.google_client_secret,
@@ -36,6 +36,12 @@ if (
   }
 
 
+def _invalidate_cached_token(user_id: str, provider: str) -> None:
+  # Imported lazily: token_manager depends on this module
+  from .token_manager import token_manager
+  token_manager.invalidate(user_id, provider)
+
+
 def get_connector_statuses() -> list[DataSourceConnector]:
   connectors: list[DataSourceConnector] = []
   for provider, meta in OAUTH_PROVIDERS.items():
@@ -61,7 +67,7 @@ async def list_connectors(user_id: str) -> list[DataSourceConnector]:
     doc = stored_tokens.get(connector.id)
     if doc:
       connector.connected = True
-      connector.last_synced_at = doc.get("updated_at", datetime.utcnow()).isoformat()
+      connector.last_synced_at = (doc.get("last_synced_at") or doc.get("updated_at", datetime.utcnow())).isoformat()
   return connectors
 
 
@@ -115,10 +121,12 @@ async def exchange_code_for_tokens(provider: str, code: str, user_id: str):
     {"$set": document},
     upsert=True,
   )
+  _invalidate_cached_token(user_id, provider)
 
 
 async def disconnect(provider: str, user_id: str):
   result = await tokens_collection.delete_one({"user_id": user_id, "provider": provider})
+  _invalidate_cached_token(user_id, provider)
   if not result.deleted_count:
     raise HTTPException(status_code=404, detail="Integration not found.")
 
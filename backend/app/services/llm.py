@@ -0,0 +1,215 @@
+"""LLM backends.
+
+Every backend takes chat messages and streams the answer back as text
+chunks, so time-to-first-token is measured the same way for all of them:
+
+- `hf`: Hugging Face Inference API (`QWEN_API_KEY`), via `InferenceClient.chat_completion`;
+- `openai`: any OpenAI-compatible server (vLLM, llama.cpp, TGI, Ollama...)
+  at `QWEN_API_URL` + `QWEN_GENERATE_PATH`, streamed over SSE;
+- `offline`: a deterministic stand-in for development, tests and benchmarks.
+
+`LLM_BACKEND` picks one explicitly; by default (`auto`) `openai` is used when
+`QWEN_API_URL` is set and `hf` when only `QWEN_API_KEY` is. `auto` never
+picks `offline`: with neither set, creating the backend fails.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from ..config import get_settings
+
+DEFAULT_MODEL = "Qwen/Qwen3-14B"
+DEFAULT_GENERATE_PATH = "/v1/chat/completions"
+
+Messages = List[Dict[str, str]]
+
+
+class LLMBackend(ABC):
+  name = "base"
+
+  @abstractmethod
+  def stream(self, messages: Messages) -> AsyncIterator[str]:
+    """Yield the answer as text chunks (implemented as an async generator)."""
+
+  async def generate(self, messages: Messages) -> str:
+    return "".join([chunk async for chunk in self.stream(messages)])
+
+  async def close(self) -> None:
+    pass
+
+
+class HuggingFaceBackend(LLMBackend):
+  name = "hf"
+
+  def __init__(self, api_key: Optional[str], model: str, max_tokens: int, temperature: float):
+    if not api_key:
+      raise ValueError("QWEN_API_KEY is required for the Hugging Face LLM backend.")
+    from huggingface_hub import InferenceClient
+    self._client = InferenceClient(api_key=api_key)
+    self._model = model
+    self._max_tokens = max_tokens
+    self._temperature = temperature
+    # Streams block a thread for their whole length: keep them off the default executor. Sized for
+    # the LLM admission limit, with room for pumps still draining a stream the caller abandoned
+    self._pool = ThreadPoolExecutor(
+      max_workers=2 * get_settings().admission_max_concurrency, thread_name_prefix="sba-llm"
+    )
+
+  async def stream(self, messages: Messages) -> AsyncIterator[str]:
+    # The client is synchronous: iterate its stream in a thread and hand chunks to the loop
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+    cancelled = threading.Event()
+
+    def pump() -> None:
+      try:
+        for event in self._client.chat_completion(
+          messages=messages,
+          model=self._model,
+          max_tokens=self._max_tokens,
+          temperature=self._temperature,
+          stream=True,
+        ):
+          if cancelled.is_set():
+            break
+          delta = event.choices[0].delta.content if event.choices else None
+          if delta:
+            loop.call_soon_threadsafe(queue.put_nowait, delta)
+      except Exception as e:
+        loop.call_soon_threadsafe(queue.put_nowait, e)
+      finally:
+        loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    loop.run_in_executor(self._pool, pump)
+    try:
+      while True:
+        item = await queue.get()
+        if item is done:
+          break
+        if isinstance(item, Exception):
+          raise item
+        yield item
+    finally:
+      # Stop the pump at its next event if the caller gave up early
+      cancelled.set()
+
+  async def close(self) -> None:
+    self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class OpenAICompatibleBackend(LLMBackend):
+  name = "openai"
+
+  def __init__(
+    self,
+    base_url: Optional[str],
+    path: Optional[str],
+    api_key: Optional[str],
+    model: str,
+    max_tokens: int,
+    temperature: float,
+    timeout: float,
+  ):
+    if not base_url:
+      raise ValueError("QWEN_API_URL is required for the OpenAI-compatible LLM backend.")
+    self._url = base_url.rstrip("/") + (path or DEFAULT_GENERATE_PATH)
+    self._headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+    self._model = model
+    self._max_tokens = max_tokens
+    self._temperature = temperature
+    self._client = httpx.AsyncClient(timeout=httpx.Timeout(timeout, connect=10.0))
+
+  async def stream(self, messages: Messages) -> AsyncIterator[str]:
+    body = {
+      "model": self._model,
+      "messages": messages,
+      "max_tokens": self._max_tokens,
+      "temperature": self._temperature,
+      "stream": True,
+    }
+    async with self._client.stream("POST", self._url, json=body, headers=self._headers) as response:
+      if response.status_code >= 400:
+        detail = (await response.aread()).decode(errors="replace")[:500]
+        raise RuntimeError(f"LLM server returned {response.status_code}: {detail}")
+      async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+          continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+          break
+        choices = json.loads(data).get("choices") or []
+        delta = (choices[0].get("delta") or {}).get("content") if choices else None
+        if delta:
+          yield delta
+
+  async def close(self) -> None:
+    await self._client.aclose()
+
+
+class OfflineBackend(LLMBackend):
+  """Deterministic answers derived from the prompt; no network, no model."""
+
+  name = "offline"
+
+  async def stream(self, messages: Messages) -> AsyncIterator[str]:
+    digest = hashlib.sha1(json.dumps(messages, sort_keys=True).encode()).hexdigest()[:8]
+    question = messages[-1]["content"].rsplit("User question:", 1)[-1].strip() if messages else ""
+    cites = " [DOC 1]" if "[DOC 1 " in (messages[-1]["content"] if messages else "") else ""
+    for word in f"[offline {digest}] Answer to: {question}{cites}".split(" "):
+      yield word + " "
+
+
+_backend: Optional[LLMBackend] = None
+
+
+def create_backend(name: Optional[str] = None) -> LLMBackend:
+  settings = get_settings()
+  name = name or settings.llm_backend
+  if name == "auto":
+    if not settings.qwen_api_url and not settings.qwen_api_key:
+      # Canned answers are never a silent fallback: offline has to be asked for
+      raise ValueError("No LLM is configured: set QWEN_API_URL or QWEN_API_KEY (or LLM_BACKEND=offline for development).")
+    name = "openai" if settings.qwen_api_url else "hf"
+  model = settings.llm_model or DEFAULT_MODEL
+  if name == "hf":
+    return HuggingFaceBackend(settings.qwen_api_key, model, settings.llm_max_tokens, settings.llm_temperature)
+  if name == "openai":
+    return OpenAICompatibleBackend(
+      settings.qwen_api_url,
+      settings.qwen_generate_path,
+      settings.qwen_api_key,
+      model,
+      settings.llm_max_tokens,
+      settings.llm_temperature,
+      settings.llm_timeout_seconds,
+    )
+  if name == "offline":
+    return OfflineBackend()
+  raise ValueError(f"Unknown LLM_BACKEND '{name}' (expected hf, openai, offline or auto).")
+
+
+def get_backend() -> LLMBackend:
+  """Process-wide backend, created on first use so a misconfiguration surfaces as a ValueError per request."""
+  global _backend
+  if _backend is None:
+    _backend = create_backend()
+  return _backend
+
+
+def set_backend(backend: Optional[LLMBackend]) -> None:
+  """Swap the process-wide backend (benchmarks, stand-ins)."""
+  global _backend
+  _backend = backend
+
+
+async def close_backend() -> None:
+  if _backend is not None:
+    await _backend.close()
@@ -0,0 +1,154 @@
+"""OCR ingestion: spool an upload to disk, extract text page by page in a
+process pool and stream it into the document chunking/embedding path."""
+
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile, status
+
+from ..config import get_settings
+from ..utils import ocr
+from ..utils.metrics import OCR_PAGE_SECONDS
+from ..utils.tracing import log_event
+
+settings = get_settings()
+
+SPOOL_CHUNK_SIZE = 1024 * 1024
+TEXT_BLOCK_CHARS = 256 * 1024  # plain text files are read and chunked this much at a time
+IMAGE_TYPES = {"image/png", "image/jpeg", "image/tiff", "image/webp", "image/bmp"}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def worker_count() -> int:
+  return settings.ocr_workers or os.cpu_count() or 1
+
+
+def _get_pool() -> ProcessPoolExecutor:
+  global _pool
+  if _pool is None:
+    # spawn: forking the API process (event loop, Mongo client threads) is unsafe
+    _pool = ProcessPoolExecutor(max_workers=worker_count(), mp_context=multiprocessing.get_context("spawn"))
+  return _pool
+
+
+def shutdown_pool() -> None:
+  global _pool
+  if _pool is not None:
+    _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+
+
+def backend_config() -> dict:
+  if settings.ocr_backend not in ocr.BACKENDS:
+    raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Unknown OCR backend '{settings.ocr_backend}'.")
+  config = {"name": settings.ocr_backend, "language": settings.ocr_language}
+  if settings.ocr_backend == "http":
+    if not settings.ocr_api_url:
+      raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="OCR_API_URL is not configured.")
+    config.update(api_url=settings.ocr_api_url, api_key=settings.ocr_api_key)
+  return config
+
+
+async def spool_upload(file: UploadFile, directory: Optional[str] = None) -> str:
+  """Copy an upload to a temporary file in fixed-size chunks; the caller removes it."""
+  suffix = os.path.splitext(file.filename or "")[1]
+  fd, path = tempfile.mkstemp(suffix=suffix, dir=directory or settings.upload_dir)
+  try:
+    with os.fdopen(fd, "wb") as out:
+      while chunk := await file.read(SPOOL_CHUNK_SIZE):
+        out.write(chunk)
+  except BaseException:
+    os.unlink(path)
+    raise
+  return path
+
+
+def detect_kind(filename: str, content_type: Optional[str]) -> str:
+  """Classify an upload as "pdf", "image" or "text"; raises 415 for anything else."""
+  if content_type == "application/pdf" or filename.lower().endswith(".pdf"):
+    return "pdf"
+  if content_type in IMAGE_TYPES or filename.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".tiff", ".webp", ".bmp")):
+    return "image"
+  if content_type and content_type.startswith("text/") or filename.lower().endswith((".txt", ".md")):
+    return "text"
+  raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=f"Unsupported file type '{content_type}'.")
+
+
+async def extract_pages(path: str, kind: str, stats: Dict[str, float]) -> AsyncIterator[Tuple[int, str]]:
+  """Yield (page_number, text) in page order while later pages are still being OCR'd.
+
+  `kind` comes from `detect_kind`. At most two pages per worker are in flight,
+  so memory stays bounded for large PDFs.
+  """
+  if kind == "text":
+    # One "page", read in blocks cut at whitespace so memory stays bounded for huge files
+    stats["pages"] = 1
+    with open(path, encoding="utf-8", errors="replace") as f:
+      carry = ""
+      while block := await asyncio.to_thread(f.read, TEXT_BLOCK_CHARS):
+        text = carry + block
+        # Hold back the trailing partial word for the next block
+        cut = max(text.rfind(" "), text.rfind("\n"))
+        if cut <= 0:
+          cut = len(text)
+        carry = text[cut:]
+        yield 1, text[:cut]
+      if carry:
+        yield 1, carry
+    return
+
+  loop = asyncio.get_running_loop()
+  pool = _get_pool()
+  backend = backend_config()
+  if kind == "image":
+    jobs = [lambda: loop.run_in_executor(pool, ocr.ocr_image, path, backend)]
+  else:
+    page_count = await loop.run_in_executor(pool, ocr.count_pdf_pages, path)
+    jobs = [
+      (lambda i=i: loop.run_in_executor(pool, ocr.ocr_pdf_page, path, i, backend, settings.ocr_dpi))
+      for i in range(page_count)
+    ]
+
+  window = worker_count() * 2
+  in_flight = [job() for job in jobs[:window]]
+  next_job = len(in_flight)
+  while in_flight:
+    page_index, text, used_ocr, seconds = await in_flight.pop(0)
+    if next_job < len(jobs):
+      in_flight.append(jobs[next_job]())
+      next_job += 1
+    OCR_PAGE_SECONDS.labels(engine=backend["name"] if used_ocr else "text_layer").observe(seconds)
+    stats["pages"] = stats.get("pages", 0) + 1
+    stats["ocr_pages"] = stats.get("ocr_pages", 0) + int(used_ocr)
+    yield page_index + 1, text
+
+
+async def ingest_path(path: str, kind: str, document_id: str, title: str) -> Dict[str, float]:
+  """Extract and index a file already on local disk; returns throughput stats."""
+  from . import document_service
+
+  stats: Dict[str, float] = {}
+  start = time.perf_counter()
+  stats["chunks"] = await document_service.index_document_text(
+    document_id, title, extract_pages(path, kind, stats)
+  )
+  elapsed = time.perf_counter() - start
+  stats["seconds"] = round(elapsed, 3)
+  stats["pages_per_second_per_core"] = round(stats.get("pages", 0) / elapsed / worker_count(), 3) if elapsed else 0.0
+  log_event("ocr_ingest", document_id=document_id, **stats)
+  return stats
+
+
+async def ingest_file(file: UploadFile, kind: str, document_id: str, title: str) -> Dict[str, float]:
+  """Spool an upload to disk, then extract and index it."""
+  path = await spool_upload(file)
+  try:
+    return await ingest_path(path, kind, document_id, title)
+  finally:
+    os.unlink(path)
@@ -1,73 +1,216 @@
-import httpx
+import asyncio
 import json
-from typing import List, Dict, Any, Optional
+import logging
+import math
+import time
+from typing import AsyncIterator, List, Dict, Any, Optional
 from ..config import get_settings
-from ..utils.embedding import get_embedding
-from ..services.Qdrant import semantic_search
-from huggingface_hub import InferenceClient
+from ..models.retrieval import RetrievalParams
+from ..utils.deadline import Deadline, DeadlineExceeded, offload
+from ..utils.embedding import get_embedding, get_embeddings
+from ..services.Qdrant import USER_SCOPED_COLLECTIONS, qdrant_available, semantic_search, semantic_search_batch
+from ..utils.circuit_breaker import get_breaker
+from ..utils.metrics import LLM_TIME_TO_FIRST_TOKEN, LLM_TOTAL_TIME, PROMPT_TOKENS
+from ..utils.tracing import log_event
+from . import llm
 settings = get_settings()
 
-QWEN_API_URL = settings.qwen_api_url
-QWEN_API_KEY = settings.qwen_api_key
-QWEN_GENERATE_PATH = settings.qwen_generate_path
-LLM_MODEL = settings.llm_model
-client = InferenceClient(api_key=get_settings().qwen_api_key)
+_tokenizer = None
 
-async def search_multiple_collections(query: str, top_k_per_collection: int = 2) -> List[Dict[str, Any]]:
-    """Search across multiple collections (documents, employees, users, chat_messages) and combine results."""
-    collections = ["documents", "employees", "users", "chat_messages"]
-    all_results: List[Dict[str, Any]] = []
+
+def count_tokens(text: str) -> int:
+    """Approximate prompt size in tokens (cl100k), falling back to ~4 chars/token."""
+    global _tokenizer
+    if _tokenizer is None:
+        try:
+            import tiktoken
+            _tokenizer = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _tokenizer = False
+    if _tokenizer:
+        return len(_tokenizer.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used to detect identical questions."""
+    return " ".join(query.casefold().split()).rstrip("?!. ")
+
+
+SEARCH_COLLECTIONS = ["documents", "document_chunks", "employees", "users", "chat_messages", "synced_items"]
+
+
+def _searchable(user_id: Optional[str]) -> List[str]:
+    """SEARCH_COLLECTIONS minus the user-scoped ones when there is no user to scope them to."""
+    return [name for name in SEARCH_COLLECTIONS if user_id or name not in USER_SCOPED_COLLECTIONS]
+
+
+def per_collection_limits(top_k: int, fanout: Optional[Dict[str, int]] = None, base: Optional[int] = None) -> Dict[str, int]:
+    """Spread top_k over the searched collections (at least one hit each), letting fanout override any of them."""
+    if base is None:
+        base = max(1, math.ceil(top_k / len(SEARCH_COLLECTIONS)))
+    limits = {name: base for name in SEARCH_COLLECTIONS}
+    for name, limit in (fanout or {}).items():
+        if name in limits:
+            limits[name] = limit
+    return limits
+
+
+def _hit_to_result(h: Any, collection_name: str) -> Optional[Dict[str, Any]]:
+    """Normalize a Qdrant hit (object or dict) into the result dict used for prompts and sources."""
+    if hasattr(h, "payload"):
+        payload = h.payload or {}
+        result_id = getattr(h, "id", None)
+        score = getattr(h, "score", None)
+    elif isinstance(h, dict):
+        payload = h.get("payload", {})
+        result_id = h.get("id")
+        score = h.get("score")
+    else:
+        return None
+
+    # Extract text content
+    text = None
+    for k in ("text", "content", "body", "title", "full_name", "email"):
+        if isinstance(payload, dict) and k in payload and payload[k]:
+            text = str(payload[k])
+            break
     
-    for collection_name in collections:
+    if text is None:
+        mongo_id = payload.get("mongo_id")
+        if mongo_id:
+            text = f"[{collection_name}:{mongo_id}]"
+        else:
+            text = json.dumps(payload) if payload else ""
+
+    return {
+        "id": result_id,
+        "score": score,
+        "payload": {**payload, "collection": collection_name},
+        "text": text,
+        "collection": collection_name,
+    }
+
+
+async def search_multiple_collections(
+    query: str,
+    top_k_per_collection: Optional[int] = None,
+    params: Optional[RetrievalParams] = None,
+    top_k: Optional[int] = None,
+    deadline: Optional[Deadline] = None,
+    user_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Search across multiple collections (documents, document_chunks, employees, users, chat_messages, synced_items) and combine results.
+
+    The query is embedded once and the vector reused for every collection. Each collection
+    gets top_k_per_collection hits (or top_k spread evenly), with params.fanout overriding.
+    Collections are searched concurrently; with a deadline, collections that have not
+    answered within the retrieval budget are skipped and the rest returned.
+    User-scoped collections (synced_items) only return user_id's own items and are
+    skipped when no user_id is given.
+    """
+    deadline = deadline or Deadline(None)
+    params = (params or RetrievalParams()).with_defaults()
+    if top_k is None:
+        top_k_per_collection = top_k_per_collection or settings.rag_top_k_per_collection
+        top_k = top_k_per_collection * len(SEARCH_COLLECTIONS)
+    limits = per_collection_limits(top_k, params.fanout, base=top_k_per_collection)
+    if not qdrant_available():
+        # Don't pay for the query embedding when there is nothing to search
+        deadline.degrade("retrieval", "qdrant_unavailable")
+        return []
+    vector = await deadline.run("embedding", offload(get_embedding, query), "skipped_retrieval", None)
+    if vector is None:
+        return []
+
+    budget = deadline.budget("retrieval")
+    searches = {
+        collection_name: asyncio.create_task(
+            semantic_search(
+                collection_name, query, limit=limits[collection_name], params=params, vector=vector, user_id=user_id, timeout=budget
+            )
+        )
+        for collection_name in _searchable(user_id)
+        if limits[collection_name] > 0
+    }
+    if not searches:
+        return []
+    _, pending = await asyncio.wait(searches.values(), timeout=budget)
+    for task in pending:
+        task.cancel()
+    skipped = [name for name, task in searches.items() if task in pending]
+    if skipped:
+        deadline.degrade("retrieval", "skipped_collections", collections=skipped)
+
+    all_results: List[Dict[str, Any]] = []
+    for collection_name, task in searches.items():
+        if task in pending:
+            continue
         try:
-            hits = await semantic_search(collection_name, query, limit=top_k_per_collection)
-            for h in hits:
-                if hasattr(h, "payload"):
-                    payload = h.payload or {}
-                    result_id = getattr(h, "id", None)
-                    score = getattr(h, "score", None)
-                elif isinstance(h, dict):
-                    payload = h.get("payload", {})
-                    result_id = h.get("id")
-                    score = h.get("score")
-                else:
-                    continue
-
-                # Extract text content
-                text = None
-                for k in ("text", "content", "body", "title", "full_name", "email"):
-                    if isinstance(payload, dict) and k in payload and payload[k]:
-                        text = str(payload[k])
-                        break
-                
-                if text is None:
-                    mongo_id = payload.get("mongo_id")
-                    if mongo_id:
-                        text = f"[{collection_name}:{mongo_id}]"
-                    else:
-                        text = json.dumps(payload) if payload else ""
-
-                all_results.append({
-                    "id": result_id,
-                    "score": score,
-                    "payload": {**payload, "collection": collection_name},
-                    "text": text,
-                    "collection": collection_name,
-                })
+            hits = task.result()
+            all_results.extend(filter(None, (_hit_to_result(h, collection_name) for h in hits)))
         except Exception as e:
-            # Continue searching other collections if one fails
-            print(f"Error searching collection {collection_name}: {e}")
-            continue
+            # Continue with the other collections if one fails
+            log_event("collection_search_failed", level=logging.WARNING, collection=collection_name, error=str(e))
     
     # Sort by score (descending) and return top results
     all_results.sort(key=lambda x: x.get("score", 0), reverse=True)
-    return all_results[:top_k_per_collection * len(collections)]
+    return all_results[:top_k]
+
+
+async def search_multiple_collections_batch(
+    queries: List[str],
+    top_k: int = 4,
+    params: Optional[RetrievalParams] = None,
+    user_id: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> List[List[Dict[str, Any]]]:
+    """Batch form of search_multiple_collections: one encoder batch for all queries and one Qdrant search_batch per collection.
+
+    `timeout` bounds each collection's search (server-side and while waiting for it); a collection
+    that runs out contributes no hits.
+    """
+    if not queries:
+        return []
+    if not qdrant_available():
+        return [[] for _ in queries]
+    params = (params or RetrievalParams()).with_defaults()
+    limits = per_collection_limits(top_k, params.fanout)
+    vectors = await asyncio.to_thread(get_embeddings, queries)
+    per_query: List[List[Dict[str, Any]]] = [[] for _ in queries]
+
+    collections = [name for name in _searchable(user_id) if limits[name] > 0]
+    async def search(collection_name: str) -> list:
+        try:
+            return await asyncio.wait_for(
+                semantic_search_batch(
+                    collection_name, vectors, limit=limits[collection_name], params=params, user_id=user_id, timeout=timeout
+                ),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            log_event("collection_search_failed", level=logging.WARNING, collection=collection_name, error="timed out")
+            return [[] for _ in queries]
+
+    # One search_batch per collection, run concurrently in the deadline worker pool
+    all_batches = await asyncio.gather(*(search(collection_name) for collection_name in collections))
+    for collection_name, batches in zip(collections, all_batches):
+        for results, hits in zip(per_query, batches):
+            results.extend(filter(None, (_hit_to_result(h, collection_name) for h in hits)))
+
+    for results in per_query:
+        results.sort(key=lambda x: x.get("score", 0), reverse=True)
+    return [results[:top_k] for results in per_query]
 
 
-async def search_qdrant(query: str, top_k: int = 4, collection_name: str = "documents") -> List[Dict[str, Any]]:
+async def search_qdrant(
+    query: str,
+    top_k: int = 4,
+    collection_name: str = "documents",
+    params: Optional[RetrievalParams] = None,
+) -> List[Dict[str, Any]]:
     """Embed the query, search Qdrant, and return a list of hit dicts with text and metadata."""
     # Call async semantic_search
-    hits = await semantic_search(collection_name, query, limit=top_k)
+    hits = await semantic_search(collection_name, query, limit=top_k, params=(params or RetrievalParams()).with_defaults())
 
     results: List[Dict[str, Any]] = []
     for h in hits:
@@ -110,16 +253,27 @@ async def search_qdrant(query: str, top_k: int = 4, collection_name: str = "docu
     return results
 
 
-def build_prompt(query: str, docs: List[Dict[str, Any]], conversation_history: Optional[List[Dict[str, str]]] = None) -> str:
-    """Create a prompt combining retrieved docs, conversation history, and the user query.
+# Identical for every request, so it is the cacheable prefix of every prompt
+SYSTEM_PROMPT = (
+    "You are a helpful AI assistant. Answer user questions using the provided context from the knowledge base. "
+    "Use only the information from the context when possible. If the context doesn't contain relevant information, "
+    "you can provide a general answer but clearly state that it's based on general knowledge, not the knowledge base. "
+    "Cite sources by referencing the DOC number like [DOC 1] when using information from the context."
+)
 
-    The LLM should use the provided context to answer and cite sources.
+
+def build_prompt(query: str, docs: List[Dict[str, Any]], conversation_history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+    """Create chat messages combining retrieved docs, conversation history, and the user query.
+
+    Ordered from most to least stable so servers with prefix (KV) caching can reuse work:
+    the fixed system prompt, then the conversation so far (append-only within a
+    conversation), then the per-request context and question last.
     """
     # Build context from retrieved documents
     context_parts = []
     if docs:
         for i, d in enumerate(docs, start=1):
-            score = d.get("score", 0)
+            score = d.get("score") or 0
             text = d.get("text", "")
             header = f"[DOC {i} | score={score:.3f}]"
             context_parts.append(header + "\n" + text + "\n")
@@ -127,49 +281,91 @@ def build_prompt(query: str, docs: List[Dict[str, Any]], conversation_history: O
     else:
         context = "No relevant documents found in the knowledge base."
 
-    # Build conversation history context
-    history_context = ""
-    if conversation_history and len(conversation_history) > 0:
-        history_parts = []
-        # Include last few exchanges for context (reverse to show most recent first, then reverse again)
-        recent_history = conversation_history[-6:]  # Last 3 exchanges (user + assistant pairs)
-        for msg in recent_history:
-            role_label = "User" if msg.get("role") == "user" else "Assistant"
-            history_parts.append(f"{role_label}: {msg.get('content', '')}")
-        history_context = "\n\nRECENT CONVERSATION:\n" + "\n".join(history_parts)
-
-    system = (
-        "You are a helpful AI assistant. Answer user questions using the provided context from the knowledge base. "
-        "Use only the information from the context when possible. If the context doesn't contain relevant information, "
-        "you can provide a general answer but clearly state that it's based on general knowledge, not the knowledge base. "
-        "Cite sources by referencing the DOC number like [DOC 1] when using information from the context."
-    )
-
-    prompt = (
-        system
-        + "\n\nKNOWLEDGE BASE CONTEXT:\n"
-        + context
-        + history_context
-        + "\n\nUser question: "
-        + query
-        + "\n\nAssistant:"
-    )
-
-    return prompt
-
-
-def call_llm(prompt: str) -> str:
-    """Call the Qwen generate endpoint and return the assistant response as text."""
-    url = QWEN_API_URL.rstrip("/") + QWEN_GENERATE_PATH
-    response = client.conversational(
-        prompt=prompt,
-        model="Qwen/Qwen3-14B"   # or the exact Qwen3 model you want
-    )
-    # Fallback: try to stringify common nested locations
-    if isinstance(response, str):
-        return response
-
-    return json.dumps(response)
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    if conversation_history:
+        # Last 3 exchanges (user + assistant pairs)
+        for msg in conversation_history[-6:]:
+            role = "user" if msg.get("role") == "user" else "assistant"
+            messages.append({"role": role, "content": msg.get("content", "")})
+    messages.append({
+        "role": "user",
+        "content": "KNOWLEDGE BASE CONTEXT:\n" + context + "\n\nUser question: " + query,
+    })
+    return messages
+
+
+async def stream_llm(messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+    """Stream the assistant response from the configured LLM backend, recording TTFT and total time.
+
+    Raises CircuitOpenError at once while the LLM circuit is open. A backend that fails before
+    its first token counts against the breaker; one that started answering counts as healthy.
+    """
+    backend = llm.get_backend()
+    breaker = get_breaker("llm")
+    breaker.check()
+    prompt_tokens = sum(count_tokens(m["content"]) for m in messages)
+    PROMPT_TOKENS.observe(prompt_tokens)
+    start = time.perf_counter()
+    first_token = None
+    chunks = 0
+    try:
+        async for chunk in backend.stream(messages):
+            if first_token is None:
+                first_token = time.perf_counter() - start
+                LLM_TIME_TO_FIRST_TOKEN.observe(first_token)
+                breaker.record_success()
+            chunks += 1
+            yield chunk
+        if first_token is None:
+            breaker.record_success()
+    except Exception as e:
+        # ValueError is a configuration problem, not an unhealthy backend
+        if first_token is None and not isinstance(e, ValueError):
+            breaker.record_failure()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        LLM_TOTAL_TIME.observe(elapsed)
+        log_event(
+            "llm_generate",
+            backend=backend.name,
+            duration_ms=round(elapsed * 1000, 2),
+            ttft_ms=round(first_token * 1000, 2) if first_token is not None else None,
+            prompt_tokens=prompt_tokens,
+            chunks=chunks,
+        )
+
+
+async def call_llm(messages: List[Dict[str, str]], deadline: Optional[Deadline] = None) -> str:
+    """Call the configured LLM backend and return the assistant response as text.
+
+    With a deadline, generation gets whatever budget is left: an answer cut off by it is
+    returned as far as it got, and DeadlineExceeded is raised if not a single token arrived.
+    """
+    remaining = deadline.remaining() if deadline else None
+    if remaining is None:
+        return "".join([chunk async for chunk in stream_llm(messages)]).strip()
+
+    chunks: List[str] = []
+    stream = stream_llm(messages)
+    start = time.perf_counter()
+    try:
+        while True:
+            chunks.append(await asyncio.wait_for(stream.__anext__(), timeout=deadline.remaining()))
+    except StopAsyncIteration:
+        pass
+    except asyncio.TimeoutError:
+        if not chunks:
+            # Only a backend that stayed silent for a meaningful time is unhealthy; a request whose
+            # budget was mostly spent upstream says nothing about the LLM
+            if time.perf_counter() - start >= settings.breaker_llm_min_wait_seconds:
+                get_breaker("llm").record_failure()
+            deadline.degrade("generation", "no_answer")
+            raise DeadlineExceeded(f"No answer within the {deadline.total:g}s request deadline.")
+        deadline.degrade("generation", "truncated_answer", chunks=len(chunks))
+    finally:
+        await stream.aclose()
+    return "".join(chunks).strip()
 
 def format_sources(docs: List[Dict[str, Any]]) -> str:
     parts = []
@@ -0,0 +1,279 @@
+"""Zero-downtime, resumable re-embedding of Qdrant collections.
+
+A reindex job streams the source documents from MongoDB in `_id` order,
+embeds and upserts them into a new versioned collection
+(`<name>_v<timestamp>`), checkpointing the last `_id` after every batch so
+an interrupted job resumes where it stopped. Once the new collection is
+complete the live alias is switched to it in one atomic Qdrant call, so
+searches never see an empty collection.
+
+Each job is held by one worker process through a Mongo lease (see
+`utils/lease.py`); every worker checks for running jobs whose lease expired
+(their worker died) and takes them over. While a job runs, every worker
+mirrors its vector upserts and deletes into the new collection.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorCollection
+from qdrant_client.models import (
+  CreateAlias,
+  CreateAliasOperation,
+  DeleteAlias,
+  DeleteAliasOperation,
+  Distance,
+  VectorParams,
+)
+
+from ..database import connect_qdrant, get_collection
+from ..utils.embedding import EMBEDDING_MODEL_NAME, get_embedding_dimension
+from ..utils.lease import Lease, LeaseLost
+from ..utils.tracing import log_event
+from . import employee_service, retention_service
+from .Qdrant import (
+  QDRANT_COLLECTIONS,
+  REINDEX_TARGETS_REFRESH_SECONDS,
+  USER_SCOPED_COLLECTIONS,
+  ensure_user_index,
+  insert_vectors,
+  register_reindex_target,
+  unregister_reindex_target,
+)
+
+jobs_collection: AsyncIOMotorCollection = get_collection("reindex_jobs")
+
+BATCH_SIZE = 128
+# A running job whose lease was not renewed for this long lost its worker and is taken over
+LEASE_TTL_SECONDS = 60.0
+
+
+def _document_text(doc: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+  # Same text document_service.add_document embeds
+  text = f"{doc.get('title', '')} {doc.get('category', '')}"
+  if doc.get("cloud_link"):
+    text += f" {doc['cloud_link']}"
+  return text, {}
+
+
+def _chat_message_text(doc: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+  # Apply the retention policy so a rebuild does not resurrect pruned vectors
+  content, role, created_at = doc.get("content", ""), doc.get("role", "user"), doc.get("created_at") or datetime.utcnow()
+  if not retention_service.should_embed(content, fallback=doc.get("fallback", False)) or retention_service.is_expired(created_at):
+    return "", {}
+  return content, retention_service.vector_payload(doc.get("user_id"), role, created_at)
+
+
+def _document_chunk_text(doc: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+  payload = {"text": doc.get("text"), "page": doc.get("page"), "document_id": doc.get("document_id")}
+  return doc.get("text", ""), payload
+
+
+def _synced_item_text(doc: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+  payload = {k: doc.get(k) for k in ("title", "text", "source", "url", "user_id")}
+  return doc.get("text", ""), payload
+
+
+def _employee_text(doc: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+  return employee_service.employee_text(doc), employee_service.employee_payload(doc)
+
+
+# Mongo collection -> builder returning (text to embed, extra payload)
+SOURCES: Dict[str, Callable[[Dict[str, Any]], Tuple[str, Dict[str, Any]]]] = {
+  "documents": _document_text,
+  "document_chunks": _document_chunk_text,
+  "chat_messages": _chat_message_text,
+  "synced_items": _synced_item_text,
+  "employees": _employee_text,
+}
+
+_running: Dict[str, asyncio.Task] = {}
+
+
+def _public(job: Dict[str, Any]) -> Dict[str, Any]:
+  job = {**job, "id": str(job.pop("_id"))}
+  if job.get("last_id") is not None:
+    job["last_id"] = str(job["last_id"])
+  return job
+
+
+def aliases(client) -> Dict[str, str]:
+  return {a.alias_name: a.collection_name for a in client.get_aliases().aliases}
+
+
+def switch_alias(client, alias: str, target: str) -> Optional[str]:
+  """Point `alias` at `target` atomically; return the collection it pointed to before."""
+  previous = aliases(client).get(alias)
+  operations = []
+  if previous:
+    operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+  elif client.collection_exists(alias):
+    # First migration: the live data is a plain collection with the alias name.
+    # It has to go before the alias can be created; this is the only non-atomic step.
+    client.delete_collection(alias)
+  operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=alias)))
+  client.update_collection_aliases(change_aliases_operations=operations)
+  return previous
+
+
+async def start_reindex(collection_name: str) -> Dict[str, Any]:
+  """Create (or resume) a reindex job for a Mongo collection and run it in the background."""
+  if collection_name not in SOURCES:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No reindex source for '{collection_name}'.")
+  if collection_name in _running and not _running[collection_name].done():
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Reindex of '{collection_name}' already running.")
+
+  dimension = get_embedding_dimension(collection_name)
+  job = await jobs_collection.find_one(
+    {"collection": collection_name, "status": {"$in": ["running", "failed"]}, "dimension": dimension},
+    sort=[("started_at", -1)],
+  )
+  if job is None:
+    now = datetime.utcnow()
+    alias = QDRANT_COLLECTIONS.get(collection_name, collection_name)
+    job = {
+      "collection": collection_name,
+      "alias": alias,
+      "target": f"{alias}_v{int(now.timestamp())}",
+      "model": EMBEDDING_MODEL_NAME,
+      "dimension": dimension,
+      "status": "running",
+      "last_id": None,
+      "processed": 0,
+      "total": await get_collection(collection_name).estimated_document_count(),
+      "docs_per_second": 0.0,
+      "error": None,
+      "started_at": now,
+      "updated_at": now,
+      "finished_at": None,
+      "worker": None,
+      "lease_until": None,
+    }
+    job["_id"] = (await jobs_collection.insert_one(job)).inserted_id
+
+  lease = Lease(jobs_collection, LEASE_TTL_SECONDS)
+  job = await lease.acquire({"_id": job["_id"]}, {"status": "running", "error": None, "updated_at": datetime.utcnow()})
+  if job is None:
+    # Held by another worker process
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Reindex of '{collection_name}' already running.")
+
+  _running[collection_name] = asyncio.create_task(run_reindex(job, lease))
+  return _public(dict(job))
+
+
+async def run_reindex(job: Dict[str, Any], lease: Lease) -> None:
+  job_id = job["_id"]
+  collection_name, alias, target = job["collection"], job["alias"], job["target"]
+  source = get_collection(collection_name)
+  build = SOURCES[collection_name]
+  client = connect_qdrant()
+
+  try:
+    if not client.collection_exists(target):
+      client.create_collection(
+        collection_name=target,
+        vectors_config=VectorParams(size=job["dimension"], distance=Distance.COSINE),
+      )
+      if collection_name in USER_SCOPED_COLLECTIONS:
+        ensure_user_index(client, target)
+    register_reindex_target(alias, target)
+    if job.get("last_id") is None:
+      # Give the other workers time to see the job and start mirroring their writes
+      await asyncio.sleep(REINDEX_TARGETS_REFRESH_SECONDS)
+
+    last_id = job.get("last_id")
+    processed = job.get("processed", 0)
+    started = time.perf_counter()
+    processed_this_run = 0
+    while True:
+      query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+      batch = await source.find(query).sort("_id", 1).limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+      if not batch:
+        break
+      items = []
+      for doc in batch:
+        text, payload = build(doc)
+        if text.strip():
+          items.append({"id": str(doc["_id"]), "text": text, "payload": payload})
+      if items and await insert_vectors(collection_name, items, target_collection=target) != len(items):
+        raise RuntimeError(f"Upsert into '{target}' failed at _id {batch[0]['_id']}")
+
+      last_id = batch[-1]["_id"]
+      processed += len(batch)
+      processed_this_run += len(batch)
+      rate = processed_this_run / max(time.perf_counter() - started, 1e-6)
+      await lease.renew({"last_id": last_id, "processed": processed, "docs_per_second": round(rate, 1), "updated_at": datetime.utcnow()})
+      log_event("reindex_progress", collection=collection_name, target=target, processed=processed, total=job["total"], docs_per_second=round(rate, 1))
+
+    # Make sure the job is still ours before switching
+    await lease.renew()
+    previous = switch_alias(client, alias, target)
+    if previous and previous != target:
+      client.delete_collection(previous)
+    await lease.release({"status": "completed", "finished_at": datetime.utcnow(), "updated_at": datetime.utcnow()})
+    log_event("reindex_completed", collection=collection_name, alias=alias, target=target, processed=processed)
+  except LeaseLost:
+    # Another worker took the job over; it carries on from the last checkpoint
+    log_event("reindex_lease_lost", collection=collection_name, target=target)
+  except Exception as e:
+    await lease.release({"status": "failed", "error": str(e), "updated_at": datetime.utcnow()})
+    log_event("reindex_failed", collection=collection_name, target=target, error=str(e))
+  finally:
+    await lease.release()
+    unregister_reindex_target(alias)
+    _running.pop(collection_name, None)
+
+
+async def get_job(job_id: str) -> Dict[str, Any]:
+  if not ObjectId.is_valid(job_id):
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reindex job not found.")
+  job = await jobs_collection.find_one({"_id": ObjectId(job_id)})
+  if not job:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reindex job not found.")
+  return _public(job)
+
+
+async def resume_interrupted_jobs() -> None:
+  """Take over running jobs whose worker died (lease expired), however far along they were."""
+  while True:
+    lease = Lease(jobs_collection, LEASE_TTL_SECONDS)
+    job = await lease.acquire({"status": "running", "collection": {"$nin": list(_running)}})
+    if job is None:
+      return
+    log_event("reindex_resumed", collection=job["collection"], target=job["target"], processed=job.get("processed", 0))
+    _running[job["collection"]] = asyncio.create_task(run_reindex(job, lease))
+
+
+async def _resume_forever() -> None:
+  while True:
+    try:
+      await resume_interrupted_jobs()
+    except Exception as e:
+      log_event("reindex_resume_failed", level=logging.WARNING, error=str(e))
+    await asyncio.sleep(LEASE_TTL_SECONDS)
+
+
+_resume_task: Optional[asyncio.Task] = None
+
+
+def start() -> None:
+  """Start checking for orphaned jobs (at once, then every LEASE_TTL_SECONDS)."""
+  global _resume_task
+  if _resume_task is None or _resume_task.done():
+    _resume_task = asyncio.create_task(_resume_forever())
+
+
+async def stop() -> None:
+  global _resume_task
+  if _resume_task is not None:
+    _resume_task.cancel()
+    try:
+      await _resume_task
+    except asyncio.CancelledError:
+      pass
+    _resume_task = None
@@ -0,0 +1,237 @@
+"""Retention policy for the `chat_messages` vector collection.
+
+Chat vectors are the fastest-growing part of the index and are searched on
+every turn, so they are bounded in three ways:
+
+- messages that are too short, or assistant error fallbacks, are never embedded;
+- vectors older than `CHAT_VECTOR_TTL_DAYS` are deleted;
+- each user keeps at most `CHAT_VECTOR_MAX_PER_USER` vectors (oldest go first).
+
+Messages themselves stay in MongoDB; only their vectors are pruned. Every
+vector carries `user_id`, `role` and `created_at` (epoch seconds) in its
+payload, indexed so the prune queries are filter scans rather than full scrolls.
+Vectors written before that payload existed are backfilled from MongoDB at the
+start of each pass. With several worker processes, a Mongo lease makes sure
+only one of them runs a pass per interval.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from qdrant_client.models import (
+  Direction,
+  FieldCondition,
+  Filter,
+  FilterSelector,
+  IsEmptyCondition,
+  MatchValue,
+  OptimizersConfigDiff,
+  OrderBy,
+  PayloadField,
+  PayloadSchemaType,
+  PointIdsList,
+  Range,
+  SetPayload,
+  SetPayloadOperation,
+)
+
+from ..config import get_settings
+from ..database import connect_qdrant, get_collection
+from ..utils.lease import Lease
+from ..utils.metrics import CHAT_VECTORS_PRUNED, QDRANT_LATENCY, timed
+from ..utils.tracing import log_event
+from .Qdrant import QDRANT_COLLECTIONS
+
+settings = get_settings()
+
+chat_collection: AsyncIOMotorCollection = get_collection("chat_messages")
+leases_collection: AsyncIOMotorCollection = get_collection("leases")
+
+COLLECTION = "chat_messages"
+PRUNE_BATCH_SIZE = 256
+LEASE_NAME = "chat_retention"
+LEASE_TTL_SECONDS = 120.0
+
+_task: Optional[asyncio.Task] = None
+
+
+def should_embed(content: str, fallback: bool = False) -> bool:
+  """Whether a chat message is worth a vector: not a fallback reply and long enough to carry meaning."""
+  if fallback:
+    return False
+  return len(content.strip()) >= settings.chat_vector_min_chars
+
+
+def vector_payload(user_id: str, role: str, created_at: datetime) -> Dict[str, Any]:
+  return {"user_id": user_id, "role": role, "created_at": created_at.timestamp()}
+
+
+def is_expired(created_at: datetime) -> bool:
+  return created_at < datetime.utcnow() - timedelta(days=settings.chat_vector_ttl_days)
+
+
+def _qdrant_collection() -> str:
+  return QDRANT_COLLECTIONS.get(COLLECTION, COLLECTION)
+
+
+def ensure_payload_indexes() -> None:
+  """Index the payload fields the prune queries filter and order on, and let Qdrant vacuum eagerly."""
+  if not settings.qdrant_url:
+    return
+  client = connect_qdrant()
+  collection = _qdrant_collection()
+  if not client.collection_exists(collection):
+    return
+  client.create_payload_index(collection, "user_id", field_schema=PayloadSchemaType.KEYWORD)
+  client.create_payload_index(collection, "created_at", field_schema=PayloadSchemaType.FLOAT)
+  # Deleted points are only reclaimed when a segment is vacuumed; lower the
+  # thresholds so pruned segments are compacted soon after each run.
+  client.update_collection(
+    collection,
+    optimizers_config=OptimizersConfigDiff(deleted_threshold=0.1, vacuum_min_vector_number=100),
+  )
+
+
+async def backfill_payloads(client, collection: str) -> int:
+  """Give legacy vectors (no `created_at` payload) the retention payload of their Mongo message.
+
+  Vectors whose message no longer exists are deleted. Returns the number of vectors fixed up.
+  """
+  legacy = Filter(must=[IsEmptyCondition(is_empty=PayloadField(key="created_at"))])
+  fixed = 0
+  while True:
+    # Fixed-up points stop matching the filter, so every round starts from the top
+    points, _ = await asyncio.to_thread(
+      client.scroll, collection, scroll_filter=legacy, limit=PRUNE_BATCH_SIZE, with_payload=["mongo_id"], with_vectors=False
+    )
+    if not points:
+      return fixed
+    mongo_ids = {p.id: (p.payload or {}).get("mongo_id") for p in points}
+    object_ids = [ObjectId(m) for m in mongo_ids.values() if m and ObjectId.is_valid(m)]
+    messages = {
+      str(doc["_id"]): doc
+      async for doc in chat_collection.find({"_id": {"$in": object_ids}}, {"user_id": 1, "role": 1, "created_at": 1})
+    }
+    operations, orphans = [], []
+    for point_id, mongo_id in mongo_ids.items():
+      doc = messages.get(mongo_id)
+      if doc is None or not doc.get("created_at"):
+        orphans.append(point_id)
+        continue
+      payload = vector_payload(doc.get("user_id"), doc.get("role", "user"), doc["created_at"])
+      operations.append(SetPayloadOperation(set_payload=SetPayload(payload=payload, points=[point_id])))
+    if operations:
+      await asyncio.to_thread(client.batch_update_points, collection, update_operations=operations)
+    if orphans:
+      await asyncio.to_thread(client.delete, collection, points_selector=PointIdsList(points=orphans))
+    fixed += len(operations)
+
+
+def _prune_expired(client, collection: str) -> int:
+  cutoff = (datetime.utcnow() - timedelta(days=settings.chat_vector_ttl_days)).timestamp()
+  expired = Filter(must=[FieldCondition(key="created_at", range=Range(lt=cutoff))])
+  count = client.count(collection, count_filter=expired, exact=True).count
+  if count:
+    with timed(QDRANT_LATENCY, "qdrant_delete", operation="delete", collection=collection):
+      client.delete(collection, points_selector=FilterSelector(filter=expired))
+  return count
+
+
+def _prune_user(client, collection: str, user_id: str) -> int:
+  """Delete a user's oldest vectors until they are back under the cap."""
+  owned = Filter(must=[FieldCondition(key="user_id", match=MatchValue(value=user_id))])
+  excess = client.count(collection, count_filter=owned, exact=True).count - settings.chat_vector_max_per_user
+  deleted = 0
+  while excess > 0:
+    points, _ = client.scroll(
+      collection,
+      scroll_filter=owned,
+      limit=min(excess, PRUNE_BATCH_SIZE),
+      order_by=OrderBy(key="created_at", direction=Direction.ASC),
+      with_payload=False,
+      with_vectors=False,
+    )
+    if not points:
+      break
+    with timed(QDRANT_LATENCY, "qdrant_delete", operation="delete", collection=collection):
+      client.delete(collection, points_selector=PointIdsList(points=[p.id for p in points]))
+    deleted += len(points)
+    excess -= len(points)
+  return deleted
+
+
+async def _users() -> List[str]:
+  return [u for u in await chat_collection.distinct("user_id") if u]
+
+
+async def prune() -> Dict[str, int]:
+  """Run one retention pass: drop expired vectors, then trim users over the per-user cap."""
+  if not settings.qdrant_url:
+    return {"expired": 0, "over_cap": 0}
+  client = connect_qdrant()
+  collection = _qdrant_collection()
+  if not client.collection_exists(collection):
+    return {"expired": 0, "over_cap": 0}
+
+  backfilled = await backfill_payloads(client, collection)
+  if backfilled:
+    log_event("chat_vector_payloads_backfilled", collection=collection, vectors=backfilled)
+  expired = await asyncio.to_thread(_prune_expired, client, collection)
+  over_cap = 0
+  for user_id in await _users():
+    over_cap += await asyncio.to_thread(_prune_user, client, collection, user_id)
+
+  CHAT_VECTORS_PRUNED.labels(reason="expired").inc(expired)
+  CHAT_VECTORS_PRUNED.labels(reason="over_cap").inc(over_cap)
+  log_event("chat_vectors_pruned", collection=collection, expired=expired, over_cap=over_cap)
+  return {"expired": expired, "over_cap": over_cap}
+
+
+async def _run_once() -> None:
+  """One pass, unless another worker holds the lease or ran a pass less than an interval ago."""
+  lease = Lease(leases_collection, LEASE_TTL_SECONDS)
+  due = datetime.utcnow() - timedelta(seconds=settings.chat_retention_interval_seconds)
+  claimed = await lease.acquire(
+    {"_id": LEASE_NAME, "$nor": [{"last_run_at": {"$gte": due}}]},
+    upsert=True,
+  )
+  if claimed is None:
+    return
+  try:
+    await asyncio.to_thread(ensure_payload_indexes)
+    await prune()
+  finally:
+    await lease.release({"last_run_at": datetime.utcnow()})
+
+
+async def _run_forever() -> None:
+  while True:
+    try:
+      await _run_once()
+    except Exception as e:
+      log_event("chat_retention_failed", level=logging.WARNING, error=str(e))
+    await asyncio.sleep(settings.chat_retention_interval_seconds)
+
+
+def start() -> None:
+  """Start the periodic retention job (no-op if disabled or already running)."""
+  global _task
+  if settings.chat_retention_interval_seconds <= 0:
+    return
+  if _task is None or _task.done():
+    _task = asyncio.create_task(_run_forever())
+
+
+async def stop() -> None:
+  global _task
+  if _task is not None:
+    _task.cancel()
+    try:
+      await _task
+    except asyncio.CancelledError:
+      pass
+    _task = None
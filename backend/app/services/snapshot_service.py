@@ -0,0 +1,236 @@
+"""Vector snapshot export / import.
+
+Bootstrapping a new environment by re-embedding every document costs hours
+of model time. A snapshot instead copies the points themselves (ids, vectors
+and payloads) out of Qdrant into chunked `.npz` files, so a restore is just
+I/O plus parallel bulk upserts:
+
+  snapshot/
+    manifest.json                  model, dimension, point counts, chunk checksums
+    documents/chunk-00000.npz      ids (uint64), vectors (float32/float16, n x dim),
+    documents/chunk-00001.npz      payload (NDJSON bytes) + payload_offsets (int64)
+    ...
+
+  python -m app.services.snapshot_service export ./snapshot
+  python -m app.services.snapshot_service import ./snapshot --workers 8
+
+Import refuses snapshots taken with a different embedding model or
+dimension than the target collection is configured for. With `--replace`, a
+collection served through an alias (after a reindex) is restored into a new
+version and the alias switched to it once complete, like a reindex; a plain
+collection is dropped and recreated.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from qdrant_client.models import Batch, Distance, VectorParams
+
+from ..database import connect_qdrant
+from ..utils.embedding import EMBEDDING_MODEL_NAME, get_embedding_dimension
+from ..utils.tracing import log_event
+from .Qdrant import QDRANT_COLLECTIONS, USER_SCOPED_COLLECTIONS, ensure_user_index
+from .reindex_service import aliases, switch_alias
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+CHUNK_SIZE = 10_000  # points per file
+
+
+def _encode_payloads(payloads: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+  encoded = [json.dumps(p, separators=(",", ":"), default=str).encode() for p in payloads]
+  offsets = np.cumsum([0] + [len(e) for e in encoded], dtype=np.int64)
+  return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _decode_payloads(data: np.ndarray, offsets: np.ndarray) -> List[Dict[str, Any]]:
+  raw = data.tobytes()
+  return [json.loads(raw[offsets[i]:offsets[i + 1]]) for i in range(len(offsets) - 1)]
+
+
+def _scroll(client, collection: str, chunk_size: int) -> Iterator[list]:
+  offset = None
+  while True:
+    points, offset = client.scroll(
+      collection, limit=chunk_size, offset=offset, with_payload=True, with_vectors=True
+    )
+    if points:
+      yield points
+    if offset is None:
+      return
+
+
+def _write_chunk(path: str, points: list, dtype: str) -> Dict[str, Any]:
+  ids = np.array([p.id for p in points], dtype=np.uint64)
+  vectors = np.asarray([p.vector for p in points], dtype=dtype)
+  payload, payload_offsets = _encode_payloads([p.payload or {} for p in points])
+  buffer = io.BytesIO()
+  np.savez(buffer, ids=ids, vectors=vectors, payload=payload, payload_offsets=payload_offsets)
+  data = buffer.getvalue()
+  with open(path, "wb") as f:
+    f.write(data)
+  return {"file": os.path.basename(path), "points": len(points), "sha256": hashlib.sha256(data).hexdigest()}
+
+
+def export_snapshot(
+  out_dir: str,
+  collections: Optional[List[str]] = None,
+  chunk_size: int = CHUNK_SIZE,
+  dtype: str = "float32",
+) -> Dict[str, Any]:
+  """Stream every point of the given (default: all known) collections to `out_dir`."""
+  client = connect_qdrant()
+  manifest: Dict[str, Any] = {
+    "format_version": FORMAT_VERSION,
+    "created_at": datetime.now(timezone.utc).isoformat(),
+    "model": EMBEDDING_MODEL_NAME,
+    "dtype": dtype,
+    "collections": {},
+  }
+  for name in collections or list(QDRANT_COLLECTIONS):
+    qdrant_collection = QDRANT_COLLECTIONS.get(name, name)
+    if not client.collection_exists(qdrant_collection):
+      log_event("snapshot_collection_missing", collection=qdrant_collection)
+      continue
+    vectors_config = client.get_collection(qdrant_collection).config.params.vectors
+    os.makedirs(os.path.join(out_dir, name), exist_ok=True)
+    started = time.perf_counter()
+    chunks = []
+    for points in _scroll(client, qdrant_collection, chunk_size):
+      path = os.path.join(out_dir, name, f"chunk-{len(chunks):05d}.npz")
+      chunks.append(_write_chunk(path, points, dtype))
+    manifest["collections"][name] = {
+      "dimension": vectors_config.size,
+      "distance": vectors_config.distance.value if hasattr(vectors_config.distance, "value") else str(vectors_config.distance),
+      "points": sum(c["points"] for c in chunks),
+      "chunks": chunks,
+    }
+    log_event(
+      "snapshot_exported",
+      collection=name,
+      points=manifest["collections"][name]["points"],
+      seconds=round(time.perf_counter() - started, 2),
+    )
+
+  with open(os.path.join(out_dir, MANIFEST), "w") as f:
+    json.dump(manifest, f, indent=2)
+  return manifest
+
+
+def _load_chunk(path: str, expected_sha256: str) -> Tuple[List[int], np.ndarray, List[Dict[str, Any]]]:
+  with open(path, "rb") as f:
+    data = f.read()
+  if hashlib.sha256(data).hexdigest() != expected_sha256:
+    raise ValueError(f"Checksum mismatch for {path}")
+  with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+    ids = arrays["ids"].tolist()
+    vectors = arrays["vectors"].astype(np.float32)
+    payloads = _decode_payloads(arrays["payload"], arrays["payload_offsets"])
+  return ids, vectors, payloads
+
+
+def _check_compatible(manifest: Dict[str, Any], name: str, info: Dict[str, Any]) -> None:
+  if manifest["model"] != EMBEDDING_MODEL_NAME:
+    raise ValueError(f"Snapshot was taken with '{manifest['model']}', this deployment uses '{EMBEDDING_MODEL_NAME}'.")
+  expected = get_embedding_dimension(name)
+  if info["dimension"] != expected:
+    raise ValueError(f"Snapshot of '{name}' has dimension {info['dimension']}, this deployment expects {expected}.")
+
+
+def import_snapshot(
+  in_dir: str,
+  collections: Optional[List[str]] = None,
+  workers: int = 4,
+  batch_size: int = 1000,
+  replace: bool = False,
+) -> Dict[str, int]:
+  """Bulk-upsert a snapshot, `workers` chunk batches in parallel; returns points restored per collection."""
+  with open(os.path.join(in_dir, MANIFEST)) as f:
+    manifest = json.load(f)
+  if manifest.get("format_version") != FORMAT_VERSION:
+    raise ValueError(f"Unsupported snapshot format {manifest.get('format_version')}")
+
+  client = connect_qdrant()
+  live_aliases = aliases(client)
+  restored: Dict[str, int] = {}
+  for name, info in manifest["collections"].items():
+    if collections and name not in collections:
+      continue
+    _check_compatible(manifest, name, info)
+    qdrant_collection = QDRANT_COLLECTIONS.get(name, name)
+    target = qdrant_collection
+    if replace and qdrant_collection in live_aliases:
+      # The alias keeps serving the old version until the restore is complete
+      target = f"{qdrant_collection}_v{int(time.time())}"
+    elif replace and client.collection_exists(qdrant_collection):
+      client.delete_collection(qdrant_collection)
+    if qdrant_collection not in live_aliases or target != qdrant_collection:
+      if not client.collection_exists(target):
+        client.create_collection(
+          collection_name=target,
+          vectors_config=VectorParams(size=info["dimension"], distance=Distance(info["distance"])),
+        )
+        if name in USER_SCOPED_COLLECTIONS:
+          ensure_user_index(client, target)
+
+    def restore(chunk: Dict[str, Any]) -> int:
+      ids, vectors, payloads = _load_chunk(os.path.join(in_dir, name, chunk["file"]), chunk["sha256"])
+      for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        client.upsert(
+          collection_name=target,
+          points=Batch(ids=ids[start:end], vectors=vectors[start:end].tolist(), payloads=payloads[start:end]),
+        )
+      return len(ids)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+      restored[name] = sum(pool.map(restore, info["chunks"]))
+    if target != qdrant_collection:
+      previous = switch_alias(client, qdrant_collection, target)
+      if previous and previous != target:
+        client.delete_collection(previous)
+    log_event(
+      "snapshot_imported",
+      collection=name,
+      points=restored[name],
+      seconds=round(time.perf_counter() - started, 2),
+    )
+  return restored
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  commands = parser.add_subparsers(dest="command", required=True)
+
+  export_cmd = commands.add_parser("export", help="write a snapshot of the Qdrant collections")
+  export_cmd.add_argument("directory")
+  export_cmd.add_argument("--collections", nargs="*")
+  export_cmd.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+  export_cmd.add_argument("--dtype", choices=["float32", "float16"], default="float32", help="float16 halves the size")
+
+  import_cmd = commands.add_parser("import", help="restore a snapshot into Qdrant")
+  import_cmd.add_argument("directory")
+  import_cmd.add_argument("--collections", nargs="*")
+  import_cmd.add_argument("--workers", type=int, default=4)
+  import_cmd.add_argument("--batch-size", type=int, default=1000)
+  import_cmd.add_argument("--replace", action="store_true", help="drop existing collections first")
+
+  args = parser.parse_args(argv)
+  if args.command == "export":
+    manifest = export_snapshot(args.directory, args.collections, args.chunk_size, args.dtype)
+    print(json.dumps({name: info["points"] for name, info in manifest["collections"].items()}))
+  else:
+    print(json.dumps(import_snapshot(args.directory, args.collections, args.workers, args.batch_size, args.replace)))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,133 @@
+"""Content-addressed file storage (local disk or GridFS).
+
+Uploads are written in chunks while their sha256 is computed, so memory use
+does not depend on file size and identical content is stored only once.
+"""
+
+import hashlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from ..config import get_settings
+from ..database import database
+
+settings = get_settings()
+
+
+class StorageWriter(ABC):
+  """Receives the bytes of one upload; `commit` files it under its content hash."""
+
+  def __init__(self, filename: str, content_type: Optional[str]):
+    self.filename = filename
+    self.content_type = content_type
+    self.size = 0
+    self._hash = hashlib.sha256()
+
+  @property
+  def sha256(self) -> str:
+    return self._hash.hexdigest()
+
+  async def write(self, data: bytes) -> None:
+    self._hash.update(data)
+    self.size += len(data)
+    await self._write(data)
+
+  @abstractmethod
+  async def _write(self, data: bytes) -> None:
+    """Store the next chunk of the upload."""
+
+  @abstractmethod
+  async def commit(self) -> str:
+    """Finish the upload and return its storage key."""
+
+  @abstractmethod
+  async def discard(self) -> None:
+    """Drop the upload (duplicate content or failed request)."""
+
+
+class LocalWriter(StorageWriter):
+  def __init__(self, filename: str, content_type: Optional[str], root: str):
+    super().__init__(filename, content_type)
+    self.root = root
+    os.makedirs(os.path.join(root, "tmp"), exist_ok=True)
+    fd, self._tmp_path = tempfile.mkstemp(dir=os.path.join(root, "tmp"))
+    self._file = os.fdopen(fd, "wb")
+
+  async def _write(self, data: bytes) -> None:
+    self._file.write(data)
+
+  async def commit(self) -> str:
+    self._file.close()
+    digest = self.sha256
+    key = os.path.join(digest[:2], digest[2:4], digest)
+    final_path = os.path.join(self.root, key)
+    if os.path.exists(final_path):
+      os.unlink(self._tmp_path)
+    else:
+      os.makedirs(os.path.dirname(final_path), exist_ok=True)
+      os.replace(self._tmp_path, final_path)
+    return key
+
+  async def discard(self) -> None:
+    self._file.close()
+    if os.path.exists(self._tmp_path):
+      os.unlink(self._tmp_path)
+
+
+class GridFSWriter(StorageWriter):
+  def __init__(self, filename: str, content_type: Optional[str], bucket: AsyncIOMotorGridFSBucket):
+    super().__init__(filename, content_type)
+    self._bucket = bucket
+    self._stream = bucket.open_upload_stream(filename, metadata={"content_type": content_type})
+
+  async def _write(self, data: bytes) -> None:
+    await self._stream.write(data)
+
+  async def commit(self) -> str:
+    await self._stream.close()
+    await database["fs.files"].update_one({"_id": self._stream._id}, {"$set": {"metadata.sha256": self.sha256}})
+    return str(self._stream._id)
+
+  async def discard(self) -> None:
+    await self._stream.abort()
+
+
+def open_writer(filename: str, content_type: Optional[str]) -> StorageWriter:
+  if settings.storage_backend == "gridfs":
+    return GridFSWriter(filename, content_type, AsyncIOMotorGridFSBucket(database))
+  return LocalWriter(filename, content_type, settings.storage_dir)
+
+
+async def delete(key: str) -> None:
+  """Remove stored content that is no longer referenced."""
+  if settings.storage_backend == "gridfs":
+    from bson import ObjectId
+    await AsyncIOMotorGridFSBucket(database).delete(ObjectId(key))
+  else:
+    path = os.path.join(settings.storage_dir, key)
+    if os.path.exists(path):
+      os.unlink(path)
+
+
+@asynccontextmanager
+async def local_path(key: str, suffix: str = "") -> AsyncIterator[str]:
+  """Yield a local filesystem path for stored content (GridFS content is streamed to a temp file)."""
+  if settings.storage_backend != "gridfs":
+    yield os.path.join(settings.storage_dir, key)
+    return
+
+  from bson import ObjectId
+  fd, path = tempfile.mkstemp(suffix=suffix, dir=settings.upload_dir)
+  try:
+    grid_out = await AsyncIOMotorGridFSBucket(database).open_download_stream(ObjectId(key))
+    with os.fdopen(fd, "wb") as out:
+      while chunk := await grid_out.readchunk():
+        out.write(chunk)
+    yield path
+  finally:
+    os.unlink(path)
@@ -0,0 +1,319 @@
+"""Incremental Gmail / Drive sync.
+
+Pulls only what changed since the last run, using the Gmail `historyId` and
+the Drive changes page token persisted on the user's `integration_tokens`
+document. All Google calls share one pooled `httpx.AsyncClient`, run with
+bounded concurrency and back off on rate limiting. Fetched messages and
+files are written to `synced_items` and indexed into Qdrant in batches.
+"""
+
+import asyncio
+import random
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+
+from ..config import get_settings
+from ..database import get_collection
+from ..utils.tracing import log_event
+from .Qdrant import delete_vectors, insert_vectors
+from .integration_service import tokens_collection
+from .token_manager import token_manager
+
+settings = get_settings()
+items_collection: AsyncIOMotorCollection = get_collection("synced_items")
+
+INDEX_BATCH_SIZE = 64
+MAX_RETRIES = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DRIVE_FILE_FIELDS = "id,name,mimeType,description,modifiedTime,webViewLink,trashed"
+
+_http: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_user_locks: Dict[str, asyncio.Lock] = {}
+
+
+class HistoryExpired(Exception):
+  """Gmail no longer has history for the stored historyId; a full resync is needed."""
+
+
+def get_http_client() -> httpx.AsyncClient:
+  global _http, _semaphore
+  if _http is None:
+    _http = httpx.AsyncClient(
+      timeout=httpx.Timeout(30.0, connect=5.0),
+      limits=httpx.Limits(max_connections=settings.sync_concurrency * 2, max_keepalive_connections=settings.sync_concurrency),
+    )
+    _semaphore = asyncio.Semaphore(settings.sync_concurrency)
+  return _http
+
+
+async def close_http_client() -> None:
+  global _http
+  if _http is not None:
+    await _http.aclose()
+    _http = None
+
+
+def _is_rate_limited(response: httpx.Response) -> bool:
+  if response.status_code in RETRY_STATUSES:
+    return True
+  # Google reports per-user quota exhaustion as 403 rateLimitExceeded / userRateLimitExceeded
+  return response.status_code == 403 and "ratelimitexceeded" in response.text.lower()
+
+
+async def _get_json(url: str, access_token: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+  client = get_http_client()
+  headers = {"Authorization": f"Bearer {access_token}"}
+  for attempt in range(MAX_RETRIES + 1):
+    async with _semaphore:
+      try:
+        response = await client.get(url, params=params, headers=headers)
+      except httpx.TransportError:
+        if attempt == MAX_RETRIES:
+          raise
+        response = None
+    if response is not None and not _is_rate_limited(response):
+      if response.status_code == 404 and "/history" in url:
+        raise HistoryExpired()
+      response.raise_for_status()
+      return response.json()
+    if attempt == MAX_RETRIES:
+      response.raise_for_status()
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    delay = float(retry_after) if retry_after and retry_after.isdigit() else min(2 ** attempt, 32) + random.random()
+    log_event("google_api_backoff", url=url, status=getattr(response, "status_code", None), delay_s=round(delay, 2))
+    await asyncio.sleep(delay)
+  raise RuntimeError("unreachable")
+
+
+# --- Gmail -----------------------------------------------------------------
+
+async def _gmail_message_ids(access_token: str, history_id: Optional[str], removed: List[str]) -> tuple[List[str], str]:
+  """Return (new message ids, cursor to store); ids of deleted messages are appended to `removed`.
+
+  Falls back to a bounded initial listing when there is no cursor yet.
+  """
+  base = settings.google_gmail_api_url
+  if history_id:
+    ids: List[str] = []
+    deleted: List[str] = []
+    params: Dict[str, Any] = {"startHistoryId": history_id, "historyTypes": ["messageAdded", "messageDeleted"], "maxResults": 500}
+    latest = history_id
+    while True:
+      page = await _get_json(f"{base}/users/me/history", access_token, params)
+      latest = page.get("historyId", latest)
+      for record in page.get("history", []):
+        ids.extend(added["message"]["id"] for added in record.get("messagesAdded", []))
+        deleted.extend(gone["message"]["id"] for gone in record.get("messagesDeleted", []))
+      if not page.get("nextPageToken"):
+        gone = set(deleted)
+        removed.extend(dict.fromkeys(deleted))
+        # A message added and deleted within the same window is not fetched at all
+        return [i for i in dict.fromkeys(ids) if i not in gone], latest
+      params["pageToken"] = page["nextPageToken"]
+
+  # Take the cursor before listing so nothing added during the listing is lost
+  profile = await _get_json(f"{base}/users/me/profile", access_token)
+  ids = []
+  params = {"maxResults": min(500, settings.sync_initial_limit)}
+  while len(ids) < settings.sync_initial_limit:
+    page = await _get_json(f"{base}/users/me/messages", access_token, params)
+    ids.extend(m["id"] for m in page.get("messages", []))
+    if not page.get("nextPageToken"):
+      break
+    params["pageToken"] = page["nextPageToken"]
+  return ids[: settings.sync_initial_limit], profile["historyId"]
+
+
+async def _gmail_item(access_token: str, message_id: str) -> Optional[Dict[str, Any]]:
+  try:
+    message = await _get_json(
+      f"{settings.google_gmail_api_url}/users/me/messages/{message_id}",
+      access_token,
+      {"format": "metadata", "metadataHeaders": ["Subject", "From", "Date"]},
+    )
+  except httpx.HTTPStatusError as e:
+    if e.response.status_code == 404:  # deleted between listing and fetch
+      return None
+    raise
+  headers = {h["name"].lower(): h["value"] for h in message.get("payload", {}).get("headers", [])}
+  subject = headers.get("subject", "(no subject)")
+  return {
+    "source": "gmail",
+    "external_id": message_id,
+    "title": subject,
+    "text": f"{subject}\nFrom: {headers.get('from', '')}\n{message.get('snippet', '')}",
+    "url": f"https://mail.google.com/mail/u/0/#all/{message_id}",
+  }
+
+
+async def _gmail_items(access_token: str, ids: List[str]) -> AsyncIterator[Dict[str, Any]]:
+  # Fetch in windows so memory stays bounded; concurrency is capped by the shared semaphore
+  window = INDEX_BATCH_SIZE * 2
+  for start in range(0, len(ids), window):
+    for item in await asyncio.gather(*(_gmail_item(access_token, i) for i in ids[start:start + window])):
+      if item:
+        yield item
+
+
+# --- Drive -----------------------------------------------------------------
+
+def _drive_item(file: Dict[str, Any]) -> Dict[str, Any]:
+  text = file.get("name", "")
+  if file.get("description"):
+    text += f"\n{file['description']}"
+  return {
+    "source": "drive",
+    "external_id": file["id"],
+    "title": file.get("name", ""),
+    "text": text,
+    "url": file.get("webViewLink"),
+    "mime_type": file.get("mimeType"),
+  }
+
+
+async def _drive_changes(access_token: str, page_token: Optional[str], removed: List[str]) -> tuple[List[Dict[str, Any]], str]:
+  """Return (changed files, cursor to store); ids of removed/trashed files are appended to `removed`."""
+  base = settings.google_drive_api_url
+  items: List[Dict[str, Any]] = []
+  if not page_token:
+    start = await _get_json(f"{base}/changes/startPageToken", access_token)
+    params: Dict[str, Any] = {"pageSize": 1000, "fields": f"nextPageToken,files({DRIVE_FILE_FIELDS})", "q": "trashed = false"}
+    while len(items) < settings.sync_initial_limit:
+      page = await _get_json(f"{base}/files", access_token, params)
+      items.extend(_drive_item(f) for f in page.get("files", []))
+      if not page.get("nextPageToken"):
+        break
+      params["pageToken"] = page["nextPageToken"]
+    return items[: settings.sync_initial_limit], start["startPageToken"]
+
+  params = {"pageToken": page_token, "pageSize": 1000, "fields": f"nextPageToken,newStartPageToken,changes(fileId,removed,file({DRIVE_FILE_FIELDS}))"}
+  while True:
+    page = await _get_json(f"{base}/changes", access_token, params)
+    for change in page.get("changes", []):
+      file = change.get("file") or {}
+      if change.get("removed") or file.get("trashed"):
+        removed.append(change["fileId"])
+      elif file:
+        items.append(_drive_item(file))
+    if page.get("newStartPageToken"):
+      return items, page["newStartPageToken"]
+    if not page.get("nextPageToken"):
+      # Neither token: nothing more to read, keep the current cursor
+      return items, params["pageToken"]
+    params["pageToken"] = page["nextPageToken"]
+
+
+# --- Indexing --------------------------------------------------------------
+
+async def _index_batch(user_id: str, provider: str, batch: List[Dict[str, Any]]) -> int:
+  now = datetime.utcnow()
+  await items_collection.bulk_write(
+    [
+      UpdateOne(
+        {"user_id": user_id, "source": item["source"], "external_id": item["external_id"]},
+        {"$set": {**item, "user_id": user_id, "provider": provider, "synced_at": now}},
+        upsert=True,
+      )
+      for item in batch
+    ],
+    ordered=False,
+  )
+  external_ids = [item["external_id"] for item in batch]
+  stored = items_collection.find(
+    {"user_id": user_id, "source": batch[0]["source"], "external_id": {"$in": external_ids}},
+    {"_id": 1, "external_id": 1},
+  )
+  mongo_ids = {doc["external_id"]: str(doc["_id"]) async for doc in stored}
+  return await insert_vectors(
+    "synced_items",
+    [
+      {
+        "id": mongo_ids[item["external_id"]],
+        "text": item["text"],
+        "payload": {"title": item["title"], "text": item["text"], "source": item["source"], "url": item.get("url"), "user_id": user_id},
+      }
+      for item in batch
+      if item["external_id"] in mongo_ids
+    ],
+  )
+
+
+async def _index_stream(user_id: str, provider: str, items: AsyncIterator[Dict[str, Any]]) -> int:
+  indexed, batch = 0, []
+  async for item in items:
+    batch.append(item)
+    if len(batch) >= INDEX_BATCH_SIZE:
+      indexed += await _index_batch(user_id, provider, batch)
+      batch = []
+  if batch:
+    indexed += await _index_batch(user_id, provider, batch)
+  return indexed
+
+
+async def _aiter(items: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+  for item in items:
+    yield item
+
+
+async def _remove_items(user_id: str, source: str, external_ids: List[str]) -> int:
+  if not external_ids:
+    return 0
+  query = {"user_id": user_id, "source": source, "external_id": {"$in": external_ids}}
+  mongo_ids = [str(doc["_id"]) async for doc in items_collection.find(query, {"_id": 1})]
+  await delete_vectors("synced_items", mongo_ids)
+  result = await items_collection.delete_many(query)
+  return result.deleted_count
+
+
+async def sync_google(user_id: str) -> Dict[str, Any]:
+  """Run one incremental Gmail + Drive sync for the user and persist the new cursors."""
+  lock = _user_locks.setdefault(user_id, asyncio.Lock())
+  if lock.locked():
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A sync is already running for this integration.")
+  async with lock:
+    token_doc = await tokens_collection.find_one({"user_id": user_id, "provider": "google"})
+    if not token_doc:
+      raise HTTPException(status_code=404, detail="Integration not found.")
+    access_token = await token_manager.get_access_token(user_id, "google")
+    state = token_doc.get("sync", {})
+
+    deleted: List[str] = []
+    try:
+      message_ids, history_id = await _gmail_message_ids(access_token, state.get("gmail_history_id"), deleted)
+    except HistoryExpired:
+      message_ids, history_id = await _gmail_message_ids(access_token, None, deleted)
+    gmail_indexed = await _index_stream(user_id, "google", _gmail_items(access_token, message_ids))
+    gmail_removed = await _remove_items(user_id, "gmail", deleted)
+
+    removed: List[str] = []
+    files, page_token = await _drive_changes(access_token, state.get("drive_page_token"), removed)
+    drive_indexed = await _index_stream(user_id, "google", _aiter(files))
+    drive_removed = await _remove_items(user_id, "drive", removed)
+
+    # Cursors are saved only after the items they cover are indexed, so a failed run is retried in full
+    now = datetime.utcnow()
+    await tokens_collection.update_one(
+      {"_id": token_doc["_id"]},
+      {"$set": {"sync.gmail_history_id": history_id, "sync.drive_page_token": page_token, "last_synced_at": now}},
+    )
+    stats = {
+      "gmail_messages": gmail_indexed,
+      "gmail_removed": gmail_removed,
+      "drive_files": drive_indexed,
+      "drive_removed": drive_removed,
+      "last_synced_at": now.isoformat(),
+    }
+    log_event("google_sync_completed", user_id=user_id, **stats)
+    return stats
+
+
+async def sync(provider: str, user_id: str) -> Dict[str, Any]:
+  if provider != "google":
+    raise HTTPException(status_code=404, detail="Provider not supported.")
+  return await sync_google(user_id)
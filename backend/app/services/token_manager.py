@@ -0,0 +1,141 @@
+"""OAuth access-token manager for stored integrations.
+
+Decrypted access tokens are kept in a short-lived in-memory cache and
+refreshed shortly before `expires_at`. Concurrent callers for the same
+user/provider share one in-flight load or refresh, and refreshed tokens are
+written back to `integration_tokens` in batches.
+
+A refreshed access token that has not been flushed yet is simply lost on a
+crash; the next call refreshes again with the stored refresh token.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException, status
+from pymongo import UpdateOne
+
+from ..utils.crypto import decrypt, encrypt
+from ..utils.metrics import record_cache
+from ..utils.singleflight import SingleFlight
+from ..utils.tracing import log_event
+from .integration_service import OAUTH_PROVIDERS, tokens_collection
+
+# Refresh this long before the provider's expiry so in-flight calls never carry a dead token
+REFRESH_SKEW = timedelta(minutes=2)
+# Upper bound on how long a decrypted token is served from memory
+CACHE_TTL = timedelta(minutes=5)
+FLUSH_INTERVAL_SECONDS = 2.0
+FLUSH_MAX_PENDING = 50
+
+Key = Tuple[str, str]
+
+
+class TokenManager:
+  def __init__(self):
+    self._cache: Dict[Key, Tuple[str, datetime]] = {}
+    self._loads = SingleFlight()
+    self._pending: Dict[Key, Dict[str, Any]] = {}
+    self._flush_task: Optional[asyncio.Task] = None
+
+  async def get_access_token(self, user_id: str, provider: str) -> str:
+    key = (user_id, provider)
+    cached = self._cache.get(key)
+    if cached and cached[1] > datetime.utcnow():
+      record_cache("oauth_token", True)
+      return cached[0]
+    record_cache("oauth_token", False)
+    token, _ = await self._loads.do(key, lambda: self._load(user_id, provider))
+    return token
+
+  def invalidate(self, user_id: str, provider: str) -> None:
+    """Forget cached and unflushed state, e.g. after reconnecting or disconnecting."""
+    self._cache.pop((user_id, provider), None)
+    self._pending.pop((user_id, provider), None)
+
+  async def _load(self, user_id: str, provider: str) -> str:
+    key = (user_id, provider)
+    doc = await tokens_collection.find_one({"user_id": user_id, "provider": provider})
+    if not doc:
+      raise HTTPException(status_code=404, detail="Integration not found.")
+    # An unflushed refresh is newer than what Mongo has
+    doc.update(self._pending.get(key, {}))
+
+    expires_at: datetime = doc.get("expires_at") or datetime.utcnow()
+    if expires_at - REFRESH_SKEW > datetime.utcnow():
+      token = decrypt(doc["access_token"])
+    else:
+      token, expires_at, refresh_token = await self._refresh(provider, decrypt(doc["refresh_token"]))
+      update = {
+        "access_token": encrypt(token),
+        "expires_at": expires_at,
+        "updated_at": datetime.utcnow(),
+      }
+      if refresh_token:
+        update["refresh_token"] = encrypt(refresh_token)
+      self._pending[key] = update
+      if refresh_token or len(self._pending) >= FLUSH_MAX_PENDING:
+        # A rotated refresh token must not be lost
+        await self.flush()
+      else:
+        self._schedule_flush()
+
+    self._cache[key] = (token, min(expires_at - REFRESH_SKEW, datetime.utcnow() + CACHE_TTL))
+    return token
+
+  async def _refresh(self, provider: str, refresh_token: str) -> Tuple[str, datetime, Optional[str]]:
+    meta = OAUTH_PROVIDERS.get(provider)
+    if not meta:
+      raise HTTPException(status_code=404, detail="Provider not supported.")
+    async with httpx.AsyncClient(timeout=10.0) as client:
+      response = await client.post(
+        meta["token_url"],
+        data={
+          "client_id": meta["client_id"],
+          "client_secret": meta["client_secret"],
+          "refresh_token": refresh_token,
+          "grant_type": "refresh_token",
+        },
+      )
+    if response.status_code >= 400:
+      log_event("oauth_refresh_failed", provider=provider, status=response.status_code)
+      raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=f"Could not refresh the {provider} token; reconnect the integration.",
+      )
+    data = response.json()
+    log_event("oauth_token_refreshed", provider=provider)
+    expires_at = datetime.utcnow() + timedelta(seconds=data.get("expires_in", 3600))
+    return data["access_token"], expires_at, data.get("refresh_token")
+
+  def _schedule_flush(self) -> None:
+    if self._flush_task is None or self._flush_task.done():
+      self._flush_task = asyncio.create_task(self._flush_later())
+
+  async def _flush_later(self) -> None:
+    await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+    await self.flush()
+
+  async def flush(self) -> None:
+    """Write all pending refreshed tokens back to Mongo in one bulk write."""
+    if not self._pending:
+      return
+    pending, self._pending = self._pending, {}
+    try:
+      await tokens_collection.bulk_write(
+        [
+          UpdateOne({"user_id": user_id, "provider": provider}, {"$set": fields})
+          for (user_id, provider), fields in pending.items()
+        ],
+        ordered=False,
+      )
+    except Exception as e:
+      # Keep them for the next flush unless something newer replaced them meanwhile
+      for key, fields in pending.items():
+        self._pending.setdefault(key, fields)
+      log_event("oauth_token_flush_failed", error=str(e), pending=len(pending))
+
+
+token_manager = TokenManager()
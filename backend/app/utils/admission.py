@@ -0,0 +1,140 @@
+"""Admission control for LLM-bound endpoints.
+
+At most `max_concurrency` requests run at once; the rest wait in a bounded
+queue that is drained round-robin across users, so one heavy user cannot
+starve the others. When the queue is full, or a request has waited too
+long, it is rejected immediately with 429/503 and a `Retry-After` hint
+instead of piling onto the embedding model and the LLM.
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict
+
+from fastapi import HTTPException, status
+
+from .metrics import ADMISSION_ACTIVE, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTED, ADMISSION_WAIT_SECONDS
+
+
+class AdmissionRejected(HTTPException):
+  """429/503 raised when a request is not admitted."""
+
+
+class AdmissionController:
+  def __init__(
+    self,
+    name: str,
+    max_concurrency: int,
+    max_queue: int,
+    max_queue_per_user: int,
+    max_wait_seconds: float,
+  ):
+    self.name = name
+    self.max_concurrency = max_concurrency
+    self.max_queue = max_queue
+    self.max_queue_per_user = max_queue_per_user
+    self.max_wait_seconds = max_wait_seconds
+    self._active = 0
+    self._queued = 0
+    # user -> waiting futures; iteration order is the round-robin order
+    self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+    # smoothed time a request holds its slot, used for Retry-After
+    self._service_seconds = 1.0
+
+  def _retry_after(self) -> int:
+    return max(1, math.ceil(self._service_seconds * (self._queued + 1) / self.max_concurrency))
+
+  def _reject(self, code: int, reason: str, detail: str) -> AdmissionRejected:
+    ADMISSION_REJECTED.labels(pool=self.name, reason=reason).inc()
+    return AdmissionRejected(status_code=code, detail=detail, headers={"Retry-After": str(self._retry_after())})
+
+  def _dequeue(self, user: str, future: asyncio.Future) -> None:
+    queue = self._waiters.get(user)
+    if queue and future in queue:
+      queue.remove(future)
+      if not queue:
+        del self._waiters[user]
+      self._queued -= 1
+      ADMISSION_QUEUE_DEPTH.labels(pool=self.name).set(self._queued)
+
+  async def acquire(self, user: str) -> None:
+    if self._active < self.max_concurrency and not self._queued:
+      self._active += 1
+      ADMISSION_ACTIVE.labels(pool=self.name).set(self._active)
+      ADMISSION_WAIT_SECONDS.labels(pool=self.name).observe(0)
+      return
+    if self._queued >= self.max_queue:
+      raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "queue_full", "Server is busy, please retry shortly.")
+    if len(self._waiters.get(user, ())) >= self.max_queue_per_user:
+      raise self._reject(status.HTTP_429_TOO_MANY_REQUESTS, "user_limit", "Too many concurrent requests for this user.")
+
+    future = asyncio.get_running_loop().create_future()
+    self._waiters.setdefault(user, deque()).append(future)
+    self._queued += 1
+    ADMISSION_QUEUE_DEPTH.labels(pool=self.name).set(self._queued)
+    start = time.perf_counter()
+    try:
+      await asyncio.wait_for(asyncio.shield(future), timeout=self.max_wait_seconds)
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+      if future.done() and not future.cancelled():
+        # The slot was handed over just as we gave up: pass it on
+        self.release()
+      else:
+        future.cancel()
+        self._dequeue(user, future)
+      if isinstance(e, asyncio.CancelledError):
+        raise
+      raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "timeout", "Server is busy, please retry shortly.")
+    finally:
+      ADMISSION_WAIT_SECONDS.labels(pool=self.name).observe(time.perf_counter() - start)
+
+  def release(self) -> None:
+    # Hand the slot directly to the next user in round-robin order
+    while self._waiters:
+      user, queue = next(iter(self._waiters.items()))
+      future = queue.popleft()
+      self._queued -= 1
+      if queue:
+        self._waiters.move_to_end(user)
+      else:
+        del self._waiters[user]
+      ADMISSION_QUEUE_DEPTH.labels(pool=self.name).set(self._queued)
+      if not future.done():
+        future.set_result(None)
+        return
+    self._active -= 1
+    ADMISSION_ACTIVE.labels(pool=self.name).set(self._active)
+
+  @asynccontextmanager
+  async def slot(self, user: str) -> AsyncIterator[None]:
+    await self.acquire(user)
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self._service_seconds = 0.9 * self._service_seconds + 0.1 * (time.perf_counter() - start)
+      self.release()
+
+
+_controllers: Dict[str, AdmissionController] = {}
+
+
+def get_controller(name: str = "llm") -> AdmissionController:
+  """
+  Shared controller per pool; chat and RAG share "llm" since they contend for the same model.
+  "batch" admits whole /rag/query/batch requests, RAG_BATCH_MAX_CONCURRENT at a time.
+  """
+  if name not in _controllers:
+    from ..config import get_settings
+    settings = get_settings()
+    _controllers[name] = AdmissionController(
+      name,
+      max_concurrency=settings.rag_batch_max_concurrent if name == "batch" else settings.admission_max_concurrency,
+      max_queue=settings.admission_max_queue,
+      max_queue_per_user=settings.admission_max_queue_per_user,
+      max_wait_seconds=settings.admission_max_wait_seconds,
+    )
+  return _controllers[name]
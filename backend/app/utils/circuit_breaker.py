@@ -0,0 +1,265 @@
+"""Circuit breakers for external dependencies (Qdrant, MongoDB, the LLM).
+
+Each breaker keeps the outcomes of the last `BREAKER_WINDOW_SECONDS` of
+calls. Once at least `BREAKER_MIN_CALLS` were seen and the failure rate
+reaches `BREAKER_FAILURE_RATE`, it opens: calls are refused immediately
+(`CircuitOpenError`) so callers fall back at once instead of stacking up
+connection timeouts. After `BREAKER_OPEN_SECONDS` it turns half-open and
+lets `BREAKER_HALF_OPEN_CALLS` probes through; a successful probe closes
+it, a failed one opens it again.
+
+State is exported as `sba_circuit_breaker_state` (0 closed, 1 half-open,
+2 open) and reported by `/health`.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+from fastapi import HTTPException, status
+from pymongo import monitoring
+
+from .metrics import BREAKER_REJECTED, BREAKER_STATE, BREAKER_TRANSITIONS
+from .tracing import log_event
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+DEPENDENCIES = ("qdrant", "mongo", "llm")
+
+
+class CircuitOpenError(Exception):
+  def __init__(self, name: str, retry_after: float):
+    super().__init__(f"{name} is unavailable (circuit open), retry in {retry_after:.0f}s")
+    self.name = name
+    self.retry_after = retry_after
+
+
+class CircuitBreaker:
+  def __init__(
+    self,
+    name: str,
+    failure_rate: float = 0.5,
+    min_calls: int = 5,
+    window_seconds: float = 30.0,
+    open_seconds: float = 15.0,
+    half_open_calls: int = 1,
+  ):
+    self.name = name
+    self.failure_rate = failure_rate
+    self.min_calls = min_calls
+    self.window_seconds = window_seconds
+    self.open_seconds = open_seconds
+    self.half_open_calls = half_open_calls
+    self.state = CLOSED
+    # (timestamp, failed) of recent calls
+    self._outcomes: Deque[Tuple[float, bool]] = deque()
+    self._opened_at = 0.0
+    self._probes = 0
+    # Guarded calls also run in worker threads (the Qdrant client is synchronous)
+    self._lock = threading.Lock()
+    BREAKER_STATE.labels(dependency=name).set(0)
+
+  def _set_state(self, state: str) -> None:
+    if state == self.state:
+      return
+    log_event("circuit_breaker", dependency=self.name, state=state, previous=self.state)
+    self.state = state
+    BREAKER_STATE.labels(dependency=self.name).set(_STATE_VALUES[state])
+    BREAKER_TRANSITIONS.labels(dependency=self.name, state=state).inc()
+
+  def _open(self, now: float) -> None:
+    self._opened_at = now
+    self._outcomes.clear()
+    self._set_state(OPEN)
+
+  def _trim(self, now: float) -> None:
+    while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+      self._outcomes.popleft()
+
+  def retry_after(self) -> float:
+    return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+  def available(self) -> bool:
+    """Whether a call could currently go through; unlike `allow()` it does not take a probe slot."""
+    return self.state != OPEN or self.retry_after() <= 0
+
+  def allow(self) -> bool:
+    """Admit one call, taking a probe slot when half-open. Every admitted call should be recorded."""
+    with self._lock:
+      now = time.monotonic()
+      if self.state == OPEN:
+        if now < self._opened_at + self.open_seconds:
+          return False
+        self._probes = 0
+        self._opened_at = now
+        self._set_state(HALF_OPEN)
+      if self.state == HALF_OPEN:
+        if self._probes >= self.half_open_calls:
+          # Probes that never reported back (cancelled, no call made) free their slots after a while
+          if now < self._opened_at + self.open_seconds:
+            return False
+          self._probes = 0
+          self._opened_at = now
+        self._probes += 1
+      return True
+
+  def record_success(self) -> None:
+    with self._lock:
+      now = time.monotonic()
+      if self.state == HALF_OPEN:
+        self._outcomes.clear()
+        self._set_state(CLOSED)
+      self._outcomes.append((now, False))
+      self._trim(now)
+
+  def record_failure(self) -> None:
+    with self._lock:
+      now = time.monotonic()
+      if self.state == HALF_OPEN:
+        self._open(now)
+        return
+      if self.state == OPEN:
+        return
+      self._outcomes.append((now, True))
+      self._trim(now)
+      failures = sum(1 for _, failed in self._outcomes if failed)
+      if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+        self._open(now)
+
+  def check(self) -> None:
+    """Raise CircuitOpenError unless a call is admitted."""
+    if not self.allow():
+      BREAKER_REJECTED.labels(dependency=self.name).inc()
+      raise CircuitOpenError(self.name, self.retry_after())
+
+  @contextmanager
+  def guard(self, is_failure: Optional[Callable[[BaseException], bool]] = None) -> Iterator[None]:
+    """Run the block as one call: refused while open, its outcome recorded otherwise.
+
+    `is_failure` decides which exceptions mean the dependency is unhealthy (default: all of them);
+    others, like a 404 or a validation error, count as the dependency having answered.
+    """
+    self.check()
+    try:
+      yield
+    except Exception as e:
+      if is_failure is None or is_failure(e):
+        self.record_failure()
+      else:
+        self.record_success()
+      raise
+    except BaseException:
+      # Cancelled before the dependency answered: no verdict either way
+      raise
+    else:
+      self.record_success()
+
+  def snapshot(self) -> Dict[str, Any]:
+    with self._lock:
+      self._trim(time.monotonic())
+      calls = len(self._outcomes)
+      failures = sum(1 for _, failed in self._outcomes if failed)
+    info: Dict[str, Any] = {
+      "state": self.state,
+      "calls": calls,
+      "failure_rate": round(failures / calls, 3) if calls else 0.0,
+    }
+    if self.state == OPEN:
+      info["retry_after_seconds"] = round(self.retry_after(), 1)
+    return info
+
+
+class GuardedClient:
+  """Proxy that runs every method call of a synchronous client through a breaker."""
+
+  def __init__(self, client: Any, breaker: CircuitBreaker, is_failure: Optional[Callable[[BaseException], bool]] = None):
+    self._client = client
+    self._breaker = breaker
+    self._is_failure = is_failure
+
+  def __getattr__(self, name: str) -> Any:
+    attr = getattr(self._client, name)
+    if not callable(attr):
+      return attr
+
+    def call(*args, **kwargs):
+      with self._breaker.guard(self._is_failure):
+        return attr(*args, **kwargs)
+
+    return call
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+  breaker = _breakers.get(name)
+  if breaker is None:
+    from ..config import get_settings
+    settings = get_settings()
+    breaker = _breakers[name] = CircuitBreaker(
+      name,
+      failure_rate=settings.breaker_failure_rate,
+      min_calls=settings.breaker_min_calls,
+      window_seconds=settings.breaker_window_seconds,
+      open_seconds=settings.breaker_open_seconds,
+      half_open_calls=settings.breaker_half_open_calls,
+    )
+  return breaker
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+  return {name: get_breaker(name).snapshot() for name in DEPENDENCIES}
+
+
+def require(name: str) -> Callable[[], Any]:
+  """Route dependency: answer 503 at once while `name`'s circuit is open instead of waiting on it."""
+
+  async def dependency() -> None:
+    breaker = get_breaker(name)
+    if not breaker.allow():
+      BREAKER_REJECTED.labels(dependency=name).inc()
+      raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=f"{name} is temporarily unavailable, please retry shortly.",
+        headers={"Retry-After": str(max(1, round(breaker.retry_after())))},
+      )
+
+  return dependency
+
+
+# Driver-reported error types that mean the server could not be reached (as opposed to a command error)
+_MONGO_NETWORK_ERRORS = {"AutoReconnect", "NetworkTimeout", "ConnectionFailure", "ServerSelectionTimeoutError", "NotPrimaryError"}
+
+
+class MongoCommandBreaker(monitoring.CommandListener):
+  """Feeds the Mongo breaker with command outcomes reported by the driver."""
+
+  def started(self, event):
+    pass
+
+  def succeeded(self, event):
+    get_breaker("mongo").record_success()
+
+  def failed(self, event):
+    # Command errors (duplicate key, validation...) are server replies and mean Mongo is up
+    if event.failure.get("errtype") in _MONGO_NETWORK_ERRORS:
+      get_breaker("mongo").record_failure()
+    else:
+      get_breaker("mongo").record_success()
+
+
+class MongoHeartbeatBreaker(monitoring.ServerHeartbeatListener):
+  """Feeds the Mongo breaker with server heartbeats, which keep probing while requests are refused."""
+
+  def started(self, event):
+    pass
+
+  def succeeded(self, event):
+    get_breaker("mongo").record_success()
+
+  def failed(self, event):
+    get_breaker("mongo").record_failure()
@@ -0,0 +1,103 @@
+"""Per-request deadline budgets.
+
+A `Deadline` is created when a chat or RAG request arrives and handed down
+through history loading, query embedding, retrieval and generation. Each
+stage may spend at most its share of the total budget (and never more than
+what is left); when a stage runs out it degrades instead of failing:
+
+- history:    answer without conversation history
+- embedding:  answer without retrieved context
+- retrieval:  keep the collections that answered, skip the slow ones
+- generation: return the answer streamed so far, or fail if there is none
+
+Every degradation is counted in `sba_deadline_degradations_total` and listed
+in the response as "stage:action".
+
+Blocking work a stage may give up on (query embedding, Qdrant searches) runs
+through `offload`, on a dedicated pool of `DEADLINE_WORKER_THREADS` threads:
+a call that is still running when its stage times out keeps a thread busy
+until it returns, and that must not starve the default executor everything
+else uses. Calls that have not started yet are dropped on timeout.
+"""
+
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, List, Optional, TypeVar
+
+from .metrics import DEADLINE_DEGRADATIONS
+from .tracing import log_event
+
+T = TypeVar("T")
+
+# Upper bound on the fraction of the total budget a stage may use; generation gets whatever is left
+STAGE_SHARES = {"history": 0.1, "embedding": 0.15, "retrieval": 0.25}
+
+
+class DeadlineExceeded(TimeoutError):
+  """Raised when a stage has nothing to degrade to (e.g. no answer at all before the deadline)."""
+
+
+class Deadline:
+  def __init__(self, seconds: Optional[float]):
+    self.total = seconds if seconds and seconds > 0 else None
+    self._expires_at = time.monotonic() + self.total if self.total else None
+    self.degradations: List[str] = []
+
+  @classmethod
+  def from_settings(cls) -> "Deadline":
+    from ..config import get_settings
+    return cls(get_settings().request_deadline_seconds)
+
+  def remaining(self) -> Optional[float]:
+    """Seconds left, or None when the request has no deadline."""
+    if self._expires_at is None:
+      return None
+    return max(0.0, self._expires_at - time.monotonic())
+
+  @property
+  def expired(self) -> bool:
+    remaining = self.remaining()
+    return remaining is not None and remaining <= 0
+
+  def budget(self, stage: str) -> Optional[float]:
+    """Time `stage` may spend: its share of the total, capped by what is left."""
+    remaining = self.remaining()
+    if remaining is None or stage not in STAGE_SHARES:
+      return remaining
+    return min(remaining, self.total * STAGE_SHARES[stage])
+
+  def degrade(self, stage: str, action: str, **details: Any) -> None:
+    self.degradations.append(f"{stage}:{action}")
+    DEADLINE_DEGRADATIONS.labels(stage=stage, action=action).inc()
+    log_event("deadline_degraded", stage=stage, action=action, budget_s=self.total, **details)
+
+  async def run(self, stage: str, awaitable: Awaitable[T], action: str, default: T) -> T:
+    """Await within the stage budget; on timeout record `stage:action` and return `default`."""
+    try:
+      return await asyncio.wait_for(awaitable, timeout=self.budget(stage))
+    except asyncio.TimeoutError:
+      self.degrade(stage, action)
+      return default
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+async def offload(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+  """Run blocking `fn` in the deadline worker pool (like asyncio.to_thread, but bounded and separate)."""
+  global _executor
+  if _executor is None:
+    from ..config import get_settings
+    _executor = ThreadPoolExecutor(max_workers=get_settings().deadline_worker_threads, thread_name_prefix="sba-deadline")
+  call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+  return await asyncio.get_running_loop().run_in_executor(_executor, call)
+
+
+def shutdown_executor() -> None:
+  global _executor
+  if _executor is not None:
+    _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
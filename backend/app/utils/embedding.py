@@ -1,16 +1,65 @@
+import numpy as np
 from sentence_transformers import SentenceTransformer
 from typing import Optional
 
+from .metrics import EMBEDDING_BATCH_SIZE, EMBEDDING_LATENCY, timed
+
+EMBEDDING_MODEL_NAME = "Qwen/Qwen3-Embedding-0.6B"
+
+# Full output size of known models, used when the model itself can't be loaded.
+# Qwen3-Embedding is Matryoshka-trained: any prefix of its output (32..1024 dims)
+# is a usable embedding once re-normalized.
+NATIVE_DIMENSIONS = {EMBEDDING_MODEL_NAME: 1024}
+MIN_MATRYOSHKA_DIMENSION = 32
+
 # Lazy load the model to avoid blocking startup
 _model: Optional[SentenceTransformer] = None
 _embedding_dimension: Optional[int] = None
+_remote_client = None
+
+def load_embedding_model(
+    model_name: str = EMBEDDING_MODEL_NAME,
+    backend: str = "torch",
+    precision: str = "float32",
+    device: Optional[str] = None,
+) -> SentenceTransformer:
+    """Load a SentenceTransformer with the given inference backend (torch/onnx/openvino) and precision"""
+    kwargs = {}
+    if backend != "torch":
+        kwargs["backend"] = backend
+    elif precision != "float32":
+        import torch
+        kwargs["model_kwargs"] = {"torch_dtype": getattr(torch, precision)}
+    return SentenceTransformer(model_name, device=device, **kwargs)
+
+def _is_remote() -> bool:
+    # Stand-ins injected into _model (benchmarks) always win over the configured mode
+    if _model is not None:
+        return False
+    from ..config import get_settings
+    return get_settings().embedding_mode == "remote"
+
+def _get_remote_client():
+    """Client for the shared embedding server (EMBEDDING_MODE=remote)"""
+    global _remote_client
+    if _remote_client is None:
+        from ..config import get_settings
+        from .embedding_server import EmbeddingClient
+        settings = get_settings()
+        _remote_client = EmbeddingClient(settings.embedding_socket, settings.embedding_authkey)
+    return _remote_client
 
 def _get_model() -> SentenceTransformer:
     """Lazy load the embedding model"""
     global _model
     if _model is None:
         try:
-            _model = SentenceTransformer("Qwen/Qwen3-Embedding-0.6B")
+            from ..config import get_settings
+            settings = get_settings()
+            _model = load_embedding_model(
+                backend=settings.embedding_backend,
+                precision=settings.embedding_precision,
+            )
             # Get actual embedding dimension from the model
             global _embedding_dimension
             test_embedding = _model.encode("test").tolist()
@@ -22,31 +71,84 @@ def _get_model() -> SentenceTransformer:
             raise
     return _model
 
-def get_embedding_dimension() -> int:
-    """Get the actual embedding dimension from the model"""
+def _encode(texts: list[str]) -> list[list[float]]:
+    """Encode a batch either in-process or through the embedding server"""
+    remote = _is_remote()
+    EMBEDDING_BATCH_SIZE.observe(len(texts))
+    with timed(EMBEDDING_LATENCY, "embedding", mode="remote" if remote else "local"):
+        if remote:
+            return _get_remote_client().encode(texts)
+        return _get_model().encode(texts, batch_size=len(texts)).tolist()
+
+def get_native_dimension() -> int:
+    """Full output dimension of the embedding model"""
     global _embedding_dimension
     if _embedding_dimension is None:
         try:
-            model = _get_model()
-            test_embedding = model.encode("test").tolist()
-            _embedding_dimension = len(test_embedding)
+            if _is_remote():
+                _embedding_dimension = _get_remote_client().dimension()
+            else:
+                model = _get_model()
+                test_embedding = model.encode("test").tolist()
+                _embedding_dimension = len(test_embedding)
         except Exception:
-            # Fallback to default if model can't be loaded
-            _embedding_dimension = 1024  # Updated default based on actual model
+            # Fallback to the model's published size if it can't be loaded
+            _embedding_dimension = NATIVE_DIMENSIONS.get(EMBEDDING_MODEL_NAME, 1024)
     return _embedding_dimension
 
-def get_embedding(text: str) -> list[float]:
+def _configured_dimensions() -> dict[str, int]:
+    from ..config import get_settings
+    spec = get_settings().embedding_collection_dimensions or ""
+    dimensions = {}
+    for entry in spec.split(","):
+        if ":" in entry:
+            name, dim = entry.split(":", 1)
+            dimensions[name.strip()] = int(dim)
+    return dimensions
+
+def get_embedding_dimension(collection_name: Optional[str] = None) -> int:
+    """
+    Output dimension for a collection: EMBEDDING_COLLECTION_DIMENSIONS entry,
+    else EMBEDDING_DIMENSION, else the model's full dimension.
+    """
+    from ..config import get_settings
+    dimension = _configured_dimensions().get(collection_name) if collection_name else None
+    if dimension is None:
+        dimension = get_settings().embedding_dimension
+    if dimension is None:
+        return get_native_dimension()
+    if dimension < MIN_MATRYOSHKA_DIMENSION:
+        raise ValueError(f"Embedding dimension {dimension} is below the Matryoshka minimum of {MIN_MATRYOSHKA_DIMENSION}")
+    return dimension
+
+def truncate_embeddings(vectors: list[list[float]], dimension: Optional[int]) -> list[list[float]]:
+    """Keep the first `dimension` components of each vector and re-normalize to unit length"""
+    if not vectors or dimension is None or len(vectors[0]) <= dimension:
+        return vectors
+    matrix = np.asarray(vectors, dtype=np.float32)[:, :dimension]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.maximum(norms, 1e-12)).tolist()
+
+def get_embedding(text: str, dimension: Optional[int] = None) -> list[float]:
     """Get embedding for text, with error handling"""
+    return get_embeddings([text], dimension)[0]
+
+def get_embeddings(texts: list[str], dimension: Optional[int] = None) -> list[list[float]]:
+    """
+    Get embeddings for several texts in one encoder batch, with error handling.
+    `dimension` truncates them Matryoshka-style; None returns the full vectors.
+    """
+    if not texts:
+        return []
     try:
-        model = _get_model()
-        embedding = model.encode(text).tolist()
+        embeddings = _encode(texts)
         # Update dimension if not set
         global _embedding_dimension
         if _embedding_dimension is None:
-            _embedding_dimension = len(embedding)
-        return embedding
+            _embedding_dimension = len(embeddings[0])
+        return truncate_embeddings(embeddings, dimension)
     except Exception as e:
         print(f"Error generating embedding: {e}")
         # Return a dummy embedding with correct dimension
-        dim = get_embedding_dimension()
-        return [0.0] * dim
+        dim = dimension or get_native_dimension()
+        return [[0.0] * dim for _ in texts]
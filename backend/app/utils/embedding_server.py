@@ -0,0 +1,167 @@
+"""Shared embedding server for multi-worker deployments.
+
+Hosts the embedding model once and serves batched encode requests over a
+Unix socket, so N uvicorn workers share one copy of the model and the
+encoder no longer competes with request handling for each worker's GIL.
+
+Requests arriving within EMBEDDING_BATCH_WAIT_MS of each other are merged
+into a single encoder call of up to EMBEDDING_MAX_BATCH texts.
+
+    python -m app.utils.embedding_server          # then run the API with EMBEDDING_MODE=remote
+"""
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Optional
+
+
+class _Job:
+    __slots__ = ("texts", "done", "result", "error")
+
+    def __init__(self, texts: list[str]):
+        self.texts = texts
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[str] = None
+
+
+class EmbeddingServer:
+    """Accepts connections on a Unix socket and micro-batches their encode requests"""
+
+    def __init__(self, socket_path: str, authkey: str, max_batch: int = 32, max_wait_ms: float = 5.0):
+        self.socket_path = socket_path
+        self.authkey = authkey.encode()
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._jobs: "queue.Queue[_Job]" = queue.Queue()
+        self._model = None
+        self.dimension: Optional[int] = None
+
+    def load(self):
+        from ..config import get_settings
+        from .embedding import load_embedding_model
+        settings = get_settings()
+        self._model = load_embedding_model(
+            backend=settings.embedding_backend,
+            precision=settings.embedding_precision,
+        )
+        self.dimension = len(self._model.encode("test"))
+        print(f"Embedding server: model loaded. Dimension: {self.dimension}")
+
+    def _next_batch(self) -> list[_Job]:
+        jobs = [self._jobs.get()]
+        size = len(jobs[0].texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self._jobs.get(timeout=remaining)
+            except queue.Empty:
+                break
+            jobs.append(job)
+            size += len(job.texts)
+        return jobs
+
+    def _batch_loop(self):
+        while True:
+            jobs = self._next_batch()
+            texts = [text for job in jobs for text in job.texts]
+            try:
+                vectors = self._model.encode(texts, batch_size=self.max_batch)
+                offset = 0
+                for job in jobs:
+                    job.result = vectors[offset:offset + len(job.texts)]
+                    offset += len(job.texts)
+            except Exception as e:
+                for job in jobs:
+                    job.error = str(e)
+            for job in jobs:
+                job.done.set()
+
+    def _handle(self, conn: Connection):
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                kind = message[0]
+                if kind == "dimension":
+                    conn.send(("ok", self.dimension))
+                elif kind == "encode":
+                    job = _Job(message[1])
+                    self._jobs.put(job)
+                    job.done.wait()
+                    conn.send(("error", job.error) if job.error else ("ok", job.result))
+                else:
+                    conn.send(("error", f"unknown request {kind!r}"))
+
+    def serve_forever(self):
+        if self._model is None:
+            self.load()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        threading.Thread(target=self._batch_loop, name="embedding-batcher", daemon=True).start()
+        with Listener(self.socket_path, family="AF_UNIX", authkey=self.authkey) as listener:
+            os.chmod(self.socket_path, 0o600)
+            print(f"Embedding server listening on {self.socket_path}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    print(f"Embedding server: rejected connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+
+class EmbeddingClient:
+    """Thread-safe client; keeps one socket connection per calling thread"""
+
+    def __init__(self, socket_path: str, authkey: str):
+        self.socket_path = socket_path
+        self.authkey = authkey.encode()
+        self._local = threading.local()
+
+    def _connection(self) -> Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.socket_path, family="AF_UNIX", authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def _request(self, message: tuple):
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send(message)
+                status, payload = conn.recv()
+                break
+            except (EOFError, OSError):
+                # Server restarted: drop the stale connection and retry once
+                self._local.conn = None
+                if attempt:
+                    raise
+        if status != "ok":
+            raise RuntimeError(f"Embedding server error: {payload}")
+        return payload
+
+    def encode(self, texts: list[str]) -> list[list[float]]:
+        return self._request(("encode", list(texts))).tolist()
+
+    def dimension(self) -> int:
+        return self._request(("dimension",))
+
+
+if __name__ == "__main__":
+    from ..config import get_settings
+    settings = get_settings()
+    EmbeddingServer(
+        settings.embedding_socket,
+        settings.embedding_authkey,
+        max_batch=settings.embedding_max_batch,
+        max_wait_ms=settings.embedding_batch_wait_ms,
+    ).serve_forever()
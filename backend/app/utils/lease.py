@@ -0,0 +1,102 @@
+"""Mongo-backed leases for background jobs.
+
+A lease is a `worker` / `lease_until` pair on a Mongo document (a reindex job,
+or a named entry in `leases`). Claiming it is one atomic update that only
+matches while it is free or expired, so with several worker processes
+exactly one runs the job. The holder renews it every `ttl / 3` seconds in the
+background; when a process dies its leases simply expire and another worker
+claims the job.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from .tracing import log_event
+
+# Identifies this process in lease documents
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaseLost(Exception):
+  """Another worker took over (our lease expired without being renewed)."""
+
+
+def free_filter() -> Dict[str, Any]:
+  """Matches documents whose lease is free, expired or already ours."""
+  return {"$or": [{"lease_until": None}, {"lease_until": {"$lt": datetime.utcnow()}}, {"worker": WORKER_ID}]}
+
+
+class Lease:
+  def __init__(self, collection: AsyncIOMotorCollection, ttl: float):
+    self.collection = collection
+    self.ttl = ttl
+    self.doc_id: Any = None
+    self.lost = False
+    self._heartbeat: Optional[asyncio.Task] = None
+
+  def _expiry(self) -> datetime:
+    return datetime.utcnow() + timedelta(seconds=self.ttl)
+
+  async def acquire(self, query: Dict[str, Any], update: Optional[Dict[str, Any]] = None, upsert: bool = False) -> Optional[Dict[str, Any]]:
+    """Claim the first document matching `query` whose lease is free; return it (updated) or None."""
+    try:
+      doc = await self.collection.find_one_and_update(
+        {**query, **free_filter()},
+        {"$set": {**(update or {}), "worker": WORKER_ID, "lease_until": self._expiry()}},
+        upsert=upsert,
+        return_document=ReturnDocument.AFTER,
+      )
+    except DuplicateKeyError:
+      # Upserting a named lease that another worker holds
+      return None
+    if doc is not None:
+      self.doc_id = doc["_id"]
+      self.lost = False
+      self._heartbeat = asyncio.create_task(self._renew_forever())
+    return doc
+
+  async def renew(self, update: Optional[Dict[str, Any]] = None) -> None:
+    """Extend the lease (optionally setting more fields); raises LeaseLost if it is no longer ours."""
+    result = await self.collection.update_one(
+      {"_id": self.doc_id, "worker": WORKER_ID},
+      {"$set": {**(update or {}), "lease_until": self._expiry()}},
+    )
+    if result.matched_count == 0:
+      self.lost = True
+      raise LeaseLost(f"Lease on {self.collection.name}/{self.doc_id} was taken over.")
+
+  def check(self) -> None:
+    if self.lost:
+      raise LeaseLost(f"Lease on {self.collection.name}/{self.doc_id} was taken over.")
+
+  async def _renew_forever(self) -> None:
+    while True:
+      await asyncio.sleep(self.ttl / 3)
+      try:
+        await self.renew()
+      except LeaseLost:
+        return
+      except Exception as e:
+        # Mongo hiccup: try again next round, the lease outlives a couple of misses
+        log_event("lease_renew_failed", level=logging.WARNING, collection=self.collection.name, error=str(e))
+
+  async def release(self, update: Optional[Dict[str, Any]] = None) -> None:
+    if self._heartbeat is not None:
+      self._heartbeat.cancel()
+      self._heartbeat = None
+    if self.doc_id is not None and not self.lost:
+      await self.collection.update_one(
+        {"_id": self.doc_id, "worker": WORKER_ID},
+        {"$set": {**(update or {}), "lease_until": None}},
+      )
+    # Releasing twice is a no-op
+    self.doc_id = None
@@ -0,0 +1,244 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from fastapi import Request
+from fastapi.responses import Response
+from prometheus_client import (
+  CONTENT_TYPE_LATEST,
+  CollectorRegistry,
+  Counter,
+  Gauge,
+  Histogram,
+  REGISTRY,
+  generate_latest,
+)
+from pymongo import monitoring
+from starlette.routing import Match
+
+from .tracing import TRACE_HEADER, log_event, new_trace_id
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+REQUEST_LATENCY = Histogram(
+  "sba_http_request_seconds",
+  "HTTP request latency",
+  ["method", "route", "status"],
+  buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+  "sba_http_requests_in_flight",
+  "HTTP requests currently being served",
+  ["route"],
+  multiprocess_mode="livesum",
+)
+EMBEDDING_LATENCY = Histogram(
+  "sba_embedding_seconds",
+  "Time spent encoding texts with the embedding model",
+  ["mode"],
+  buckets=LATENCY_BUCKETS,
+)
+EMBEDDING_BATCH_SIZE = Histogram(
+  "sba_embedding_batch_size",
+  "Number of texts per embedding call",
+  buckets=BATCH_BUCKETS,
+)
+QDRANT_LATENCY = Histogram(
+  "sba_qdrant_seconds",
+  "Qdrant operation latency",
+  ["operation", "collection"],
+  buckets=LATENCY_BUCKETS,
+)
+MONGO_LATENCY = Histogram(
+  "sba_mongo_seconds",
+  "MongoDB command latency",
+  ["operation", "collection"],
+  buckets=LATENCY_BUCKETS,
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+  "sba_llm_time_to_first_token_seconds",
+  "Time until the LLM produced its first token",
+  buckets=LATENCY_BUCKETS,
+)
+LLM_TOTAL_TIME = Histogram(
+  "sba_llm_seconds",
+  "Total LLM generation time",
+  buckets=LATENCY_BUCKETS,
+)
+PROMPT_TOKENS = Histogram(
+  "sba_llm_prompt_tokens",
+  "Prompt size in tokens",
+  buckets=TOKEN_BUCKETS,
+)
+OCR_PAGE_SECONDS = Histogram(
+  "sba_ocr_page_seconds",
+  "Time to extract one page, by engine (text_layer when no OCR was needed)",
+  ["engine"],
+  buckets=LATENCY_BUCKETS,
+)
+ADMISSION_ACTIVE = Gauge(
+  "sba_admission_active",
+  "Requests holding an admission slot",
+  ["pool"],
+  multiprocess_mode="livesum",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+  "sba_admission_queue_depth",
+  "Requests waiting for an admission slot",
+  ["pool"],
+  multiprocess_mode="livesum",
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+  "sba_admission_wait_seconds",
+  "Time spent waiting for an admission slot",
+  ["pool"],
+  buckets=LATENCY_BUCKETS,
+)
+ADMISSION_REJECTED = Counter(
+  "sba_admission_rejected_total",
+  "Requests rejected by admission control",
+  ["pool", "reason"],
+)
+RAG_COALESCED = Counter(
+  "sba_rag_coalesced_total",
+  "RAG queries by role: leaders computed an answer, followers joined an identical in-flight query",
+  ["role"],
+)
+CHAT_VECTORS_PRUNED = Counter(
+  "sba_chat_vectors_pruned_total",
+  "chat_messages vectors deleted by the retention job",
+  ["reason"],
+)
+DEADLINE_DEGRADATIONS = Counter(
+  "sba_deadline_degradations_total",
+  "Request stages that degraded (deadline budget exhausted or dependency unavailable), by stage and action taken",
+  ["stage", "action"],
+)
+BREAKER_STATE = Gauge(
+  "sba_circuit_breaker_state",
+  "Circuit breaker state per dependency: 0 closed, 1 half-open, 2 open",
+  ["dependency"],
+  multiprocess_mode="max",
+)
+BREAKER_TRANSITIONS = Counter(
+  "sba_circuit_breaker_transitions_total",
+  "Circuit breaker state changes, by the state entered",
+  ["dependency", "state"],
+)
+BREAKER_REJECTED = Counter(
+  "sba_circuit_breaker_rejected_total",
+  "Calls refused immediately because the dependency's circuit was open",
+  ["dependency"],
+)
+PROFILER_OVERHEAD = Gauge(
+  "sba_profiler_overhead_ratio",
+  "Share of wall time the continuous profiler spends sampling stacks",
+  multiprocess_mode="max",
+)
+CACHE_REQUESTS = Counter(
+  "sba_cache_requests_total",
+  "Cache lookups by cache and result (hit/miss); hit ratio = hit / (hit + miss)",
+  ["cache", "result"],
+)
+
+# Commands issued by the driver itself rather than by our queries.
+_IGNORED_MONGO_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions", "buildInfo"}
+
+
+@contextmanager
+def timed(histogram: Histogram, stage: str, **labels: str) -> Iterator[None]:
+  """Observe the duration of the enclosed block and log it as a trace stage."""
+  start = time.perf_counter()
+  outcome = "ok"
+  try:
+    yield
+  except BaseException:
+    outcome = "error"
+    raise
+  finally:
+    elapsed = time.perf_counter() - start
+    (histogram.labels(**labels) if labels else histogram).observe(elapsed)
+    log_event(stage, duration_ms=round(elapsed * 1000, 2), outcome=outcome, **labels)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+  CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+  """Feeds per-collection command latency from the driver into MONGO_LATENCY."""
+
+  def __init__(self):
+    self._pending: dict[tuple, str] = {}
+
+  def started(self, event):
+    if event.command_name in _IGNORED_MONGO_COMMANDS:
+      return
+    target = event.command.get(event.command_name)
+    if not isinstance(target, str):
+      # getMore carries the cursor id under its name and the collection separately
+      target = event.command.get("collection", "unknown")
+    self._pending[(event.connection_id, event.request_id)] = target
+
+  def succeeded(self, event):
+    self._finish(event)
+
+  def failed(self, event):
+    self._finish(event)
+
+  def _finish(self, event):
+    collection = self._pending.pop((event.connection_id, event.request_id), None)
+    if collection is None:
+      return
+    MONGO_LATENCY.labels(operation=event.command_name, collection=collection).observe(
+      event.duration_micros / 1_000_000
+    )
+
+
+def _route_label(request: Request) -> str:
+  """Use the route template (e.g. /integrations/{provider}/sync) to keep label cardinality bounded."""
+  for route in request.app.router.routes:
+    match, _ = route.matches(request.scope)
+    if match == Match.FULL:
+      return getattr(route, "path", "unmatched")
+  return "unmatched"
+
+
+async def metrics_middleware(request: Request, call_next):
+  trace_id = new_trace_id(request.headers.get(TRACE_HEADER))
+  route = _route_label(request)
+  in_flight = REQUESTS_IN_FLIGHT.labels(route=route)
+  in_flight.inc()
+  start = time.perf_counter()
+  status_code = 500
+  try:
+    response = await call_next(request)
+    status_code = response.status_code
+    response.headers[TRACE_HEADER] = trace_id
+    return response
+  finally:
+    elapsed = time.perf_counter() - start
+    in_flight.dec()
+    REQUEST_LATENCY.labels(method=request.method, route=route, status=str(status_code)).observe(elapsed)
+    log_event(
+      "http_request",
+      method=request.method,
+      route=route,
+      status=status_code,
+      duration_ms=round(elapsed * 1000, 2),
+    )
+
+
+def metrics_response() -> Response:
+  """Render the registry; aggregates across uvicorn workers when PROMETHEUS_MULTIPROC_DIR is set."""
+  if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+  else:
+    registry = REGISTRY
+  return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,105 @@
+"""Incremental multipart/form-data reader.
+
+Starlette's form parsing copies every uploaded file into a temporary file
+before the handler runs. This reader feeds the raw request stream through
+python-multipart and hands file bytes to a sink as they arrive, so the
+handler can write them to their final destination in one pass.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Protocol
+
+from fastapi import HTTPException, Request, status
+
+try:
+  from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+  from multipart.multipart import MultipartParser, parse_options_header
+
+MAX_FIELD_SIZE = 64 * 1024
+
+
+class FileSink(Protocol):
+  async def write(self, data: bytes) -> None: ...
+
+
+async def read_multipart(
+  request: Request,
+  open_file: Callable[[str, str, Optional[str]], Awaitable[FileSink]],
+) -> Dict[str, str]:
+  """Parse the request body; returns the text fields.
+
+  `open_file(field_name, filename, content_type)` is awaited when a file part
+  starts and must return a sink whose `write` receives the file bytes in order.
+  """
+  content_type, params = parse_options_header(request.headers.get("content-type", ""))
+  if content_type != b"multipart/form-data" or b"boundary" not in params:
+    raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Expected multipart/form-data.")
+
+  # python-multipart callbacks are synchronous; they only queue events, which
+  # are then processed (and awaited) after each network chunk.
+  events: List[tuple] = []
+  header_field = bytearray()
+  header_value = bytearray()
+
+  def on_header_field(data: bytes, start: int, end: int) -> None:
+    header_field.extend(data[start:end])
+
+  def on_header_value(data: bytes, start: int, end: int) -> None:
+    header_value.extend(data[start:end])
+
+  def on_header_end() -> None:
+    events.append(("header", bytes(header_field).lower(), bytes(header_value)))
+    header_field.clear()
+    header_value.clear()
+
+  parser = MultipartParser(
+    params[b"boundary"],
+    {
+      "on_part_begin": lambda: events.append(("begin",)),
+      "on_part_data": lambda data, start, end: events.append(("data", bytes(data[start:end]))),
+      "on_part_end": lambda: events.append(("end",)),
+      "on_header_field": on_header_field,
+      "on_header_value": on_header_value,
+      "on_header_end": on_header_end,
+      "on_headers_finished": lambda: events.append(("headers_done",)),
+    },
+  )
+
+  fields: Dict[str, str] = {}
+  part: Dict[str, Any] = {}
+
+  async def process() -> None:
+    nonlocal part
+    for event in events:
+      kind = event[0]
+      if kind == "begin":
+        part = {"headers": {}, "sink": None, "value": bytearray()}
+      elif kind == "header":
+        part["headers"][event[1]] = event[2]
+      elif kind == "headers_done":
+        _, options = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        part["name"] = options.get(b"name", b"").decode()
+        if b"filename" in options:
+          part_type = part["headers"].get(b"content-type")
+          part["sink"] = await open_file(
+            part["name"],
+            options[b"filename"].decode(errors="replace"),
+            part_type.decode() if part_type else None,
+          )
+      elif kind == "data":
+        if part["sink"] is not None:
+          await part["sink"].write(event[1])
+        else:
+          part["value"].extend(event[1])
+          if len(part["value"]) > MAX_FIELD_SIZE:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Field '{part['name']}' is too large.")
+      elif kind == "end" and part.get("sink") is None:
+        fields[part["name"]] = part["value"].decode(errors="replace")
+    events.clear()
+
+  async for chunk in request.stream():
+    parser.write(chunk)
+    await process()
+  parser.finalize()
+  await process()
+  return fields
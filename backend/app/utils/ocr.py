@@ -0,0 +1,113 @@
+"""OCR engines and the per-page work that runs inside the OCR process pool.
+
+Kept free of application imports so pool workers start quickly and do not
+open database connections.
+"""
+
+import io
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple, Type
+
+# Pages whose embedded text layer has at least this many characters skip OCR
+TEXT_LAYER_MIN_CHARS = 32
+
+
+class OCRBackend(ABC):
+  """Turns one rendered page image (PIL) into text."""
+
+  name = "base"
+
+  def __init__(self, language: str = "eng", api_url: Optional[str] = None, api_key: Optional[str] = None):
+    self.language = language
+    self.api_url = api_url
+    self.api_key = api_key
+
+  @abstractmethod
+  def image_to_text(self, image) -> str:
+    """Text of one page image."""
+
+
+class TesseractBackend(OCRBackend):
+  """Local engine: Tesseract through pytesseract (needs the `tesseract` binary)."""
+
+  name = "tesseract"
+
+  def image_to_text(self, image) -> str:
+    import pytesseract
+    return pytesseract.image_to_string(image, lang=self.language)
+
+
+class HTTPBackend(OCRBackend):
+  """Remote engine: POSTs the page as PNG to OCR_API_URL and reads `text` from the JSON reply."""
+
+  name = "http"
+
+  def image_to_text(self, image) -> str:
+    import requests
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+    response = requests.post(
+      self.api_url,
+      files={"file": ("page.png", buffer.getvalue(), "image/png")},
+      headers=headers,
+      timeout=120,
+    )
+    response.raise_for_status()
+    return response.json().get("text", "")
+
+
+BACKENDS: Dict[str, Type[OCRBackend]] = {
+  TesseractBackend.name: TesseractBackend,
+  HTTPBackend.name: HTTPBackend,
+}
+
+_backend_cache: Dict[tuple, OCRBackend] = {}
+
+
+def _backend(config: dict) -> OCRBackend:
+  key = tuple(sorted(config.items()))
+  if key not in _backend_cache:
+    options = dict(config)
+    _backend_cache[key] = BACKENDS[options.pop("name")](**options)
+  return _backend_cache[key]
+
+
+def count_pdf_pages(path: str) -> int:
+  import pypdfium2 as pdfium
+  pdf = pdfium.PdfDocument(path)
+  try:
+    return len(pdf)
+  finally:
+    pdf.close()
+
+
+def ocr_pdf_page(path: str, page_index: int, backend: dict, dpi: int = 200) -> Tuple[int, str, bool, float]:
+  """Pool worker: return (page_index, text, used_ocr, seconds) for one PDF page.
+
+  The worker opens the file itself so only the path crosses the process boundary.
+  """
+  import pypdfium2 as pdfium
+  start = time.perf_counter()
+  pdf = pdfium.PdfDocument(path)
+  try:
+    page = pdf[page_index]
+    text = page.get_textpage().get_text_range()
+    used_ocr = False
+    if len(text.strip()) < TEXT_LAYER_MIN_CHARS:
+      image = page.render(scale=dpi / 72).to_pil()
+      text = _backend(backend).image_to_text(image)
+      used_ocr = True
+  finally:
+    pdf.close()
+  return page_index, text, used_ocr, time.perf_counter() - start
+
+
+def ocr_image(path: str, backend: dict) -> Tuple[int, str, bool, float]:
+  """Pool worker: OCR a standalone image file as a single page."""
+  from PIL import Image
+  start = time.perf_counter()
+  with Image.open(path) as image:
+    text = _backend(backend).image_to_text(image)
+  return 0, text, True, time.perf_counter() - start
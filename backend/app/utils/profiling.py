@@ -0,0 +1,257 @@
+"""On-demand and continuous profiling.
+
+Per request: an admin (`X-Admin-Token: $ADMIN_TOKEN`) adds `X-Profile: sample`
+(or `?profile=sample`) to run that request under a stack sampler, or
+`cprofile` for deterministic pstats of the event-loop thread. The artifact
+is stored under `PROFILE_DIR` and its id returned in `X-Profile-Id`; fetch it
+from `GET /debug/profiles/{id}`. Sampled profiles are folded stacks
+("thread;outer;...;inner count" lines) that flamegraph.pl, speedscope or
+inferno render directly.
+
+The sampler sees the whole process, so other requests running at the same
+time show up too; the number in flight is logged with the profile. For a
+clean picture replay the slow query on a quiet instance. Profiling stops
+once the response starts, so a streamed body is not covered.
+
+Continuous: with `PROFILE_CONTINUOUS_HZ` > 0 a background thread samples
+every thread at that rate and aggregates hot stacks across requests
+(`GET /debug/profile/continuous`). It backs off so sampling never takes
+more than `PROFILE_MAX_OVERHEAD` of wall time.
+"""
+
+import cProfile
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from ..config import get_settings
+from .metrics import PROFILER_OVERHEAD
+from .security import is_admin
+from .tracing import log_event
+
+PROFILE_HEADER = "X-Profile"
+ADMIN_HEADER = "X-Admin-Token"
+MODES = ("sample", "cprofile")
+MAX_STACKS = 20_000  # distinct stacks kept by the continuous profiler
+
+# Python-level leaf frames of a thread that is blocked waiting for work or I/O
+_IDLE_LEAVES = {("selectors.py", "select"), ("threading.py", "wait"), ("thread.py", "_worker"), ("queue.py", "get")}
+
+_in_flight = 0
+_cprofile_active = False
+
+
+def _frame_label(frame) -> str:
+  code = frame.f_code
+  return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _fold(thread_name: str, frame) -> str:
+  leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+  if leaf in _IDLE_LEAVES:
+    return f"{thread_name};[idle]"
+  labels = []
+  while frame is not None:
+    labels.append(_frame_label(frame))
+    frame = frame.f_back
+  labels.append(thread_name)
+  return ";".join(reversed(labels))
+
+
+class StackSampler:
+  """Samples the Python stack of every other thread at a fixed interval into folded-stack counts."""
+
+  def __init__(self, interval: float, max_stacks: Optional[int] = None, max_overhead: Optional[float] = None):
+    self.interval = interval
+    self.max_stacks = max_stacks
+    self.max_overhead = max_overhead
+    self.stacks: Counter = Counter()
+    self.samples = 0
+    self._sampling_seconds = 0.0
+    self._started = 0.0
+    self._stop = threading.Event()
+    self._lock = threading.Lock()
+    self._thread: Optional[threading.Thread] = None
+
+  def start(self) -> "StackSampler":
+    self._started = time.perf_counter()
+    self._thread = threading.Thread(target=self._run, name="sba-profiler", daemon=True)
+    self._thread.start()
+    return self
+
+  def stop(self) -> None:
+    self._stop.set()
+    if self._thread is not None:
+      self._thread.join()
+
+  @property
+  def overhead(self) -> float:
+    """Share of wall time spent sampling (the sampler holds the GIL while it walks stacks)."""
+    elapsed = time.perf_counter() - self._started
+    return self._sampling_seconds / elapsed if elapsed > 0 else 0.0
+
+  def _sample(self) -> None:
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    with self._lock:
+      for ident, frame in sys._current_frames().items():
+        if ident == me:
+          continue
+        stack = _fold(names.get(ident, str(ident)), frame)
+        if self.max_stacks and stack not in self.stacks and len(self.stacks) >= self.max_stacks:
+          stack = "[truncated]"
+        self.stacks[stack] += 1
+      self.samples += 1
+
+  def _run(self) -> None:
+    interval = self.interval
+    while not self._stop.wait(interval):
+      start = time.perf_counter()
+      self._sample()
+      cost = time.perf_counter() - start
+      self._sampling_seconds += cost
+      if self.max_overhead:
+        # Back off when walking the stacks gets expensive (many threads, deep stacks)
+        interval = max(self.interval, cost / self.max_overhead)
+        PROFILER_OVERHEAD.set(self.overhead)
+
+  def folded(self, reset: bool = False) -> str:
+    with self._lock:
+      lines = [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+      if reset:
+        self.stacks.clear()
+        self.samples = 0
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def profile_dir() -> str:
+  path = get_settings().profile_dir or os.path.join(tempfile.gettempdir(), "sba-profiles")
+  os.makedirs(path, exist_ok=True)
+  return path
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+  """Stored artifact for `profile_id`, or None (ids are generated here, anything else is rejected)."""
+  name = os.path.basename(profile_id)
+  if name != profile_id:
+    return None
+  path = os.path.join(profile_dir(), name)
+  return path if os.path.isfile(path) else None
+
+
+def _store(suffix: str, write) -> str:
+  directory = profile_dir()
+  profile_id = f"{uuid.uuid4().hex}.{suffix}"
+  write(os.path.join(directory, profile_id))
+  # Keep only the newest PROFILE_KEEP artifacts
+  files = sorted((os.path.join(directory, f) for f in os.listdir(directory)), key=os.path.getmtime, reverse=True)
+  for old in files[get_settings().profile_keep:]:
+    try:
+      os.remove(old)
+    except OSError:
+      pass
+  return profile_id
+
+
+def _write_text(text: str):
+  def write(path: str) -> None:
+    with open(path, "w") as f:
+      f.write(text)
+  return write
+
+
+async def profiling_middleware(request: Request, call_next):
+  global _in_flight, _cprofile_active
+  mode = request.headers.get(PROFILE_HEADER) or request.query_params.get("profile")
+  if not mode:
+    _in_flight += 1
+    try:
+      return await call_next(request)
+    finally:
+      _in_flight -= 1
+
+  if not is_admin(request.headers.get(ADMIN_HEADER)):
+    return JSONResponse({"detail": "Profiling requires a valid admin token."}, status_code=403)
+  if mode not in MODES:
+    return JSONResponse({"detail": f"Unknown profile mode '{mode}' (expected {', '.join(MODES)})."}, status_code=400)
+  if mode == "cprofile" and _cprofile_active:
+    # Only one deterministic profiler can be attached to the loop thread at a time
+    return JSONResponse({"detail": "Another cprofile request is running, retry shortly."}, status_code=409)
+
+  settings = get_settings()
+  concurrent = _in_flight
+  _in_flight += 1
+  start = time.perf_counter()
+  if mode == "cprofile":
+    _cprofile_active = True
+    profiler = cProfile.Profile()
+    profiler.enable()
+  else:
+    sampler = StackSampler(settings.profile_interval_ms / 1000).start()
+  try:
+    response = await call_next(request)
+  finally:
+    _in_flight -= 1
+    if mode == "cprofile":
+      profiler.disable()
+      _cprofile_active = False
+    else:
+      sampler.stop()
+  elapsed = time.perf_counter() - start
+
+  if mode == "cprofile":
+    profile_id = _store("pstats", profiler.dump_stats)
+    samples = None
+  else:
+    profile_id = _store("folded", _write_text(sampler.folded()))
+    samples = sampler.samples
+  response.headers["X-Profile-Id"] = profile_id
+  log_event(
+    "profile_captured",
+    profile_id=profile_id,
+    mode=mode,
+    path=request.url.path,
+    duration_ms=round(elapsed * 1000, 2),
+    samples=samples,
+    concurrent_requests=concurrent,
+  )
+  return response
+
+
+_continuous: Optional[StackSampler] = None
+
+
+def start_continuous() -> None:
+  """Start the always-on sampler if PROFILE_CONTINUOUS_HZ is set (no-op otherwise or if running)."""
+  global _continuous
+  settings = get_settings()
+  if settings.profile_continuous_hz <= 0 or _continuous is not None:
+    return
+  _continuous = StackSampler(
+    1 / settings.profile_continuous_hz,
+    max_stacks=MAX_STACKS,
+    max_overhead=settings.profile_max_overhead,
+  ).start()
+  log_event("continuous_profiler_started", hz=settings.profile_continuous_hz, max_overhead=settings.profile_max_overhead)
+
+
+def stop_continuous() -> None:
+  global _continuous
+  if _continuous is not None:
+    _continuous.stop()
+    _continuous = None
+
+
+def continuous_profile(reset: bool = False) -> Optional[Dict[str, object]]:
+  if _continuous is None:
+    return None
+  samples = _continuous.samples
+  return {"samples": samples, "overhead": round(_continuous.overhead, 5), "folded": _continuous.folded(reset=reset)}
@@ -0,0 +1,120 @@
+"""Incremental CSV / NDJSON decoding.
+
+Bytes are fed in arbitrary network-sized chunks and complete rows come out
+as dicts, so an upload can be validated and written while it is still
+arriving instead of being buffered whole.
+"""
+
+import codecs
+import csv
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# (row number, parsed row or None, error message or None); row numbers are 1-based data rows
+Row = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+MAX_RECORD_SIZE = 64 * 1024
+
+
+def detect_format(content_type: Optional[str], filename: Optional[str] = None) -> Optional[str]:
+  content_type = (content_type or "").split(";")[0].strip().lower()
+  name = (filename or "").lower()
+  if content_type in ("text/csv", "application/csv") or name.endswith(".csv"):
+    return "csv"
+  if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl") or name.endswith((".ndjson", ".jsonl")):
+    return "ndjson"
+  return None
+
+
+def _quote_state(record: str) -> Tuple[bool, bool]:
+  """(inside a quoted field at the end, stray quote found) for a CSV record.
+
+  A quote only opens a field when it is the field's first character; inside a
+  quoted field `""` is an escaped quote. A quote anywhere else is stray.
+  """
+  in_quotes, field_start, i = False, True, 0
+  while i < len(record):
+    c = record[i]
+    if in_quotes:
+      if c == '"':
+        if record[i + 1:i + 2] == '"':
+          i += 1
+        else:
+          in_quotes = False
+    elif c == '"':
+      if not field_start:
+        return False, True
+      in_quotes = True
+    field_start = not in_quotes and c in ",\n"
+    i += 1
+  return in_quotes, False
+
+
+class RowDecoder:
+  def __init__(self, fmt: str):
+    if fmt not in ("csv", "ndjson"):
+      raise ValueError(f"Unsupported row format '{fmt}'")
+    self.format = fmt
+    self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    self._buffer = ""
+    self._record = ""  # CSV record spanning several lines (quoted newline)
+    self._header: Optional[List[str]] = None
+    self._row = 0
+
+  def feed(self, data: bytes) -> List[Row]:
+    self._buffer += self._decoder.decode(data)
+    lines = self._buffer.split("\n")
+    self._buffer = lines.pop()
+    if len(self._buffer) > MAX_RECORD_SIZE:
+      raise ValueError(f"Row {self._row + 1} is longer than {MAX_RECORD_SIZE} bytes")
+    return [row for line in lines for row in self._line(line)]
+
+  def close(self) -> List[Row]:
+    tail = self._buffer + self._decoder.decode(b"", final=True)
+    self._buffer = ""
+    rows = self._line(tail) if tail else []
+    if self._record:
+      self._row += 1
+      rows.append((self._row, None, "Unterminated quoted field"))
+      self._record = ""
+    return rows
+
+  def _line(self, line: str) -> List[Row]:
+    line = line.rstrip("\r")
+    if self.format == "ndjson":
+      if not line.strip():
+        return []
+      self._row += 1
+      try:
+        value = json.loads(line)
+      except ValueError as e:
+        return [(self._row, None, f"Invalid JSON: {e}")]
+      if not isinstance(value, dict):
+        return [(self._row, None, "Expected a JSON object")]
+      return [(self._row, value, None)]
+
+    # CSV: a record continues onto the next line only inside a quoted field
+    self._record = f"{self._record}\n{line}" if self._record else line
+    in_quotes, stray = _quote_state(self._record)
+    if in_quotes:
+      if len(self._record) <= MAX_RECORD_SIZE:
+        return []
+      # Never closed: give up on this record and resync at the next line
+      self._record = ""
+      self._row += 1
+      return [(self._row, None, f"Unterminated quoted field (record longer than {MAX_RECORD_SIZE} bytes)")]
+    record, self._record = self._record, ""
+    if not record.strip():
+      return []
+    if stray and self._header is not None:
+      # e.g. O"Brien: the row is rejected on its own, the next line starts a fresh record
+      self._row += 1
+      return [(self._row, None, 'Quote inside an unquoted field (quote the field and double the quote: "O""Brien")')]
+    values = next(csv.reader([record]))
+    if self._header is None:
+      self._header = [name.strip() for name in values]
+      return []
+    self._row += 1
+    if len(values) != len(self._header):
+      return [(self._row, None, f"Expected {len(self._header)} columns, got {len(values)}")]
+    return [(self._row, dict(zip(self._header, values)), None)]
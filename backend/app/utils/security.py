@@ -1,5 +1,11 @@
+import hmac
+from typing import Optional
+
+from fastapi import Header, HTTPException, Request, status
 from passlib.context import CryptContext
 
+from ..config import get_settings
+
 # Use pbkdf2_sha256 instead of bcrypt to avoid the 72-byte limit issue
 # pbkdf2_sha256 is secure and doesn't have password length limitations
 # Support both pbkdf2_sha256 (new) and bcrypt_sha256/bcrypt (old) for backward compatibility
@@ -30,3 +36,26 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     print(f"Password verification error: {e}")
     return False
 
+
+def is_admin(token: Optional[str]) -> bool:
+  """Constant-time check of an X-Admin-Token value; always False while ADMIN_TOKEN is unset."""
+  admin_token = get_settings().admin_token
+  return bool(admin_token and token) and hmac.compare_digest(token.encode(), admin_token.encode())
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+  """Route dependency for operator-only endpoints: X-Admin-Token must match ADMIN_TOKEN."""
+  if not is_admin(x_admin_token):
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required.")
+
+
+def trusted_user_id(request: Request) -> Optional[str]:
+  """The caller's user id for searching private (user-scoped) data, or None.
+
+  There are no sessions: the id is the X-User-ID header, which any client can set.
+  It is only trusted when TRUST_USER_HEADER is on, i.e. the deployment puts a gateway
+  in front that authenticates the caller and sets (or strips) the header itself.
+  """
+  if not get_settings().trust_user_header:
+    return None
+  return request.headers.get("X-User-ID") or None
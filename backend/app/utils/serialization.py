@@ -0,0 +1,45 @@
+"""Fast JSON responses.
+
+`FastJSONResponse` encodes with orjson and is the app's default response
+class. Returning `trusted(...)` from an endpoint skips FastAPI's
+response_model round trip (dump to dict, validate again, jsonable_encoder,
+json.dumps); only use it for data the service built itself, e.g. with
+`Model.model_construct` from MongoDB documents and Qdrant hits. The endpoint
+keeps its response_model for the OpenAPI schema.
+"""
+
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+def _default(obj: Any) -> Any:
+  if isinstance(obj, BaseModel):
+    return obj.model_dump()
+  if isinstance(obj, ObjectId):
+    return str(obj)
+  # HttpUrl, Decimal, sets and anything else with a sensible str()
+  if isinstance(obj, (set, frozenset)):
+    return list(obj)
+  return str(obj)
+
+
+def dumps(content: Any) -> bytes:
+  return orjson.dumps(
+    content,
+    default=_default,
+    option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+  )
+
+
+class FastJSONResponse(JSONResponse):
+  def render(self, content: Any) -> bytes:
+    return dumps(content)
+
+
+def trusted(content: Any, status_code: int = 200, headers: dict | None = None) -> FastJSONResponse:
+  """Serialize models or plain data straight to JSON, without response_model validation."""
+  return FastJSONResponse(content, status_code=status_code, headers=headers)
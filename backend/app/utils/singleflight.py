@@ -0,0 +1,54 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, Type
+
+
+class SingleFlight:
+  """Collapse concurrent calls with the same key into one in-flight execution.
+
+  The first caller for a key runs `fn`; callers arriving while it runs await
+  the same future and get the same result (or exception). If the leader is
+  cancelled, or fails with one of the `private` exceptions (e.g. its own
+  admission was rejected), joiners do not inherit that: they retry, one of
+  them becoming the new leader.
+  """
+
+  def __init__(self):
+    self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+  def in_flight(self, key: Hashable) -> bool:
+    return key in self._inflight
+
+  async def do(
+    self,
+    key: Hashable,
+    fn: Callable[[], Awaitable[Any]],
+    private: Tuple[Type[BaseException], ...] = (),
+  ) -> tuple[Any, bool]:
+    """Return (result, shared) where `shared` is True for callers that joined an existing call."""
+    while (future := self._inflight.get(key)) is not None:
+      try:
+        # shield: one joiner being cancelled must not cancel the leader's work
+        return await asyncio.shield(future), True
+      except asyncio.CancelledError:
+        if not future.cancelled():
+          raise  # this caller was cancelled, not the leader
+      except private:
+        pass
+
+    future = asyncio.get_running_loop().create_future()
+    self._inflight[key] = future
+    try:
+      result = await fn()
+    except asyncio.CancelledError:
+      future.cancel()
+      raise
+    except BaseException as e:
+      future.set_exception(e)
+      # Mark retrieved so an exception nobody joined on is not logged as unhandled
+      future.exception()
+      raise
+    else:
+      future.set_result(result)
+      return result, False
+    finally:
+      self._inflight.pop(key, None)
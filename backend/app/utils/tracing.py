@@ -0,0 +1,37 @@
+import json
+import logging
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Optional
+
+TRACE_HEADER = "X-Request-ID"
+
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+
+logger = logging.getLogger("sba")
+if not logger.handlers:
+  _handler = logging.StreamHandler()
+  _handler.setFormatter(logging.Formatter("%(message)s"))
+  logger.addHandler(_handler)
+  logger.setLevel(logging.INFO)
+  logger.propagate = False
+
+
+def new_trace_id(incoming: Optional[str] = None) -> str:
+  """Bind a trace id to the current context, reusing the caller's id when provided."""
+  trace_id = (incoming or "").strip()[:64] or uuid.uuid4().hex
+  _trace_id.set(trace_id)
+  return trace_id
+
+
+def get_trace_id() -> Optional[str]:
+  return _trace_id.get()
+
+
+def log_event(event: str, level: int = logging.INFO, **fields: Any) -> None:
+  """Emit one structured (JSON) log line tagged with the current trace id."""
+  if not logger.isEnabledFor(level):
+    return
+  record = {"ts": round(time.time(), 3), "event": event, "trace_id": _trace_id.get(), **fields}
+  logger.log(level, json.dumps(record, default=str))
@@ -0,0 +1 @@
+"""Reproducible benchmarks for the backend (run from the backend directory)."""
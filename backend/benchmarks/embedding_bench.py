@@ -0,0 +1,168 @@
+"""Embedding throughput microbenchmark for `app.utils.embedding`.
+
+Measures vectors/second and per-batch latency of the embedding model across
+batch sizes, input lengths and torch thread counts for every available
+backend (torch, onnx, openvino) and precision. Each backend/precision pair
+runs in a fresh process so its peak RSS is attributable.
+
+  python -m benchmarks.embedding_bench --batch-sizes 1,8,32 --lengths 16,128,512 --threads 1,4 --output embed.json
+"""
+
+import argparse
+import importlib.util
+import json
+import multiprocessing as mp
+import platform
+import resource
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from .load_test import percentile
+
+# (backend, precision) pairs and the optional packages each one needs.
+CANDIDATES = [
+  ("torch", "float32", ["torch"]),
+  ("torch", "bfloat16", ["torch"]),
+  ("torch", "float16", ["torch"]),
+  ("onnx", "float32", ["onnxruntime", "optimum"]),
+  ("openvino", "float32", ["openvino", "optimum"]),
+]
+
+_WORDS = (
+  "policy employee document leave request payroll onboarding contract invoice meeting "
+  "quarterly report security access training vacation expense approval manager team"
+).split()
+
+
+def _peak_rss_mb() -> float:
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # Linux reports KiB, macOS reports bytes
+  return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def make_texts(count: int, words: int) -> List[str]:
+  """Deterministic inputs of roughly `words` tokens each."""
+  return [
+    " ".join(_WORDS[(i * 7 + j) % len(_WORDS)] for j in range(words))
+    for i in range(count)
+  ]
+
+
+def available_candidates(requested_backends: Optional[List[str]] = None) -> List[tuple]:
+  selected = []
+  for backend, precision, modules in CANDIDATES:
+    if requested_backends and backend not in requested_backends:
+      continue
+    if all(importlib.util.find_spec(m) is not None for m in modules):
+      selected.append((backend, precision))
+  return selected
+
+
+def _bench_candidate(backend: str, precision: str, args: Dict[str, Any]) -> Dict[str, Any]:
+  """Runs in a child process: load once, then sweep threads x lengths x batch sizes."""
+  import torch
+  from app.utils.embedding import load_embedding_model
+
+  rss_before = _peak_rss_mb()
+  start = time.perf_counter()
+  try:
+    model = load_embedding_model(args["model"], backend=backend, precision=precision, device="cpu")
+  except Exception as e:
+    return {"backend": backend, "precision": precision, "error": str(e)}
+  load_seconds = time.perf_counter() - start
+
+  runs = []
+  for threads in args["threads"]:
+    torch.set_num_threads(threads)
+    for length in args["lengths"]:
+      for batch_size in args["batch_sizes"]:
+        texts = make_texts(batch_size, length)
+        model.encode(texts, batch_size=batch_size)  # warm-up
+        latencies = []
+        for _ in range(args["repeats"]):
+          t0 = time.perf_counter()
+          model.encode(texts, batch_size=batch_size)
+          latencies.append(time.perf_counter() - t0)
+        latencies.sort()
+        total = sum(latencies)
+        runs.append({
+          "threads": threads,
+          "input_words": length,
+          "batch_size": batch_size,
+          "vectors_per_second": round(batch_size * len(latencies) / total, 2),
+          "batch_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+          "batch_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+          "per_vector_ms": round(total / (batch_size * len(latencies)) * 1000, 3),
+          "peak_rss_mb": _peak_rss_mb(),
+        })
+        print(
+          f"{backend:<8} {precision:<8} threads={threads:<2} words={length:<4} batch={batch_size:<4} "
+          f"{runs[-1]['vectors_per_second']:>9.1f} vec/s  p50={runs[-1]['batch_p50_ms']:.1f}ms",
+          flush=True,
+        )
+
+  return {
+    "backend": backend,
+    "precision": precision,
+    "load_seconds": round(load_seconds, 2),
+    "rss_before_load_mb": rss_before,
+    "peak_rss_mb": _peak_rss_mb(),
+    "runs": runs,
+  }
+
+
+def run(args) -> Dict[str, Any]:
+  params = {
+    "model": args.model,
+    "batch_sizes": args.batch_sizes,
+    "lengths": args.lengths,
+    "threads": args.threads,
+    "repeats": args.repeats,
+  }
+  ctx = mp.get_context("spawn")
+  results = []
+  for backend, precision in available_candidates(args.backends):
+    with ctx.Pool(1) as pool:
+      results.append(pool.apply(_bench_candidate, (backend, precision, params)))
+  return {
+    "meta": {
+      "timestamp": datetime.now(timezone.utc).isoformat(),
+      "python": platform.python_version(),
+      "machine": platform.machine(),
+      "processor": platform.processor(),
+      "cpu_count": mp.cpu_count(),
+      "config": params,
+    },
+    "results": results,
+  }
+
+
+def _int_list(value: str) -> List[int]:
+  return [int(v) for v in value.split(",")]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+  from app.utils.embedding import EMBEDDING_MODEL_NAME
+
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+  parser.add_argument("--batch-sizes", type=_int_list, default=[1, 4, 16, 32, 64])
+  parser.add_argument("--lengths", type=_int_list, default=[16, 64, 256, 512], help="input length in words")
+  parser.add_argument("--threads", type=_int_list, default=[1, 2, 4, mp.cpu_count()])
+  parser.add_argument("--backends", nargs="*", help="restrict to these backends (torch, onnx, openvino)")
+  parser.add_argument("--repeats", type=int, default=5)
+  parser.add_argument("--output", help="write the JSON report here")
+  args = parser.parse_args(argv)
+
+  report = run(args)
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump(report, f, indent=2)
+  else:
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+  main()
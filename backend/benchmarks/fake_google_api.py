@@ -0,0 +1,169 @@
+"""Local fake of the Gmail and Drive endpoints used by `app.services.sync_service`.
+
+  uvicorn benchmarks.fake_google_api:app --port 8765
+  GOOGLE_GMAIL_API_URL=http://localhost:8765/gmail/v1 GOOGLE_DRIVE_API_URL=http://localhost:8765/drive/v3 \
+  GOOGLE_TOKEN_URL=http://localhost:8765/token uvicorn app.main:app
+
+Environment knobs: FAKE_GOOGLE_MESSAGES / FAKE_GOOGLE_FILES (initial corpus
+size), FAKE_GOOGLE_LATENCY_MS (per-request delay) and
+FAKE_GOOGLE_RATE_LIMIT_EVERY (answer every Nth request with 429 to exercise
+backoff). Tokens minted by POST /token expire after FAKE_GOOGLE_TOKEN_TTL
+seconds so refreshes can be observed. POST /_admin/messages and /_admin/files add or remove data so
+incremental syncs have something to pick up.
+"""
+
+import asyncio
+import itertools
+import os
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+LATENCY = float(os.environ.get("FAKE_GOOGLE_LATENCY_MS", "0")) / 1000
+RATE_LIMIT_EVERY = int(os.environ.get("FAKE_GOOGLE_RATE_LIMIT_EVERY", "0"))
+TOKEN_TTL = int(os.environ.get("FAKE_GOOGLE_TOKEN_TTL", "3600"))
+
+app = FastAPI(title="Fake Google API")
+
+_requests = itertools.count(1)
+_tokens = itertools.count(1)
+refresh_calls = 0
+_history = itertools.count(1000)
+# message id -> (history id at which it was added, message)
+_messages: Dict[str, tuple] = {}
+# ordered change log for Drive: (change number, file id, file or None if removed)
+_drive_changes: List[tuple] = []
+_files: Dict[str, dict] = {}
+
+
+def _add_messages(count: int) -> None:
+  for _ in range(count):
+    history_id = next(_history)
+    message_id = f"msg{history_id:08d}"
+    _messages[message_id] = (history_id, {
+      "id": message_id,
+      "snippet": f"Snippet of message {message_id} about quarterly planning",
+      "payload": {"headers": [
+        {"name": "Subject", "value": f"Subject {message_id}"},
+        {"name": "From", "value": "sender@example.com"},
+        {"name": "Date", "value": "Mon, 1 Jan 2024 10:00:00 +0000"},
+      ]},
+    })
+
+
+def _add_files(count: int) -> None:
+  for _ in range(count):
+    change = len(_drive_changes) + 1
+    file_id = f"file{change:08d}"
+    _files[file_id] = {
+      "id": file_id,
+      "name": f"Document {file_id}.pdf",
+      "mimeType": "application/pdf",
+      "description": "Synthetic Drive file",
+      "modifiedTime": "2024-01-01T10:00:00Z",
+      "webViewLink": f"https://drive.example.com/{file_id}",
+      "trashed": False,
+    }
+    _drive_changes.append((change, file_id, _files[file_id]))
+
+
+_add_messages(int(os.environ.get("FAKE_GOOGLE_MESSAGES", "200")))
+_add_files(int(os.environ.get("FAKE_GOOGLE_FILES", "100")))
+
+
+@app.middleware("http")
+async def latency_and_rate_limit(request: Request, call_next):
+  if LATENCY:
+    await asyncio.sleep(LATENCY)
+  if RATE_LIMIT_EVERY and next(_requests) % RATE_LIMIT_EVERY == 0 and not request.url.path.startswith(("/_admin", "/token")):
+    return JSONResponse({"error": {"code": 429, "message": "rateLimitExceeded"}}, status_code=429, headers={"Retry-After": "0"})
+  return await call_next(request)
+
+
+def _page(items: list, page_token: Optional[str], size: int) -> tuple[list, Optional[str]]:
+  start = int(page_token or 0)
+  end = start + size
+  return items[start:end], (str(end) if end < len(items) else None)
+
+
+@app.post("/token")
+async def token(request: Request):
+  global refresh_calls
+  form = await request.form()
+  if form.get("grant_type") == "refresh_token":
+    refresh_calls += 1
+  return {"access_token": f"fake-access-{next(_tokens)}", "expires_in": TOKEN_TTL, "token_type": "Bearer"}
+
+
+@app.get("/_admin/stats")
+async def admin_stats():
+  return {"refresh_calls": refresh_calls, "messages": len(_messages), "files": len(_files)}
+
+
+@app.get("/gmail/v1/users/me/profile")
+async def gmail_profile():
+  return {"emailAddress": "fake@example.com", "historyId": str(max((h for h, _ in _messages.values()), default=1000))}
+
+
+@app.get("/gmail/v1/users/me/messages")
+async def gmail_list(maxResults: int = 100, pageToken: Optional[str] = None):
+  ids = sorted(_messages, reverse=True)
+  page, next_token = _page([{"id": i} for i in ids], pageToken, maxResults)
+  return {"messages": page, **({"nextPageToken": next_token} if next_token else {})}
+
+
+@app.get("/gmail/v1/users/me/messages/{message_id}")
+async def gmail_get(message_id: str):
+  if message_id not in _messages:
+    raise HTTPException(status_code=404)
+  return _messages[message_id][1]
+
+
+@app.get("/gmail/v1/users/me/history")
+async def gmail_history(startHistoryId: int, maxResults: int = 100, pageToken: Optional[str] = None):
+  added = sorted((h, m["id"]) for h, m in _messages.values() if h > startHistoryId)
+  records = [{"id": str(h), "messagesAdded": [{"message": {"id": i}}]} for h, i in added]
+  page, next_token = _page(records, pageToken, maxResults)
+  latest = max((h for h, _ in _messages.values()), default=startHistoryId)
+  return {"history": page, "historyId": str(latest), **({"nextPageToken": next_token} if next_token else {})}
+
+
+@app.get("/drive/v3/changes/startPageToken")
+async def drive_start_token():
+  return {"startPageToken": str(len(_drive_changes) + 1)}
+
+
+@app.get("/drive/v3/files")
+async def drive_files(pageSize: int = 100, pageToken: Optional[str] = None):
+  page, next_token = _page([f for f in _files.values() if not f["trashed"]], pageToken, pageSize)
+  return {"files": page, **({"nextPageToken": next_token} if next_token else {})}
+
+
+@app.get("/drive/v3/changes")
+async def drive_changes(pageToken: str, pageSize: int = 100):
+  start = int(pageToken)
+  pending = [c for c in _drive_changes if c[0] >= start]
+  page = pending[:pageSize]
+  changes = [
+    {"fileId": file_id, "removed": file is None, **({"file": file} if file else {})}
+    for _, file_id, file in page
+  ]
+  if len(pending) > pageSize:
+    return {"changes": changes, "nextPageToken": str(page[-1][0] + 1)}
+  return {"changes": changes, "newStartPageToken": str(len(_drive_changes) + 1)}
+
+
+@app.post("/_admin/messages")
+async def admin_add_messages(count: int = 10):
+  _add_messages(count)
+  return {"messages": len(_messages)}
+
+
+@app.post("/_admin/files")
+async def admin_add_files(count: int = 10, remove: int = 0):
+  _add_files(count)
+  for file_id in list(_files)[:remove]:
+    del _files[file_id]
+    _drive_changes.append((len(_drive_changes) + 1, file_id, None))
+  return {"files": len(_files)}
@@ -0,0 +1,193 @@
+"""End-to-end load test for `app.main:app` against local stand-ins.
+
+Boots the real ASGI app in-process (in-memory Qdrant, mongomock-motor or a
+local Mongo, fake embedding model and a fake LLM with configurable token
+latency) and drives the hot endpoints at fixed concurrency levels.
+
+  python -m benchmarks.load_test --concurrency 1,8,32 --requests 200 --output load.json
+  python -m benchmarks.load_test --compare load.json   # diff a new run against a baseline
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from . import standins
+
+BENCH_EMAIL = "loadtest@example.com"
+BENCH_PASSWORD = "loadtest-password"
+
+
+def _scenarios() -> Dict[str, Callable[[int], Dict[str, Any]]]:
+  """Endpoint name -> factory building the i-th request (method, url, json)."""
+  return {
+    "POST /auth/login": lambda i: {
+      "method": "POST", "url": "/auth/login", "json": {"email": BENCH_EMAIL, "password": BENCH_PASSWORD},
+    },
+    "POST /documents": lambda i: {
+      "method": "POST", "url": "/documents",
+      "json": {"title": f"Benchmark document {i}", "category": "benchmark", "filename": f"doc-{i}.pdf"},
+    },
+    "GET /documents": lambda i: {"method": "GET", "url": "/documents"},
+    "POST /rag/query": lambda i: {
+      "method": "POST", "url": "/rag/query", "json": {"query": f"What is the policy for topic {i % 50}?", "top_k": 8},
+    },
+    "POST /chat/messages": lambda i: {
+      "method": "POST", "url": "/chat/messages",
+      "json": {"content": f"Tell me about benchmark document {i % 50}", "user_id": f"user-{i % 16}"},
+    },
+  }
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+  if not sorted_values:
+    return 0.0
+  k = (len(sorted_values) - 1) * pct / 100
+  lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+  return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+async def _run_level(client, build: Callable[[int], Dict[str, Any]], concurrency: int, total: int) -> Dict[str, Any]:
+  counter = itertools.count()
+  latencies: List[float] = []
+  errors = 0
+
+  async def worker():
+    nonlocal errors
+    while (i := next(counter)) < total:
+      spec = build(i)
+      start = time.perf_counter()
+      try:
+        response = await client.request(spec["method"], spec["url"], json=spec.get("json"))
+        ok = response.status_code < 400
+      except Exception:
+        ok = False
+      latencies.append(time.perf_counter() - start)
+      if not ok:
+        errors += 1
+
+  start = time.perf_counter()
+  await asyncio.gather(*(worker() for _ in range(concurrency)))
+  elapsed = time.perf_counter() - start
+  latencies.sort()
+  return {
+    "concurrency": concurrency,
+    "requests": len(latencies),
+    "errors": errors,
+    "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+    "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+    "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+  }
+
+
+async def _seed(client, documents: int) -> None:
+  await client.post("/auth/signup", json={"full_name": "Load Test", "email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+  build = _scenarios()["POST /documents"]
+  for i in range(documents):
+    spec = build(i)
+    await client.post(spec["url"], json=spec["json"])
+
+
+async def run(args) -> Dict[str, Any]:
+  standins.install(
+    mongo_uri=None if args.mongo == "memory" else args.mongo,
+    embedding_dimension=args.embedding_dim,
+    embedding_latency_ms=args.embedding_latency_ms,
+    real_embeddings=args.real_embeddings,
+  )
+  import httpx
+  from app.main import app
+  from app.services import rag
+
+  rag.call_llm = standins.make_fake_llm(args.llm_first_token_ms, args.llm_token_ms, args.llm_tokens)
+
+  scenarios = _scenarios()
+  selected = [name for name in scenarios if not args.endpoints or name in args.endpoints]
+  results: Dict[str, List[Dict[str, Any]]] = {}
+
+  transport = httpx.ASGITransport(app=app)
+  async with app.router.lifespan_context(app):
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+      await _seed(client, args.seed_documents)
+      for name in selected:
+        results[name] = []
+        for concurrency in args.concurrency:
+          level = await _run_level(client, scenarios[name], concurrency, args.requests)
+          results[name].append(level)
+          print(
+            f"{name:<22} c={concurrency:<4} {level['throughput_rps']:>9.1f} req/s  "
+            f"p50={level['p50_ms']:.1f}ms p95={level['p95_ms']:.1f}ms p99={level['p99_ms']:.1f}ms "
+            f"errors={level['errors']}"
+          )
+
+  return {"meta": _meta(args), "results": results}
+
+
+def _meta(args) -> Dict[str, Any]:
+  try:
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+  except OSError:
+    commit = None
+  return {
+    "commit": commit,
+    "timestamp": datetime.now(timezone.utc).isoformat(),
+    "python": platform.python_version(),
+    "machine": platform.machine(),
+    "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+  }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+  """Print throughput and p95 deltas per endpoint/concurrency between two runs."""
+  for name, levels in current["results"].items():
+    base_levels = {lvl["concurrency"]: lvl for lvl in baseline.get("results", {}).get(name, [])}
+    for level in levels:
+      base = base_levels.get(level["concurrency"])
+      if not base:
+        continue
+      rps = (level["throughput_rps"] - base["throughput_rps"]) / base["throughput_rps"] * 100 if base["throughput_rps"] else 0.0
+      p95 = (level["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100 if base["p95_ms"] else 0.0
+      print(f"{name:<22} c={level['concurrency']:<4} throughput {rps:+6.1f}%  p95 {p95:+6.1f}%")
+
+
+def _parse_args(argv: Optional[List[str]] = None):
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--concurrency", type=lambda v: [int(x) for x in v.split(",")], default=[1, 8, 32])
+  parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and concurrency level")
+  parser.add_argument("--endpoints", nargs="*", help="subset of endpoints, e.g. 'POST /rag/query'")
+  parser.add_argument("--mongo", default="memory", help="'memory' for mongomock-motor or a mongodb:// URI")
+  parser.add_argument("--seed-documents", type=int, default=200)
+  parser.add_argument("--embedding-dim", type=int, default=standins.DEFAULT_DIMENSION)
+  parser.add_argument("--embedding-latency-ms", type=float, default=0.0)
+  parser.add_argument("--real-embeddings", action="store_true", help="load the real embedding model")
+  parser.add_argument("--llm-first-token-ms", type=float, default=200.0)
+  parser.add_argument("--llm-token-ms", type=float, default=20.0)
+  parser.add_argument("--llm-tokens", type=int, default=64)
+  parser.add_argument("--output", help="write the JSON report here")
+  parser.add_argument("--compare", help="baseline JSON report to diff against")
+  return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+  args = _parse_args(argv)
+  report = asyncio.run(run(args))
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump(report, f, indent=2)
+  else:
+    print(json.dumps(report, indent=2))
+  if args.compare:
+    with open(args.compare) as f:
+      compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,160 @@
+"""Recall / latency / memory report for Matryoshka-truncated embeddings.
+
+Embeds a corpus once at the model's full dimension, then for each output
+dimension truncates and re-normalizes the vectors (exactly as
+`app.utils.embedding.truncate_embeddings` does) and measures:
+
+- recall@k of the truncated search against the full-dimension top-k,
+- per-query search latency (brute force, or a real Qdrant with `--qdrant-url`),
+- vector memory (dimension x 4 bytes x corpus size) and query embedding time.
+
+The corpus is one text per line (`--corpus`); without it, synthetic text from
+`embedding_bench.make_texts` is used, which gives a rough latency/memory
+picture but not a meaningful recall number.
+
+  python -m benchmarks.matryoshka_bench --corpus chats.txt --dims 128,256,512,1024 --output matryoshka.json
+"""
+
+import argparse
+import json
+import platform
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .embedding_bench import make_texts
+from .load_test import percentile
+
+
+def _load_corpus(path: Optional[str], size: int) -> List[str]:
+  if not path:
+    return make_texts(size, 48)
+  with open(path) as f:
+    texts = [line.strip() for line in f if line.strip()]
+  return texts[:size]
+
+
+def _recall(truth: np.ndarray, found: np.ndarray) -> float:
+  k = truth.shape[1]
+  return float(np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)]))
+
+
+def _brute_force(corpus: np.ndarray, queries: np.ndarray, k: int):
+  latencies, found = [], []
+  for q in queries:
+    t0 = time.perf_counter()
+    scores = corpus @ q
+    top = np.argpartition(-scores, k)[:k]
+    found.append(top[np.argsort(-scores[top])])
+    latencies.append(time.perf_counter() - t0)
+  return np.array(found), latencies
+
+
+def _qdrant(url: str, corpus: np.ndarray, queries: np.ndarray, k: int):
+  from qdrant_client import QdrantClient
+  from qdrant_client.models import Distance, PointStruct, VectorParams
+
+  client = QdrantClient(location=":memory:") if url == ":memory:" else QdrantClient(url=url)
+  name = f"matryoshka_bench_{uuid.uuid4().hex[:8]}"
+  client.create_collection(name, vectors_config=VectorParams(size=corpus.shape[1], distance=Distance.COSINE))
+  try:
+    for start in range(0, len(corpus), 512):
+      batch = corpus[start:start + 512]
+      client.upsert(name, points=[PointStruct(id=start + i, vector=v.tolist()) for i, v in enumerate(batch)])
+    latencies, found = [], []
+    for q in queries:
+      t0 = time.perf_counter()
+      hits = client.search(name, query_vector=q.tolist(), limit=k, with_payload=False)
+      latencies.append(time.perf_counter() - t0)
+      found.append([h.id for h in hits])
+    return np.array(found), latencies
+  finally:
+    client.delete_collection(name)
+
+
+def run(args) -> Dict[str, Any]:
+  from app.utils.embedding import load_embedding_model, truncate_embeddings
+
+  model = load_embedding_model(args.model, device="cpu")
+  texts = _load_corpus(args.corpus, args.corpus_size)
+  # Queries are a deterministic sample of the corpus itself, so the full-dimension
+  # search always ranks the query's own document first.
+  query_texts = texts[::max(1, len(texts) // args.queries)][:args.queries]
+
+  full_corpus = np.asarray(model.encode(texts, batch_size=64, normalize_embeddings=True), dtype=np.float32)
+  t0 = time.perf_counter()
+  full_queries = np.asarray(model.encode(query_texts, batch_size=64, normalize_embeddings=True), dtype=np.float32)
+  embed_seconds = time.perf_counter() - t0
+  truth, _ = _brute_force(full_corpus, full_queries, args.k)
+
+  results = []
+  for dim in args.dims:
+    corpus = np.asarray(truncate_embeddings(full_corpus.tolist(), dim), dtype=np.float32)
+    queries = np.asarray(truncate_embeddings(full_queries.tolist(), dim), dtype=np.float32)
+    if args.qdrant_url:
+      found, latencies = _qdrant(args.qdrant_url, corpus, queries, args.k)
+    else:
+      found, latencies = _brute_force(corpus, queries, args.k)
+    latencies.sort()
+    results.append({
+      "dimension": dim,
+      f"recall_at_{args.k}": round(_recall(truth, found), 4),
+      "search_p50_ms": round(percentile(latencies, 50) * 1000, 3),
+      "search_p99_ms": round(percentile(latencies, 99) * 1000, 3),
+      "vector_memory_mb": round(corpus.nbytes / (1024 * 1024), 2),
+      "bytes_per_vector": dim * 4,
+    })
+    print(
+      f"dim={dim:<5} recall@{args.k}={results[-1][f'recall_at_{args.k}']:.3f}  "
+      f"p50={results[-1]['search_p50_ms']:.2f}ms  memory={results[-1]['vector_memory_mb']}MB",
+      flush=True,
+    )
+
+  return {
+    "meta": {
+      "timestamp": datetime.now(timezone.utc).isoformat(),
+      "python": platform.python_version(),
+      "machine": platform.machine(),
+      "model": args.model,
+      "native_dimension": int(full_corpus.shape[1]),
+      "corpus_size": len(texts),
+      "queries": len(query_texts),
+      "k": args.k,
+      "search": args.qdrant_url or "brute-force",
+      "query_embedding_ms": round(embed_seconds / len(query_texts) * 1000, 2),
+    },
+    "results": results,
+  }
+
+
+def _int_list(value: str) -> List[int]:
+  return [int(v) for v in value.split(",")]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+  from app.utils.embedding import EMBEDDING_MODEL_NAME
+
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+  parser.add_argument("--corpus", help="text file, one document per line")
+  parser.add_argument("--corpus-size", type=int, default=5000)
+  parser.add_argument("--queries", type=int, default=200)
+  parser.add_argument("--dims", type=_int_list, default=[128, 256, 512, 1024])
+  parser.add_argument("-k", type=int, default=10)
+  parser.add_argument("--qdrant-url", help="search through Qdrant (URL or :memory:) instead of brute force")
+  parser.add_argument("--output", help="write the JSON report here")
+  args = parser.parse_args(argv)
+
+  report = run(args)
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump(report, f, indent=2)
+  else:
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+  main()
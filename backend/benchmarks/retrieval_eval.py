@@ -0,0 +1,300 @@
+"""Retrieval quality vs. latency evaluation.
+
+Indexes a labeled corpus and runs its queries through
+`app.services.rag.search_multiple_collections` under a grid of retrieval
+configurations. For each one it reports recall@k, MRR and nDCG@k next to
+p50/p99 query latency and vector memory, and marks the configurations on
+the Pareto frontier (no other one is at least as good on recall, p99 and
+memory and strictly better on one).
+
+The dataset is one JSON file:
+
+  {
+    "corpus": [{"id": "doc-1", "text": "...", "collection": "documents"}, ...],
+    "queries": [{"query": "...", "relevant": ["doc-1"]},
+                {"query": "...", "relevant": {"doc-2": 2, "doc-7": 1}}]   # graded relevance
+  }
+
+Corpus entries in "documents" (the default) are split with
+`document_service.chunk_text` and indexed as `document_chunks`, like
+uploaded files; other collections are indexed whole. A hit counts for the
+corpus id it came from, and several chunks of one document count once.
+
+Everything runs offline against in-memory Qdrant. The in-memory engine
+always searches exhaustively, so `--ef` and `--quantization` only change
+results against a real server: pass `--qdrant-url` pointing at a scratch
+instance (its collections are dropped between configurations).
+
+  python -m benchmarks.retrieval_eval --dataset eval.json --dims 256,1024 --chunk-sizes 600,1200 -k 5
+  python -m benchmarks.retrieval_eval --dataset eval.json --qdrant-url http://localhost:6333 \\
+      --ef 16,64,256 --quantization none,int8,binary --output eval.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import platform
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from . import standins
+from .embedding_bench import _peak_rss_mb
+from .load_test import percentile
+
+# Bytes per vector dimension for each quantization mode (vectors only, excludes the HNSW graph)
+BYTES_PER_DIMENSION = {"none": 4.0, "int8": 1.0, "binary": 1 / 8}
+
+
+def _load_dataset(path: str) -> Dict[str, Any]:
+  with open(path) as f:
+    dataset = json.load(f)
+  for query in dataset["queries"]:
+    relevant = query["relevant"]
+    query["relevant"] = {doc_id: 1 for doc_id in relevant} if isinstance(relevant, list) else relevant
+  return dataset
+
+
+def recall_at_k(ranked: List[str], relevant: Dict[str, int], k: int) -> float:
+  return len(set(ranked[:k]) & set(relevant)) / len(relevant) if relevant else 0.0
+
+
+def reciprocal_rank(ranked: List[str], relevant: Dict[str, int], k: int) -> float:
+  for i, doc_id in enumerate(ranked[:k]):
+    if doc_id in relevant:
+      return 1 / (i + 1)
+  return 0.0
+
+
+def ndcg_at_k(ranked: List[str], relevant: Dict[str, int], k: int) -> float:
+  dcg = sum((2 ** relevant.get(doc_id, 0) - 1) / math.log2(i + 2) for i, doc_id in enumerate(ranked[:k]))
+  ideal = sorted(relevant.values(), reverse=True)[:k]
+  idcg = sum((2 ** grade - 1) / math.log2(i + 2) for i, grade in enumerate(ideal))
+  return dcg / idcg if idcg else 0.0
+
+
+def _quantization_config(mode: str):
+  from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+  )
+
+  if mode == "int8":
+    return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, always_ram=True))
+  if mode == "binary":
+    return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+  return None
+
+
+class _CorpusEmbeddingCache:
+  """Memoizes corpus embeddings across rebuilds, so only the first index build pays for the model.
+
+  Only active while indexing: query embeddings are always computed, so their cost stays in the latency.
+  """
+
+  def __init__(self):
+    from app.utils import embedding
+
+    self._embedding = embedding
+    self._encode = embedding._encode
+    self._cache: Dict[str, List[float]] = {}
+
+  def _cached_encode(self, texts: List[str]) -> List[List[float]]:
+    missing = [t for t in dict.fromkeys(texts) if t not in self._cache]
+    if missing:
+      self._cache.update(zip(missing, self._encode(missing)))
+    return [self._cache[t] for t in texts]
+
+  def __enter__(self):
+    self._embedding._encode = self._cached_encode
+    return self
+
+  def __exit__(self, *exc):
+    self._embedding._encode = self._encode
+
+
+async def _build_index(dataset: Dict[str, Any], dimension: Optional[int], quantization: str, chunk_size: int, cache) -> int:
+  from qdrant_client.models import Distance, VectorParams
+  from app import database
+  from app.config import get_settings
+  from app.services.Qdrant import QDRANT_COLLECTIONS, insert_vectors
+  from app.services.document_service import CHUNK_OVERLAP, chunk_text
+  from app.utils.embedding import get_embedding_dimension
+
+  settings = get_settings()
+  settings.embedding_dimension = dimension
+  client = database.connect_qdrant()
+  if settings.qdrant_url == ":memory:":
+    database._qdrant_client = None
+    client = database.connect_qdrant()
+
+  items: Dict[str, List[dict]] = {}
+  for doc in dataset["corpus"]:
+    collection = doc.get("collection", "documents")
+    if collection == "documents":
+      for i, chunk in enumerate(chunk_text(doc["text"], size=chunk_size, overlap=min(CHUNK_OVERLAP, chunk_size // 4))):
+        items.setdefault("document_chunks", []).append({
+          "id": f"{doc['id']}#{i}",
+          "text": chunk,
+          "payload": {"text": chunk, "title": doc.get("title"), "document_id": doc["id"]},
+        })
+    else:
+      items.setdefault(collection, []).append({"id": doc["id"], "text": doc["text"], "payload": {"text": doc["text"]}})
+
+  points = 0
+  for collection, batch in items.items():
+    qdrant_collection = QDRANT_COLLECTIONS.get(collection, collection)
+    if client.collection_exists(qdrant_collection):
+      client.delete_collection(qdrant_collection)
+    client.create_collection(
+      collection_name=qdrant_collection,
+      vectors_config=VectorParams(size=get_embedding_dimension(collection), distance=Distance.COSINE),
+      quantization_config=_quantization_config(quantization),
+    )
+    with cache:
+      for start in range(0, len(batch), 256):
+        points += await insert_vectors(collection, batch[start:start + 256])
+  return points
+
+
+def _source_id(result: Dict[str, Any]) -> Optional[str]:
+  payload = result.get("payload") or {}
+  return payload.get("document_id") or payload.get("mongo_id")
+
+
+async def _evaluate(dataset: Dict[str, Any], config: Dict[str, Any], k: int) -> Dict[str, Any]:
+  from app.models.retrieval import RetrievalParams
+  from app.services import rag
+
+  params = RetrievalParams(
+    hnsw_ef=config["ef"],
+    exact=config["exact"],
+    quantization_rescore=config["rescore"] if config["quantization"] != "none" else None,
+    quantization_oversampling=config["oversampling"] if config["quantization"] != "none" else None,
+  )
+  latencies, recall, mrr, ndcg = [], [], [], []
+  for query in dataset["queries"]:
+    start = time.perf_counter()
+    results = await rag.search_multiple_collections(query["query"], params=params, top_k=k * 4)
+    latencies.append(time.perf_counter() - start)
+    ranked = list(dict.fromkeys(filter(None, (_source_id(r) for r in results))))
+    recall.append(recall_at_k(ranked, query["relevant"], k))
+    mrr.append(reciprocal_rank(ranked, query["relevant"], k))
+    ndcg.append(ndcg_at_k(ranked, query["relevant"], k))
+  latencies.sort()
+  n = len(dataset["queries"])
+  return {
+    f"recall_at_{k}": round(sum(recall) / n, 4),
+    "mrr": round(sum(mrr) / n, 4),
+    f"ndcg_at_{k}": round(sum(ndcg) / n, 4),
+    "latency_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+    "latency_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+  }
+
+
+def _pareto(results: List[Dict[str, Any]], k: int) -> None:
+  key = f"recall_at_{k}"
+  for r in results:
+    r["pareto"] = not any(
+      o is not r
+      and o[key] >= r[key] and o["latency_p99_ms"] <= r["latency_p99_ms"] and o["vector_memory_mb"] <= r["vector_memory_mb"]
+      and (o[key] > r[key] or o["latency_p99_ms"] < r["latency_p99_ms"] or o["vector_memory_mb"] < r["vector_memory_mb"])
+      for o in results
+    )
+
+
+async def _run(args) -> Dict[str, Any]:
+  from app.utils.embedding import get_native_dimension
+
+  dataset = _load_dataset(args.dataset)
+  cache = _CorpusEmbeddingCache()
+  results = []
+  # Configurations sharing an index are evaluated back to back, so each index is built once
+  for dimension, quantization, chunk_size in itertools.product(args.dims, args.quantization, args.chunk_sizes):
+    points = await _build_index(dataset, dimension, quantization, chunk_size, cache)
+    dim = dimension or get_native_dimension()
+    for ef, exact, rescore, oversampling in itertools.product(args.ef, args.exact, args.rescore, args.oversampling):
+      config = {
+        "dimension": dim, "quantization": quantization, "chunk_size": chunk_size,
+        "ef": ef, "exact": exact, "rescore": rescore, "oversampling": oversampling,
+      }
+      metrics = await _evaluate(dataset, config, args.k)
+      results.append({
+        **config,
+        **metrics,
+        "points": points,
+        "vector_memory_mb": round(points * dim * BYTES_PER_DIMENSION[quantization] / (1024 * 1024), 3),
+        "peak_rss_mb": _peak_rss_mb(),
+      })
+      print(
+        f"dim={dim:<5} quant={quantization:<6} chunk={chunk_size:<5} ef={str(ef):<5} exact={exact!s:<5} "
+        f"recall@{args.k}={metrics[f'recall_at_{args.k}']:.3f} mrr={metrics['mrr']:.3f} "
+        f"p99={metrics['latency_p99_ms']:.1f}ms",
+        flush=True,
+      )
+  _pareto(results, args.k)
+  return {
+    "meta": {
+      "timestamp": datetime.now(timezone.utc).isoformat(),
+      "python": platform.python_version(),
+      "machine": platform.machine(),
+      "dataset": args.dataset,
+      "corpus": len(dataset["corpus"]),
+      "queries": len(dataset["queries"]),
+      "k": args.k,
+      "qdrant": args.qdrant_url or ":memory:",
+      "embeddings": "fake" if args.fake_embeddings else "model",
+    },
+    "results": results,
+  }
+
+
+def _list(cast):
+  def parse(value: str) -> list:
+    return [None if v in ("", "none", "default") else cast(v) for v in value.split(",")]
+  return parse
+
+
+def _bool(value: str) -> bool:
+  return value.lower() in ("1", "true", "yes")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--dataset", required=True)
+  parser.add_argument("-k", type=int, default=5)
+  parser.add_argument("--dims", type=_list(int), default=[None], help="Matryoshka dimensions; 'none' = full")
+  parser.add_argument("--chunk-sizes", type=_list(int), default=[1200])
+  parser.add_argument("--ef", type=_list(int), default=[None], help="HNSW ef; 'none' = server default")
+  parser.add_argument("--exact", type=lambda v: [_bool(x) for x in v.split(",")], default=[False])
+  parser.add_argument("--quantization", type=lambda v: v.split(","), default=["none"], help="none, int8, binary")
+  parser.add_argument("--rescore", type=lambda v: [_bool(x) for x in v.split(",")], default=[True])
+  parser.add_argument("--oversampling", type=_list(float), default=[None])
+  parser.add_argument("--qdrant-url", help="scratch Qdrant server (collections are dropped!); default in-memory")
+  parser.add_argument("--fake-embeddings", action="store_true", help="hash-based encoder, for smoke runs only")
+  parser.add_argument("--output", help="write the JSON report here")
+  args = parser.parse_args(argv)
+
+  settings = standins.install(mongo_uri="mongodb://localhost:27017", real_embeddings=not args.fake_embeddings)
+  if args.qdrant_url:
+    settings.qdrant_url = args.qdrant_url
+  # The evaluation measures retrieval only; keep env-specific defaults out of it
+  settings.rag_score_threshold = None
+  settings.rag_payload_fields = None
+  settings.embedding_collection_dimensions = None
+
+  report = asyncio.run(_run(args))
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump(report, f, indent=2)
+  else:
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,169 @@
+"""Per-response CPU cost of the default vs. trusted serialization paths.
+
+For chat-history lists and RAG responses of several sizes, mounts two routes
+on a throwaway FastAPI app and calls each in-process (no network):
+
+- "validated": the endpoint returns validated Pydantic models and FastAPI
+  applies response_model (dump, re-validate, jsonable_encoder, json.dumps);
+- "trusted": the endpoint returns `app.utils.serialization.trusted(...)` of
+  `model_construct`ed models, encoded once by orjson.
+
+Reports CPU microseconds per response (process time, so waiting is excluded)
+and the saving per response.
+
+  python -m benchmarks.serialization_bench --sizes 10,100,1000 --requests 300 --output serialization.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from .load_test import percentile
+
+
+def _messages(count: int, construct: bool) -> list:
+  from app.models.chat import ChatMessagePublic
+
+  make = ChatMessagePublic.model_construct if construct else ChatMessagePublic
+  now = datetime.utcnow()
+  return [
+    make(
+      id=f"{i:024x}",
+      content=f"Message {i}: when is the quarterly report due and who approves the expenses?",
+      role="user" if i % 2 else "assistant",
+      user_id="bench-user",
+      conversation_id="bench-conversation",
+      created_at=now,
+    )
+    for i in range(count)
+  ]
+
+
+def _rag_response(count: int, construct: bool):
+  from app.controllers.rag_controller import RAGResponse, RetrievedDocument
+
+  docs = [
+    {
+      "id": 10_000 + i,
+      "score": 0.9 - i / (count * 2),
+      "text": "Employees accrue 1.5 vacation days per month; requests go through the HR portal. " * 4,
+      "collection": "document_chunks",
+      "payload": {"mongo_id": f"{i:024x}", "collection": "document_chunks", "page": i % 20, "document_id": "bench-doc"},
+    }
+    for i in range(count)
+  ]
+  make_doc = RetrievedDocument.model_construct if construct else RetrievedDocument
+  make = RAGResponse.model_construct if construct else RAGResponse
+  return make(
+    answer="You accrue 1.5 vacation days per month [DOC 1]. " * 10,
+    sources="\n".join(f"[DOC {i + 1}] id={d['id']}" for i, d in enumerate(docs)),
+    documents=[make_doc(**d) for d in docs],
+  )
+
+
+def _build_app(size: int):
+  from fastapi import FastAPI
+  from app.controllers.rag_controller import RAGResponse
+  from app.models.chat import ChatMessagePublic
+  from app.utils.serialization import trusted
+
+  app = FastAPI()
+
+  @app.get("/chat/validated", response_model=List[ChatMessagePublic])
+  async def chat_validated():
+    return _messages(size, construct=False)
+
+  @app.get("/chat/trusted", response_model=List[ChatMessagePublic])
+  async def chat_trusted():
+    return trusted(_messages(size, construct=True))
+
+  @app.get("/rag/validated", response_model=RAGResponse)
+  async def rag_validated():
+    return _rag_response(size, construct=False)
+
+  @app.get("/rag/trusted", response_model=RAGResponse)
+  async def rag_trusted():
+    return trusted(_rag_response(size, construct=True))
+
+  return app
+
+
+async def _measure(client, url: str, requests: int) -> Dict[str, Any]:
+  for _ in range(10):  # warm-up
+    await client.get(url)
+  samples = []
+  size = 0
+  for _ in range(requests):
+    t0 = time.process_time()
+    response = await client.get(url)
+    samples.append(time.process_time() - t0)
+    size = len(response.content)
+  samples.sort()
+  return {
+    "cpu_us_mean": round(sum(samples) / len(samples) * 1e6, 1),
+    "cpu_us_p50": round(percentile(samples, 50) * 1e6, 1),
+    "cpu_us_p95": round(percentile(samples, 95) * 1e6, 1),
+    "body_bytes": size,
+  }
+
+
+async def _run(args) -> List[Dict[str, Any]]:
+  import httpx
+
+  results = []
+  for size in args.sizes:
+    app = _build_app(size)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+      for endpoint in ("chat", "rag"):
+        validated = await _measure(client, f"/{endpoint}/validated", args.requests)
+        fast = await _measure(client, f"/{endpoint}/trusted", args.requests)
+        saving = validated["cpu_us_mean"] - fast["cpu_us_mean"]
+        results.append({
+          "endpoint": endpoint,
+          "items": size,
+          "validated": validated,
+          "trusted": fast,
+          "cpu_us_saved_per_response": round(saving, 1),
+          "speedup": round(validated["cpu_us_mean"] / max(fast["cpu_us_mean"], 1e-9), 2),
+        })
+        print(
+          f"{endpoint:<5} items={size:<5} validated={validated['cpu_us_mean']:>9.1f}us  "
+          f"trusted={fast['cpu_us_mean']:>9.1f}us  saved={saving:>9.1f}us/response",
+          flush=True,
+        )
+  return results
+
+
+def _int_list(value: str) -> List[int]:
+  return [int(v) for v in value.split(",")]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--sizes", type=_int_list, default=[10, 100, 1000], help="messages / retrieved documents per response")
+  parser.add_argument("--requests", type=int, default=300)
+  parser.add_argument("--output", help="write the JSON report here")
+  args = parser.parse_args(argv)
+
+  report = {
+    "meta": {
+      "timestamp": datetime.now(timezone.utc).isoformat(),
+      "python": platform.python_version(),
+      "machine": platform.machine(),
+      "requests": args.requests,
+    },
+    "results": asyncio.run(_run(args)),
+  }
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump(report, f, indent=2)
+  else:
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+  main()
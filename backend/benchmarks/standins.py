@@ -0,0 +1,89 @@
+"""Local stand-ins for the external dependencies of `app`.
+
+`install()` must run before anything imports `app.services`, because the
+service modules resolve their Mongo collections at import time.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_DIMENSION = 1024
+
+
+class FakeEncoder:
+  """Deterministic SentenceTransformer stand-in: hashes text into a unit vector."""
+
+  def __init__(self, dimension: int = DEFAULT_DIMENSION, latency_ms: float = 0.0):
+    self.dimension = dimension
+    self.latency_ms = latency_ms
+
+  def _vector(self, text: str) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+    vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+  def encode(self, sentences, **_kwargs):
+    if self.latency_ms:
+      import time
+      time.sleep(self.latency_ms / 1000)
+    if isinstance(sentences, str):
+      return self._vector(sentences)
+    return np.stack([self._vector(s) for s in sentences])
+
+  def get_sentence_embedding_dimension(self) -> int:
+    return self.dimension
+
+
+def make_fake_llm(first_token_ms: float = 200.0, token_ms: float = 20.0, tokens: int = 64):
+  """Async `call_llm` replacement that sleeps like a streaming model would."""
+
+  async def fake_call_llm(messages, *_args, **_kwargs) -> str:
+    await asyncio.sleep((first_token_ms + token_ms * tokens) / 1000)
+    digest = hashlib.sha1(json.dumps(messages, sort_keys=True).encode()).hexdigest()[:8]
+    return f"[fake-llm {digest}] " + " ".join(["token"] * tokens)
+
+  return fake_call_llm
+
+
+def install(
+  mongo_uri: Optional[str] = None,
+  embedding_dimension: int = DEFAULT_DIMENSION,
+  embedding_latency_ms: float = 0.0,
+  real_embeddings: bool = False,
+):
+  """Point settings at in-memory Qdrant and a local or mock Mongo, and swap in the fake encoder.
+
+  With `mongo_uri=None` an in-process mongomock-motor database is used.
+  """
+  os.environ.setdefault("MONGODB_URI", mongo_uri or "mongodb://localhost:27017")
+  if mongo_uri:
+    os.environ["MONGODB_URI"] = mongo_uri
+  os.environ["QDRANT_URL"] = ":memory:"
+  os.environ.setdefault("MONGODB_DB", "sba_bench")
+
+  from app import database
+  from app.config import get_settings
+
+  get_settings.cache_clear()
+  settings = get_settings()
+  database.settings = settings
+
+  if mongo_uri is None:
+    try:
+      from mongomock_motor import AsyncMongoMockClient
+    except ImportError as e:
+      raise SystemExit("mongomock-motor is required for --mongo memory (pip install mongomock-motor)") from e
+    database.client = AsyncMongoMockClient()
+    database.database = database.client[settings.mongodb_db]
+
+  if not real_embeddings:
+    from app.utils import embedding
+
+    embedding._model = FakeEncoder(embedding_dimension, embedding_latency_ms)
+    embedding._embedding_dimension = embedding_dimension
+  return settings
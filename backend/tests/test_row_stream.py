@@ -0,0 +1,70 @@
+import pytest
+
+from app.utils.row_stream import MAX_RECORD_SIZE, RowDecoder
+
+
+def decode(data: bytes, chunk_size: int = 0) -> list:
+  decoder = RowDecoder("csv")
+  rows = []
+  if chunk_size:
+    for i in range(0, len(data), chunk_size):
+      rows += decoder.feed(data[i:i + chunk_size])
+  else:
+    rows += decoder.feed(data)
+  return rows + decoder.close()
+
+
+def test_quoted_newline_spans_lines():
+  data = b'name,note\r\nann,"line one\r\nline two"\r\nbob,plain\r\n'
+  assert decode(data) == [
+    (1, {"name": "ann", "note": "line one\nline two"}, None),
+    (2, {"name": "bob", "note": "plain"}, None),
+  ]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7])
+def test_chunk_boundaries_do_not_matter(chunk_size):
+  data = 'name,note\nann,"a, ""b""\nc"\nzoë,x\n'.encode()
+  assert decode(data, chunk_size) == decode(data)
+
+
+def test_doubled_quotes_are_escapes():
+  data = b'name,note\n"O""Brien","say ""hi"""\n'
+  assert decode(data) == [(1, {"name": 'O"Brien', "note": 'say "hi"'}, None)]
+
+
+def test_stray_quote_in_data_row_rejects_only_that_row():
+  data = b'name,note\nO"Brien,x\nann,y\n'
+  rows = decode(data)
+  assert rows[0][0] == 1 and rows[0][1] is None and "Quote inside an unquoted field" in rows[0][2]
+  # The stray quote does not open a field swallowing the following lines
+  assert rows[1:] == [(2, {"name": "ann", "note": "y"}, None)]
+
+
+def test_stray_quote_in_header_is_kept_verbatim():
+  data = b'na"me,note\nann,y\n'
+  assert decode(data) == [(1, {'na"me': "ann", "note": "y"}, None)]
+
+
+def test_unterminated_quote_at_end_of_input():
+  data = b'name,note\nann,"never closed\nbob,y\n'
+  assert decode(data) == [(1, None, "Unterminated quoted field")]
+
+
+def test_oversized_quoted_record_is_an_invalid_row_and_decoding_resyncs():
+  line = b"x" * 1000
+  lines = MAX_RECORD_SIZE // (len(line) + 1) + 1
+  data = b'name,note\nann,"unterminated\n' + b"\n".join([line] * lines) + b"\nbob,y\n"
+  rows = decode(data)
+  assert rows[0][1] is None and "record longer than" in rows[0][2]
+  assert rows[1:] == [(2, {"name": "bob", "note": "y"}, None)]
+
+
+def test_oversized_line_fails_the_stream():
+  decoder = RowDecoder("csv")
+  with pytest.raises(ValueError):
+    decoder.feed(b"name,note\n" + b"x" * (MAX_RECORD_SIZE + 1))
+
+
+def test_column_count_mismatch():
+  assert decode(b"a,b\n1,2,3\n") == [(1, None, "Expected 2 columns, got 3")]
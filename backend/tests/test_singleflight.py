@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from app.utils.singleflight import SingleFlight
+
+
+class Rejected(Exception):
+  pass
+
+
+async def _settle() -> None:
+  # Let started tasks reach their first await
+  for _ in range(5):
+    await asyncio.sleep(0)
+
+
+def test_concurrent_calls_share_one_execution():
+  async def main():
+    flight, calls, release = SingleFlight(), [], asyncio.Event()
+
+    async def fn():
+      calls.append(1)
+      await release.wait()
+      return "answer"
+
+    tasks = [asyncio.create_task(flight.do("k", fn)) for _ in range(3)]
+    await _settle()
+    release.set()
+    results = await asyncio.gather(*tasks)
+    assert len(calls) == 1
+    assert sorted(results, key=lambda r: r[1]) == [("answer", False), ("answer", True), ("answer", True)]
+    assert not flight.in_flight("k")
+
+  asyncio.run(main())
+
+
+def test_joiners_share_a_public_failure():
+  async def main():
+    flight, release = SingleFlight(), asyncio.Event()
+
+    async def fn():
+      await release.wait()
+      raise ValueError("boom")
+
+    leader = asyncio.create_task(flight.do("k", fn, private=(Rejected,)))
+    await _settle()
+    joiner = asyncio.create_task(flight.do("k", fn, private=(Rejected,)))
+    await _settle()
+    release.set()
+    for task in (leader, joiner):
+      with pytest.raises(ValueError):
+        await task
+
+  asyncio.run(main())
+
+
+def test_leader_cancelled_joiner_retries_as_leader():
+  async def main():
+    flight, leader_started = SingleFlight(), asyncio.Event()
+
+    async def stuck():
+      leader_started.set()
+      await asyncio.Event().wait()
+
+    async def own():
+      return "joiner's answer"
+
+    leader = asyncio.create_task(flight.do("k", stuck))
+    await leader_started.wait()
+    joiner = asyncio.create_task(flight.do("k", own))
+    await _settle()
+    leader.cancel()
+    assert await joiner == ("joiner's answer", False)
+    with pytest.raises(asyncio.CancelledError):
+      await leader
+
+  asyncio.run(main())
+
+
+def test_leader_private_failure_is_not_shared():
+  async def main():
+    flight, release = SingleFlight(), asyncio.Event()
+
+    async def rejected():
+      await release.wait()
+      raise Rejected()
+
+    async def own():
+      return "joiner's answer"
+
+    leader = asyncio.create_task(flight.do("k", rejected, private=(Rejected,)))
+    await _settle()
+    joiner = asyncio.create_task(flight.do("k", own, private=(Rejected,)))
+    await _settle()
+    release.set()
+    with pytest.raises(Rejected):
+      await leader
+    assert await joiner == ("joiner's answer", False)
+
+  asyncio.run(main())
+
+
+def test_cancelled_joiner_does_not_cancel_leader():
+  async def main():
+    flight, release = SingleFlight(), asyncio.Event()
+
+    async def fn():
+      await release.wait()
+      return "answer"
+
+    leader = asyncio.create_task(flight.do("k", fn))
+    await _settle()
+    joiner = asyncio.create_task(flight.do("k", fn))
+    await _settle()
+    joiner.cancel()
+    with pytest.raises(asyncio.CancelledError):
+      await joiner
+    assert flight.in_flight("k")
+    release.set()
+    assert await leader == ("answer", False)
+
+  asyncio.run(main())